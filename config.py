@@ -1,9 +1,15 @@
 # config.py
+import multiprocessing
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Workers del pool de procesos (spawn): solo calculan, nunca escriben en
+# disco. El nombre ya está puesto cuando el hijo re-importa __main__.
+IS_WORKER_PROCESS = multiprocessing.current_process().name != "MainProcess"
+
 
 def _get(name, default=None, cast=str):
     v = os.getenv(name, default)
@@ -75,3 +81,111 @@ ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "analysis")
 # strict = no fallback
 # safe   = allow fallbacks
 ENGINE_MODE = os.getenv("ENGINE_MODE", "safe")
+
+# ============================================================
+# 🕯️ Market data (caché de velas)
+# ============================================================
+
+# Caché en memoria delante de get_ohlcv_data (ver candle_cache.py)
+CANDLE_CACHE_ENABLED = os.getenv("CANDLE_CACHE_ENABLED", "true").lower() == "true"
+
+# Velas por (symbol, timeframe) que se leen del candle_store al arrancar.
+# Las descargas piden solo lo necesario (motor: analysis_bars())
+CANDLE_CACHE_WINDOW = int(os.getenv("CANDLE_CACHE_WINDOW", 300))
+
+# Máximo de peticiones OHLCV simultáneas contra Bybit (ruta async)
+MARKET_DATA_MAX_CONCURRENCY = int(os.getenv("MARKET_DATA_MAX_CONCURRENCY", 8))
+
+# Archivo local de velas (SQLite) junto a trading_ai.db
+CANDLE_STORE_ENABLED = (
+    os.getenv("CANDLE_STORE_ENABLED", "true").lower() == "true"
+    and not IS_WORKER_PROCESS
+)
+CANDLE_DB_PATH = os.getenv("CANDLE_DB_PATH", "market_data.db")
+CANDLE_STORE_KEEP_BARS = int(os.getenv("CANDLE_STORE_KEEP_BARS", 5000))
+
+# ============================================================
+# 📡 Bybit v5 public kline WebSocket
+# ============================================================
+BYBIT_WS_ENABLED = os.getenv("BYBIT_WS_ENABLED", "false").lower() == "true"
+BYBIT_WS_URL = os.getenv("BYBIT_WS_URL", "wss://stream.bybit.com/v5/public/linear")
+
+# Temporalidades suscritas por símbolo vigilado (formato Bybit)
+KLINE_WS_TIMEFRAMES = [
+    tf.strip()
+    for tf in os.getenv("KLINE_WS_TIMEFRAMES", "240,60,30,15,5").split(",")
+    if tf.strip()
+]
+
+# Segundos que un análisis manual / de señal mantiene el símbolo suscrito
+KLINE_WS_TOUCH_TTL = int(os.getenv("KLINE_WS_TOUCH_TTL", 3600))
+
+# Si se define, se graban los frames recibidos (JSONL) para replay offline
+BYBIT_WS_RECORD_PATH = os.getenv("BYBIT_WS_RECORD_PATH") or None
+
+# Precisión de los arrays OHLCV en memoria ("float64" | "float32")
+CANDLE_FLOAT_DTYPE = os.getenv("CANDLE_FLOAT_DTYPE", "float64")
+
+# Cada cuánto se recarga la lista de instrumentos (symbol_registry)
+SYMBOL_REGISTRY_REFRESH_SEC = int(os.getenv("SYMBOL_REGISTRY_REFRESH_SEC", 21600))
+
+# Peticiones REST por segundo hacia Bybit (bucket global por IP, ver
+# rate_limiter.py; Bybit corta a 600 cada 5 s)
+BYBIT_IP_RATE_PER_SEC = float(os.getenv("BYBIT_IP_RATE_PER_SEC", 100))
+
+# Motor de indicadores de motor_wrapper_core ("numpy" | "pandas_ta")
+INDICATOR_ENGINE = os.getenv("INDICATOR_ENGINE", "numpy").lower()
+
+# Estado incremental de indicadores por (symbol, tf) (indicator_state.py)
+STREAMING_INDICATORS_ENABLED = (
+    os.getenv("STREAMING_INDICATORS_ENABLED", "true").lower() == "true"
+    and not IS_WORKER_PROCESS
+)
+# Velas del candle_store usadas como máximo para sembrar el estado
+INDICATOR_SEED_BARS = int(os.getenv("INDICATOR_SEED_BARS", 1000))
+# Cada cuánto (s) se escriben los checkpoints de indicadores pendientes
+INDICATOR_CHECKPOINT_SEC = float(os.getenv("INDICATOR_CHECKPOINT_SEC", 60))
+
+# Frames de features memoizados por (symbol, tf, última vela) (feature_registry.py)
+FEATURE_CACHE_FRAMES = int(os.getenv("FEATURE_CACHE_FRAMES", 512))
+
+# Memo de analyze_single_tf por (symbol, tf, última vela cerrada)
+TF_RESULT_CACHE_ENABLED = os.getenv("TF_RESULT_CACHE_ENABLED", "true").lower() == "true"
+TF_RESULT_CACHE_MAX_ENTRIES = int(os.getenv("TF_RESULT_CACHE_MAX_ENTRIES", 2048))
+TF_RESULT_CACHE_MAX_MB = float(os.getenv("TF_RESULT_CACHE_MAX_MB", 64))
+
+# Incluir rsi/macd_hist/close_series de cada TF en logs y analysis_logs
+ANALYSIS_SERIES_IN_LOGS = (
+    os.getenv("ANALYSIS_SERIES_IN_LOGS", "false").lower() == "true"
+)
+
+# Kernels compilados con numba si está instalado ("auto" | "off"), ver jit_kernels.py
+INDICATOR_JIT = os.getenv("INDICATOR_JIT", "auto").lower()
+# Caché de compilación de numba: fuera del árbol de código (despliegues de
+# solo lectura, workers spawn). Si no se puede escribir, se compila en RAM.
+NUMBA_CACHE_DIR = os.getenv(
+    "NUMBA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "trading_ai_numba")
+)
+
+# Velas extra sobre el calentamiento mínimo de indicadores + divergencias
+# (motor_wrapper_core.analysis_bars): convergencia de las EMAs
+ANALYSIS_WARMUP_MARGIN = int(os.getenv("ANALYSIS_WARMUP_MARGIN", 30))
+# Lookback máximo de divergencias al vigilar posiciones abiertas (ventana corta)
+OPEN_POSITION_DIVERGENCE_LOOKBACK = int(
+    os.getenv("OPEN_POSITION_DIVERGENCE_LOOKBACK", 40)
+)
+
+# Pool del motor técnico fuera del event loop (services/common/worker_pool.py)
+# thread | process
+ANALYSIS_POOL_MODE = os.getenv("ANALYSIS_POOL_MODE", "thread").lower()
+ANALYSIS_POOL_WORKERS = int(os.getenv("ANALYSIS_POOL_WORKERS", 4))
+ANALYSIS_MAX_CONCURRENCY = int(os.getenv("ANALYSIS_MAX_CONCURRENCY", 4))
+# Tiempo máximo de AnalysisService.analyze_symbol (segundos)
+ANALYSIS_TIMEOUT_SEC = float(os.getenv("ANALYSIS_TIMEOUT_SEC", 30))
+
+# Caché de análisis completos (services/application/analysis_cache.py)
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+# contexto=TF: el análisis vale durante la vela en curso de ese TF.
+# Contextos que no aparecen (entry) se analizan siempre de nuevo.
+ANALYSIS_CACHE_POLICY = os.getenv("ANALYSIS_CACHE_POLICY", "open_position=15")
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 512))
@@ -7,6 +7,8 @@ import json
 import logging
 from datetime import datetime
 
+from services.technical_engine.snapshot_records import to_json
+
 logger = logging.getLogger("database")
 
 DB_PATH = "trading_ai.db"
@@ -159,7 +161,7 @@ def save_analysis_log(signal_id: int, context: str, analysis_json: dict):
     """, (
         signal_id,
         context,
-        json.dumps(analysis_json)
+        to_json(analysis_json)
     ))
 
     conn.commit()
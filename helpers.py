@@ -11,7 +11,7 @@ Incluye:
 """
 
 import re
-from services.bybit_service.bybit_client import get_ohlcv_data
+from services.bybit_service.bybit_client import get_ohlcv_data, symbol_registry
 import logging
 
 logger = logging.getLogger("helpers")
@@ -29,7 +29,9 @@ def normalize_symbol(raw: str) -> str:
 
     Nueva lógica inteligente:
       1) Normalización estándar.
-      2) Intentar variantes para encontrar un par REAL en Bybit.
+      2) Intentar variantes para encontrar un par REAL en Bybit
+         (búsqueda en symbol_registry, sin red; si el registro no está
+         disponible, validación descargando OHLCV como antes).
     """
 
     # 1) Limpieza estándar
@@ -60,7 +62,11 @@ def normalize_symbol(raw: str) -> str:
     # Evitar duplicados
     candidates = list(dict.fromkeys(candidates))
 
-    # 2) Probar variantes consultando OHLCV real
+    # 2) Probar variantes contra la lista de instrumentos
+    if symbol_registry.contains(candidates[0]) is not None:
+        return symbol_registry.resolve(candidates) or candidates[0]
+
+    # 2b) Sin registro: probar variantes consultando OHLCV real
     for sym in candidates:
         try:
             df = get_ohlcv_data(sym, "15")  # timeframe pequeño para validar rápido
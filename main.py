@@ -20,6 +20,25 @@ async def post_init(app: Application):
         logger.exception(f"❌ Error inicializando base de datos: {e}")
         raise
 
+    # Archivo local de velas: recortar histórico antiguo al arrancar
+    try:
+        from config import CANDLE_STORE_KEEP_BARS
+        from services.bybit_service.bybit_client import candle_store
+
+        if candle_store is not None:
+            candle_store.prune(CANDLE_STORE_KEEP_BARS)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo recortar candle_store: {e}")
+
+    # Lista de instrumentos: descargarla aquí (en un hilo) y no en la primera
+    # normalize_symbol, que correría load_markets dentro del event loop
+    try:
+        from services.bybit_service.bybit_client import symbol_registry
+
+        await asyncio.to_thread(symbol_registry.refresh)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo precargar symbol_registry: {e}")
+
     # 1) Construir capa aplicación con BOT real
     app.app_layer = ApplicationLayer(app.bot)
 
@@ -56,7 +75,13 @@ async def post_init(app: Application):
     except Exception as e:
         logger.exception(f"❌ No se pudo iniciar monitor de posiciones abiertas: {e}")
 
-    # 5) Telethon reader
+    # 5) Klines WebSocket (si BYBIT_WS_ENABLED)
+    kline_stream = app.app_layer.kernel.kline_stream
+    if kline_stream is not None:
+        asyncio.create_task(kline_stream.run())
+        logger.info("✅ Stream de klines (WebSocket) iniciado")
+
+    # 6) Telethon reader
     try:
         from services.telegram_service.telegram_reader import start_telegram_reader
 
@@ -0,0 +1,103 @@
+# services/application/analysis_cache.py
+"""
+analysis_cache.py — Caché de análisis completos por contexto
+------------------------------------------------------------
+El monitor de posiciones (60 s) y la reactivación (300 s) vuelven a
+analizar el mismo (symbol, direction) aunque no haya cerrado ninguna
+vela; el motor es determinista, así que el resultado sería el mismo.
+
+Política de frescura por contexto (ANALYSIS_CACHE_POLICY):
+
+- "open_position=15": vale el análisis hecho durante la vela de 15m en
+  curso (como mucho una vela de 15m de antigüedad).
+- Contextos sin entrada (p. ej. "entry"): siempre análisis fresco.
+
+La vela forma parte de la clave (cierre de la vela en curso), así que al
+cerrar la vela el resultado deja de servir aunque no llegue nada por
+WebSocket. Con stream, la vela confirmada de esa temporalidad además
+borra las entradas del símbolo en el momento.
+"""
+
+import logging
+import time
+from typing import Dict, Optional
+
+from services.bybit_service.candle_cache import next_candle_close
+from services.technical_engine.result_cache import ResultCache
+
+logger = logging.getLogger("analysis_cache")
+
+# Resultados que no se guardan nunca
+_UNCACHEABLE = ("error", "timeout")
+
+
+def parse_policy(spec: str) -> Dict[str, str]:
+    """'open_position=15,reactivation=5' → {"open_position": "15", ...}."""
+    policy = {}
+    for item in (spec or "").split(","):
+        context, _, tf = item.partition("=")
+        if context.strip() and tf.strip():
+            policy[context.strip()] = tf.strip()
+    return policy
+
+
+class AnalysisCache:
+    def __init__(self, policy: Dict[str, str], max_entries: int = 512):
+        self.policy = dict(policy)
+        self._cache = ResultCache(max_entries=max_entries)
+        self.bypassed = 0
+        self.invalidated = 0
+
+    def _key(self, symbol: str, direction: str, context: str) -> Optional[tuple]:
+        tf = self.policy.get(context)
+        if tf is None:
+            return None
+        return (
+            symbol.upper(),
+            (direction or "auto").lower(),
+            context,
+            tf,
+            next_candle_close(tf, time.time()),
+        )
+
+    def get(self, symbol: str, direction: str, context: str) -> Optional[dict]:
+        key = self._key(symbol, direction, context)
+        if key is None:
+            self.bypassed += 1
+            return None
+        result = self._cache.get(key)
+        # Copia superficial: quien la reciba puede añadir claves
+        return dict(result) if result is not None else None
+
+    def put(self, symbol: str, direction: str, context: str, result: dict) -> None:
+        if result.get("decision") in _UNCACHEABLE:
+            return
+        key = self._key(symbol, direction, context)
+        if key is not None:
+            self._cache.put(key, dict(result))
+
+    def on_closed_bar(self, symbol: str, tf: str, ts_ms: int, ohlcv) -> None:
+        """Listener de candle_cache: vela confirmada → fuera ese símbolo/TF."""
+        if str(tf) not in self.policy.values():
+            return
+        symbol = symbol.upper()
+        self.invalidated += self._cache.invalidate(
+            lambda k: k[0] == symbol and k[3] == str(tf)
+        )
+
+    def invalidate(self, symbol: str | None = None) -> int:
+        if symbol is None:
+            return self._cache.invalidate()
+        symbol = symbol.upper()
+        return self._cache.invalidate(lambda k: k[0] == symbol)
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats.update(
+            {
+                "policy": dict(self.policy),
+                "bypassed": self.bypassed,
+                "invalidated": self.invalidated,
+            }
+        )
+        return stats
@@ -1,48 +1,262 @@
 # services/application/analysis_service.py
+import asyncio
 import logging
 import inspect
+from typing import AsyncIterator, Dict, Iterable, List, Tuple
 
-from services.technical_engine.technical_engine import analyze as engine_analyze
+from services.application.analysis_cache import AnalysisCache, parse_policy
+from services.bybit_service.bybit_client import candle_cache
+from services.common.worker_pool import WorkerPool
+from services.technical_engine.technical_engine import (
+    analysis_pool,
+    analyze as engine_analyze,
+)
+from config import (
+    ANALYSIS_TIMEOUT_SEC,
+    ANALYSIS_CACHE_ENABLED,
+    ANALYSIS_CACHE_POLICY,
+    ANALYSIS_CACHE_MAX_ENTRIES,
+)
 
 logger = logging.getLogger("analysis_service")
 
 
 class AnalysisService:
+    def __init__(
+        self,
+        market_stream=None,
+        pool: WorkerPool | None = None,
+        timeout: float | None = ANALYSIS_TIMEOUT_SEC,
+    ):
+        # KlineStream opcional: cada símbolo analizado queda suscrito un rato
+        self.market_stream = market_stream
+        # Pool donde corre el motor (hilos o procesos, con tope de concurrencia)
+        self.pool = pool or analysis_pool
+        # Tiempo máximo por análisis (None = sin límite)
+        self.timeout = timeout
+
+        # Resultados reutilizables según el contexto (None = desactivada)
+        self.cache = None
+        if ANALYSIS_CACHE_ENABLED:
+            self.cache = AnalysisCache(
+                parse_policy(ANALYSIS_CACHE_POLICY),
+                max_entries=ANALYSIS_CACHE_MAX_ENTRIES,
+            )
+            candle_cache.add_bar_listener(self.cache.on_closed_bar)
+
     async def analyze_symbol(
         self, symbol: str, direction: str, context: str = "entry"
     ) -> dict:
         """
         Ejecuta el motor técnico y siempre retorna dict (nunca coroutine).
+        El cálculo corre en self.pool: el event loop sigue libre. Pasado
+        self.timeout se devuelve un resultado de error (decision="timeout").
         """
         try:
             logger.info(
                 f"🔍 Ejecutando análisis técnico para {symbol} ({direction})..."
             )
 
-            result = engine_analyze(symbol=symbol, direction=direction, context=context)
+            if self.market_stream:
+                self.market_stream.touch(symbol)
 
-            # ✅ Compatibilidad total: si el motor es async, lo await; si es sync, lo dejo.
-            if inspect.isawaitable(result):
-                result = await result
-
-            if not isinstance(result, dict):
-                raise TypeError(
-                    f"technical_engine.analyze devolvió {type(result)} (se esperaba dict)"
-                )
+            return await asyncio.wait_for(
+                self._run_engine(symbol, direction, context, self.timeout),
+                self.timeout,
+            )
 
-            return result
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Análisis de {symbol} superó {self.timeout}s")
+            return self._timeout_result(symbol, direction, context, self.timeout)
 
         except Exception as e:
             logger.exception(f"❌ Error crítico analizando {symbol}: {e}")
-            return {
-                "allowed": False,
-                "decision": "error",
-                "decision_reasons": [f"Error crítico analizando {symbol}: {e}"],
-                "symbol": symbol,
-                "direction_hint": direction,
-                "context": context,
-                "confidence": 0.0,
-                "match_ratio": 0.0,
-                "technical_score": 0.0,
-                "grade": "D",
-            }
+            return self._error_result(symbol, direction, context, e)
+
+    # ============================================================
+    # 📦 Lote
+    # ============================================================
+    async def analyze_many(
+        self,
+        symbols: Iterable[str],
+        directions: str | List[str] | Dict[str, str] = "auto",
+        context: str = "entry",
+        deadline: float | None = None,
+    ) -> AsyncIterator[Tuple[str, str, dict]]:
+        """
+        Analiza varios símbolos en una sola pasada y va entregando
+        (symbol, direction, result) según terminan.
+
+        - directions: una para todos, una lista alineada con symbols o
+          {symbol: direction}.
+        - Pares (symbol, direction) repetidos se analizan una vez; las
+          direcciones de un mismo símbolo comparten snapshot (single-flight
+          del motor) y todas las descargas salen a la vez.
+        - deadline: segundos para todo el lote (defecto self.timeout). Lo
+          que no haya terminado se cancela y sale con decision="timeout".
+        """
+        pairs = self._batch_pairs(symbols, directions)
+        if not pairs:
+            return
+
+        logger.info(f"🔍 Análisis en lote: {len(pairs)} pares ({context})")
+
+        if self.market_stream:
+            for symbol in dict.fromkeys(symbol for symbol, _ in pairs):
+                self.market_stream.touch(symbol)
+
+        budget = self.timeout if deadline is None else deadline
+        loop = asyncio.get_running_loop()
+        end = None if budget is None else loop.time() + budget
+
+        tasks = {
+            asyncio.ensure_future(
+                self._run_engine(symbol, direction, context, budget)
+            ): (symbol, direction)
+            for symbol, direction in pairs
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = None if end is None else end - loop.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    symbol, direction = tasks[task]
+                    yield symbol, direction, self._task_result(
+                        task, symbol, direction, context, budget
+                    )
+
+            # Plazo vencido: lo ya terminado (pendiente solo porque el
+            # consumidor iba lento) se entrega; el resto se cancela
+            finished = [task for task in pending if task.done()]
+            unfinished = [task for task in pending if not task.done()]
+            for task in unfinished:
+                task.cancel()
+
+            for task in finished:
+                symbol, direction = tasks[task]
+                yield symbol, direction, self._task_result(
+                    task, symbol, direction, context, budget
+                )
+
+            for task in unfinished:
+                symbol, direction = tasks[task]
+                logger.warning(f"⏱️ Lote: {symbol} sin terminar tras {budget}s")
+                yield symbol, direction, self._timeout_result(
+                    symbol, direction, context, budget
+                )
+        finally:
+            # Consumidor que corta el lote antes de tiempo: nada queda colgado
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    @staticmethod
+    def _batch_pairs(symbols, directions) -> List[Tuple[str, str]]:
+        symbols = [s.upper() for s in symbols if s]
+        if isinstance(directions, dict):
+            directions = {k.upper(): v for k, v in directions.items()}
+            dirs = [directions.get(s, "auto") for s in symbols]
+        elif isinstance(directions, str) or directions is None:
+            dirs = [directions or "auto"] * len(symbols)
+        else:
+            dirs = list(directions)
+            if len(dirs) != len(symbols):
+                raise ValueError("directions debe tener un valor por símbolo")
+        pairs = ((s, (d or "auto").lower()) for s, d in zip(symbols, dirs))
+        return list(dict.fromkeys(pairs))
+
+    def _task_result(
+        self, task, symbol: str, direction: str, context: str, timeout=None
+    ) -> dict:
+        if task.cancelled():
+            # p. ej. el snapshot compartido se canceló (single-flight)
+            logger.warning(f"⚠️ Lote: análisis de {symbol} cancelado")
+            return self._error_result(
+                symbol, direction, context, "análisis cancelado"
+            )
+        error = task.exception()
+        if error is None:
+            return task.result()
+        if isinstance(error, asyncio.TimeoutError):
+            # Plazo agotado dentro del pool (mismo presupuesto que el lote)
+            logger.warning(f"⏱️ Lote: {symbol} superó {timeout}s")
+            return self._timeout_result(symbol, direction, context, timeout)
+        logger.error(f"❌ Error crítico analizando {symbol}: {error}", exc_info=error)
+        return self._error_result(symbol, direction, context, error)
+
+    # ============================================================
+    # 🔧 Internos
+    # ============================================================
+    async def _run_engine(
+        self,
+        symbol: str,
+        direction: str,
+        context: str,
+        timeout: float | None = None,
+    ) -> dict:
+        if self.cache is not None:
+            cached = self.cache.get(symbol, direction, context)
+            if cached is not None:
+                logger.info(f"♻️ Análisis de {symbol} ({direction}) desde caché")
+                return cached
+
+        # El timeout llega al pool: un trabajo aún en cola se descarta
+        result = engine_analyze(
+            symbol=symbol,
+            direction=direction,
+            context=context,
+            pool=self.pool,
+            timeout=timeout,
+        )
+
+        # ✅ Compatibilidad total: si el motor es async, lo await; si es sync, lo dejo.
+        if inspect.isawaitable(result):
+            result = await result
+
+        if not isinstance(result, dict):
+            raise TypeError(
+                f"technical_engine.analyze devolvió {type(result)} (se esperaba dict)"
+            )
+
+        if self.cache is not None:
+            self.cache.put(symbol, direction, context, result)
+        return result
+
+    def cache_stats(self) -> dict:
+        """Aciertos / fallos / invalidaciones de la caché de análisis."""
+        return self.cache.stats() if self.cache is not None else {}
+
+    @staticmethod
+    def _timeout_result(symbol: str, direction: str, context: str, timeout) -> dict:
+        return {
+            "allowed": False,
+            "decision": "timeout",
+            "decision_reasons": [f"Análisis de {symbol} superó {timeout}s"],
+            "symbol": symbol,
+            "direction_hint": direction,
+            "context": context,
+            "confidence": 0.0,
+            "match_ratio": 0.0,
+            "technical_score": 0.0,
+            "grade": "D",
+        }
+
+    @staticmethod
+    def _error_result(symbol: str, direction: str, context: str, e) -> dict:
+        return {
+            "allowed": False,
+            "decision": "error",
+            "decision_reasons": [f"Error crítico analizando {symbol}: {e}"],
+            "symbol": symbol,
+            "direction_hint": direction,
+            "context": context,
+            "confidence": 0.0,
+            "match_ratio": 0.0,
+            "technical_score": 0.0,
+            "grade": "D",
+        }
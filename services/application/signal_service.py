@@ -2,7 +2,6 @@
 # signal_service.py — VERSIÓN FINAL 2025-12
 # Servicio oficial y único para gestionar señales
 # ================================================================
-import json
 import logging
 from database import (
     save_signal,
@@ -10,6 +9,7 @@ from database import (
     mark_signal_reactivated,
     save_analysis_log,
 )
+from services.technical_engine.snapshot_records import to_json
 
 logger = logging.getLogger("signal_service")
 
@@ -70,7 +70,7 @@ class SignalService:
     def save_analysis_log(self, signal_id, context, analysis):
         from database import save_analysis_log
 
-        save_analysis_log(signal_id, context, json.dumps(analysis))
+        save_analysis_log(signal_id, context, to_json(analysis))
 
     # ------------------------------------------------------------
     # 4) MARCAR UNA SEÑAL COMO REACTIVADA
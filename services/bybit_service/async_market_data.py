@@ -0,0 +1,145 @@
+"""
+async_market_data.py — Ruta async de datos de mercado (ccxt.async_support)
+-------------------------------------------------------------------------
+- UNA sola instancia async de Bybit, con mercados precargados.
+- Todas las temporalidades de un símbolo se piden a la vez
+  (asyncio.gather), limitadas por un semáforo por exchange y por el
+  rate_limiter compartido con la ruta síncrona.
+- Escribe en la MISMA candle_cache que usa get_ohlcv_data, así el motor
+  síncrono (motor_wrapper_core) encuentra las velas ya calientes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+
+import ccxt.async_support as ccxt_async
+
+from config import CANDLE_CACHE_ENABLED, MARKET_DATA_MAX_CONCURRENCY
+from services.bybit_service.bybit_client import (
+    candle_cache,
+    ohlcv_to_candles,
+    rate_limiter,
+)
+from services.bybit_service.candle_cache import to_ccxt_timeframe
+from services.bybit_service.candles import Candles
+
+logger = logging.getLogger("async_market_data")
+
+_exchange: Optional[ccxt_async.bybit] = None
+_init_lock: Optional[asyncio.Lock] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+class _ScheduledBybitAsync(ccxt_async.bybit):
+    """
+    ccxt async que comparte el rate_limiter de bybit_client.
+    Un 10006 (ccxt.RateLimitExceeded) frena el bucket de esa ruta.
+    """
+
+    async def fetch2(
+        self,
+        path,
+        api="public",
+        method="GET",
+        params={},
+        headers=None,
+        body=None,
+        config={},
+    ):
+        await rate_limiter.acquire_async(path)
+        try:
+            return await super().fetch2(
+                path, api, method, params, headers, body, config
+            )
+        except ccxt_async.RateLimitExceeded:
+            rate_limiter.penalize(path)
+            raise
+
+
+# ============================================================
+# 🔌 Exchange compartido
+# ============================================================
+async def get_exchange() -> ccxt_async.bybit:
+    """Crea (una vez) la instancia async y precarga los mercados."""
+    global _exchange, _init_lock, _semaphore
+
+    if _exchange is not None:
+        return _exchange
+
+    if _init_lock is None:
+        _init_lock = asyncio.Lock()
+
+    async with _init_lock:
+        if _exchange is None:
+            ex = _ScheduledBybitAsync(
+                {"enableRateLimit": False, "options": {"defaultType": "linear"}}
+            )
+            try:
+                await ex.load_markets()
+            except Exception as e:
+                # Sin mercados seguimos: ccxt los cargará en la 1ª petición
+                logger.warning(f"⚠️ No se pudieron precargar mercados: {e}")
+            _semaphore = asyncio.Semaphore(MARKET_DATA_MAX_CONCURRENCY)
+            _exchange = ex
+            logger.info("✅ Exchange async (Bybit) inicializado.")
+
+    return _exchange
+
+
+async def close_exchange() -> None:
+    """Cierra la sesión HTTP del exchange async (apagado limpio)."""
+    global _exchange
+    if _exchange is not None:
+        try:
+            await _exchange.close()
+        finally:
+            _exchange = None
+
+
+# ============================================================
+# 🕯️ OHLCV async
+# ============================================================
+async def _fetch_candles(
+    symbol: str, tf: str, limit: int, since: int | None = None
+) -> Optional[Candles]:
+    ex = await get_exchange()
+    async with _semaphore:
+        ohlcv = await ex.fetch_ohlcv(
+            symbol, timeframe=to_ccxt_timeframe(tf), since=since, limit=limit
+        )
+    return ohlcv_to_candles(symbol, tf, ohlcv)
+
+
+async def get_candles_async(
+    symbol: str, timeframe: str, limit: int = 200
+) -> Optional[Candles]:
+    """Equivalente async de bybit_client.get_candles (misma caché)."""
+    try:
+        if not CANDLE_CACHE_ENABLED:
+            return await _fetch_candles(symbol, timeframe, limit)
+
+        async def loader(n, since):
+            return await _fetch_candles(symbol, timeframe, n, since=since)
+
+        return await candle_cache.aget(symbol, timeframe, limit, loader)
+
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo OHLCV async {symbol} ({timeframe}): {e}")
+        return None
+
+
+async def fetch_timeframes(
+    symbol: str, timeframes: Iterable[str], limit: int = 200
+) -> Dict[str, Optional[Candles]]:
+    """
+    Descarga todas las temporalidades de un símbolo en paralelo.
+    Latencia ≈ un round trip (acotado por MARKET_DATA_MAX_CONCURRENCY).
+    """
+    tfs = list(dict.fromkeys(timeframes))
+    frames = await asyncio.gather(
+        *(get_candles_async(symbol, tf, limit) for tf in tfs)
+    )
+    return dict(zip(tfs, frames))
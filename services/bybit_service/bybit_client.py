@@ -4,20 +4,78 @@ import hmac
 import hashlib
 import requests
 import logging
-import pandas as pd
 from urllib.parse import urlencode
 import ccxt
-from config import BYBIT_SETTLE_COIN
-
-# Instancia CCXT (ajusta si ya la tienes global)
-exchange = ccxt.bybit({"enableRateLimit": True, "options": {"defaultType": "linear"}})
+from config import (
+    BYBIT_SETTLE_COIN,
+    CANDLE_CACHE_ENABLED,
+    CANDLE_CACHE_WINDOW,
+    CANDLE_STORE_ENABLED,
+    CANDLE_DB_PATH,
+    CANDLE_FLOAT_DTYPE,
+    SYMBOL_REGISTRY_REFRESH_SEC,
+    BYBIT_IP_RATE_PER_SEC,
+)
+from services.bybit_service.candle_cache import CandleCache, to_ccxt_timeframe
+from services.bybit_service.candles import Candles
+from services.bybit_service.candle_store import CandleStore
+from services.bybit_service.rate_limiter import RateScheduler
+from services.bybit_service.symbol_registry import SymbolRegistry
+from services.bybit_service.timeframe_index import TimeframeIndex
 
 logger = logging.getLogger("bybit_client")
 
+# Planificador único de peticiones REST (ccxt sync/async + _get/_post)
+rate_limiter = RateScheduler(ip_rate=BYBIT_IP_RATE_PER_SEC)
+
+# Código v5 de "too many visits"
+RATE_LIMIT_RET_CODE = 10006
+
+
+class ScheduledBybit(ccxt.bybit):
+    """
+    ccxt.bybit que pasa por rate_limiter en lugar de su throttle propio.
+    Un 10006 (ccxt.RateLimitExceeded) frena el bucket de esa ruta.
+    """
+
+    def fetch2(
+        self,
+        path,
+        api="public",
+        method="GET",
+        params={},
+        headers=None,
+        body=None,
+        config={},
+    ):
+        rate_limiter.acquire(path)
+        try:
+            return super().fetch2(path, api, method, params, headers, body, config)
+        except ccxt.RateLimitExceeded:
+            rate_limiter.penalize(path)
+            raise
+
+
+# Instancia CCXT (ajusta si ya la tienes global)
+exchange = ScheduledBybit(
+    {"enableRateLimit": False, "options": {"defaultType": "linear"}}
+)
+
 BYBIT_API_KEY = os.getenv("BYBIT_API_KEY")
 BYBIT_API_SECRET = os.getenv("BYBIT_API_SECRET")
 BASE_URL = "https://api.bybit.com"
 
+# Archivo local de velas (arranque en caliente tras reinicios)
+candle_store = None
+if CANDLE_STORE_ENABLED:
+    try:
+        candle_store = CandleStore(CANDLE_DB_PATH, dtype=CANDLE_FLOAT_DTYPE)
+    except Exception as e:
+        logger.error(f"❌ No se pudo abrir candle_store ({CANDLE_DB_PATH}): {e}")
+
+# Caché compartida de velas (symbol, timeframe)
+candle_cache = CandleCache(window=CANDLE_CACHE_WINDOW, store=candle_store)
+
 
 # ======================================================
 # 🔐 AUTH – GENERADOR DE FIRMA
@@ -38,8 +96,14 @@ def _sign(params: dict) -> dict:
 # ======================================================
 # 🧾 UTILIDAD — PETICIÓN HTTP
 # ======================================================
+def _check_rate_limit(path: str, data) -> None:
+    if isinstance(data, dict) and data.get("retCode") == RATE_LIMIT_RET_CODE:
+        rate_limiter.penalize(path)
+
+
 def _post(path: str, payload: dict):
     url = BASE_URL + path
+    rate_limiter.acquire(path)
     signed = _sign(payload)
     r = requests.post(url, data=signed, timeout=10)
     try:
@@ -47,11 +111,13 @@ def _post(path: str, payload: dict):
     except Exception:
         logger.error(f"Error parsing JSON from Bybit: {r.text}")
         return None
+    _check_rate_limit(path, data)
     return data
 
 
 def _get(path: str, payload: dict):
     url = BASE_URL + path
+    rate_limiter.acquire(path)
     signed = _sign(payload)
     r = requests.get(url, params=signed, timeout=10)
     try:
@@ -59,6 +125,7 @@ def _get(path: str, payload: dict):
     except Exception:
         logger.error(f"Error parsing JSON from Bybit: {r.text}")
         return None
+    _check_rate_limit(path, data)
     return data
 
 
@@ -67,6 +134,57 @@ def _get(path: str, payload: dict):
 # ============================================================
 
 
+def ohlcv_to_candles(symbol: str, tf: str, ohlcv):
+    """Convierte la lista [ts, o, h, l, c, v] de ccxt a Candles (o None)."""
+    if not ohlcv or not isinstance(ohlcv, list):
+        logger.error(f"❌ OHLCV inválido para {symbol} ({tf})")
+        return None
+
+    candles = Candles.from_rows(ohlcv, dtype=CANDLE_FLOAT_DTYPE)
+
+    if candles is None or candles.empty:
+        logger.warning(f"⚠️ OHLCV vacío para {symbol} ({tf})")
+        return None
+
+    return candles
+
+
+def _fetch_candles(symbol: str, tf: str, limit: int, since: int | None = None):
+    """
+    Descarga OHLCV del exchange y lo convierte a Candles (o None).
+    Con `since` (epoch ms) solo se piden las velas desde ese instante.
+    """
+    ohlcv = exchange.fetch_ohlcv(
+        symbol, timeframe=to_ccxt_timeframe(tf), since=since, limit=limit
+    )
+    return ohlcv_to_candles(symbol, tf, ohlcv)
+
+
+def get_candles(symbol: str, tf: str, limit: int = 200):
+    """
+    Velas como Candles (arrays NumPy, vista solo-lectura de la caché).
+    Es la ruta preferida del motor técnico; devuelve None si falla.
+    """
+    try:
+        if not tf:
+            logger.error("❌ get_candles llamado sin timeframe")
+            return None
+
+        if not CANDLE_CACHE_ENABLED:
+            return _fetch_candles(symbol, tf, limit)
+
+        return candle_cache.get(
+            symbol,
+            tf,
+            limit,
+            lambda n, since: _fetch_candles(symbol, tf, n, since=since),
+        )
+
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo OHLCV {symbol} ({tf}): {e}", exc_info=True)
+        return None
+
+
 def get_ohlcv_data(
     symbol: str, timeframe: str = None, interval: str = None, limit: int = 200
 ):
@@ -75,43 +193,102 @@ def get_ohlcv_data(
     - timeframe (nuevo)
     - interval (legacy)
     Devuelve siempre DataFrame o None
+
+    Pasa por candle_cache: una descarga de la ventana mayor sirve a
+    todas las peticiones hasta que cierra la siguiente vela; después
+    solo se piden las velas nuevas (refresco incremental). El DataFrame
+    es una vista sobre los arrays de la caché (añadir columnas es seguro).
     """
-    try:
-        tf = timeframe or interval
-        if not tf:
-            logger.error("❌ get_ohlcv_data llamado sin timeframe/interval")
-            return None
+    tf = timeframe or interval
+    if not tf:
+        logger.error("❌ get_ohlcv_data llamado sin timeframe/interval")
+        return None
 
-        ohlcv = exchange.fetch_ohlcv(symbol, timeframe=tf, limit=limit)
+    candles = get_candles(symbol, tf, limit)
+    return candles.to_frame() if candles is not None else None
 
-        if not ohlcv or not isinstance(ohlcv, list):
-            logger.error(f"❌ OHLCV inválido para {symbol} ({tf})")
-            return None
 
-        df = pd.DataFrame(
-            ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"]
+# ============================================================
+# 📇 REGISTRO DE INSTRUMENTOS (symbol_registry)
+# ============================================================
+def load_instrument_list():
+    """
+    {symbol: launch_ms} de los perpetuos lineales activos liquidados en
+    BYBIT_SETTLE_COIN, desde la lista de instrumentos de ccxt.
+    """
+    markets = exchange.load_markets(reload=True)
+    symbols = {}
+    for market in markets.values():
+        if not (market.get("swap") and market.get("linear")):
+            continue
+        if market.get("settle") != BYBIT_SETTLE_COIN:
+            continue
+        if market.get("active") is False:
+            continue
+        launch = market.get("created") or (market.get("info") or {}).get(
+            "launchTime"
         )
+        symbols[market["id"]] = int(launch) if launch else None
+    return symbols
 
-        if df.empty:
-            logger.warning(f"⚠️ DataFrame vacío para {symbol} ({tf})")
-            return None
-
-        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
-        df.set_index("timestamp", inplace=True)
 
-        for col in ["open", "high", "low", "close", "volume"]:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
+# Símbolos válidos en memoria: normalize_symbol sin llamadas de red
+symbol_registry = SymbolRegistry(
+    loader=load_instrument_list,
+    path=CANDLE_DB_PATH if CANDLE_STORE_ENABLED else None,
+    refresh_sec=SYMBOL_REGISTRY_REFRESH_SEC,
+)
 
-        df.dropna(inplace=True)
 
-        return df if not df.empty else None
+# ============================================================
+# 🗓️ DISPONIBILIDAD DE HISTÓRICO (timeframe_index)
+# ============================================================
+def get_listing_time_ms(symbol: str):
+    """
+    Epoch ms de la primera vela del símbolo.
+    1) launchTime del symbol_registry (sin red).
+    2) launchTime del instrumento (mercados ccxt, cacheados).
+    3) Sonda: vela mensual más antigua → primera vela diaria de ese mes.
+       Bybit devuelve las velas más recientes del rango pedido, así que
+       sin acotar [start, end] no se llega a la primera.
+    """
+    launch = symbol_registry.launch_time_ms(symbol)
+    if launch:
+        return launch
 
-    except Exception as e:
-        logger.error(
-            f"❌ Error obteniendo OHLCV {symbol} ({timeframe or interval}): {e}",
-            exc_info=True,
+    try:
+        exchange.load_markets()
+        market = exchange.market(symbol)
+        created = market.get("created") or (market.get("info") or {}).get(
+            "launchTime"
         )
+        if created:
+            return int(created)
+    except Exception as e:
+        logger.debug(f"launchTime no disponible para {symbol}: {e}")
+
+    monthly = exchange.fetch_ohlcv(symbol, timeframe="1M", limit=1000)
+    if not monthly:
+        return None
+    month_start = int(monthly[0][0])
+
+    daily = exchange.fetch_ohlcv(
+        symbol,
+        timeframe="1d",
+        since=month_start,
+        limit=1000,
+        params={"until": month_start + 62 * 86_400_000},
+    )
+    if not daily:
         return None
+    return int(daily[0][0])
+
+
+# Índice por símbolo: cero llamadas de red para elegir temporalidades
+timeframe_index = TimeframeIndex(
+    probe=get_listing_time_ms,
+    path=CANDLE_DB_PATH if CANDLE_STORE_ENABLED else None,
+)
 
 
 # ======================================================
@@ -0,0 +1,421 @@
+"""
+candle_cache.py — Caché compartida de velas OHLCV
+-------------------------------------------------
+Caché en memoria delante de bybit_client.get_ohlcv_data, con clave
+(symbol, timeframe) y el timeframe normalizado a ccxt: "240" y "4h"
+(o "D" y "1d") comparten entrada, descarga y filas del store.
+
+- Una entrada vive hasta que cierra la siguiente vela de su timeframe.
+- Sin entrada se descargan solo las velas pedidas (`limit`); una
+  petición mayor ensancha la entrada y con ella se sirven todas las
+  más pequeñas. Tras un reinicio se leen del store como mucho `window`
+  velas (CANDLE_CACHE_WINDOW).
+- Al caducar NO se vuelve a bajar la ventana completa: se piden solo las
+  velas posteriores al último timestamp conocido (`since=`) y se
+  sobrescribe / añade la cola de la ventana rodante.
+- Opcionalmente respaldada por un CandleStore (SQLite): tras un reinicio
+  la primera lectura sale del disco y solo se completa la cola.
+- Peticiones concurrentes idénticas (mismo símbolo, TF y ventana)
+  comparten una única descarga (single-flight).
+- Thread-safe: la comparten el monitor de posiciones, el loop de
+  reactivación y las señales nuevas.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from services.bybit_service.candles import Candles
+from services.common.single_flight import AsyncSingleFlight, SingleFlight
+
+logger = logging.getLogger("candle_cache")
+
+
+# ============================================================
+# ⏱️ Utilidades de timeframe
+# ============================================================
+_UNIT_SECONDS = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def timeframe_to_seconds(tf: str) -> Optional[int]:
+    """
+    Convierte un timeframe a segundos.
+
+    Acepta formato Bybit ("1", "15", "240", "D", "W") y formato ccxt
+    ("1m", "15m", "4h", "1d"). Devuelve None si no se reconoce.
+    """
+    if not tf:
+        return None
+    tf = str(tf).strip()
+
+    if tf.isdigit():
+        return int(tf) * 60
+
+    upper = tf.upper()
+    if upper == "D":
+        return 86400
+    if upper == "W":
+        return 604800
+
+    unit = tf[-1].lower()
+    amount = tf[:-1]
+    if unit in _UNIT_SECONDS and amount.isdigit():
+        return int(amount) * _UNIT_SECONDS[unit]
+
+    return None
+
+
+def to_ccxt_timeframe(tf: str) -> str:
+    """
+    Normaliza un timeframe al formato unificado de ccxt.
+    "240" → "4h", "60" → "1h", "15" → "15m", "D" → "1d".
+    """
+    tf = str(tf).strip()
+    if tf.isdigit():
+        minutes = int(tf)
+        if minutes % 1440 == 0:
+            return f"{minutes // 1440}d"
+        if minutes % 60 == 0:
+            return f"{minutes // 60}h"
+        return f"{minutes}m"
+    upper = tf.upper()
+    if upper == "D":
+        return "1d"
+    if upper == "W":
+        return "1w"
+    if upper == "M":
+        return "1M"
+    return tf
+
+
+def next_candle_close(tf: str, now: float | None = None) -> float:
+    """Epoch (s) en que cierra la vela en curso del timeframe."""
+    now = time.time() if now is None else now
+    period = timeframe_to_seconds(tf)
+    if not period:
+        # Timeframe desconocido → caducidad corta y conservadora
+        return now + 60
+    return (int(now // period) + 1) * period
+
+
+def _cache_key(symbol: str, tf: str) -> Tuple[str, str]:
+    return symbol.upper(), to_ccxt_timeframe(tf)
+
+
+# ============================================================
+# 📦 Caché
+# ============================================================
+class _Entry:
+    __slots__ = ("candles", "window", "expires_at")
+
+    def __init__(self, candles: Candles, window: int, expires_at: float):
+        self.candles = candles
+        self.window = window
+        self.expires_at = expires_at
+
+    @property
+    def last_ts_ms(self) -> int:
+        return self.candles.last_ts_ms
+
+
+class CandleCache:
+    """
+    Caché (symbol, timeframe) → Candles (arrays NumPy solo-lectura).
+
+    Las lecturas devuelven vistas de la ventana compartida, sin copiar.
+
+    `loader(limit, since)` es quien descarga realmente del exchange
+    (síncrono en get(), async en aget()); la caché solo decide cuándo
+    llamarlo y con qué ventana (ver _plan).
+
+    `store` (opcional) es un CandleStore: se lee (hasta `window` velas)
+    al no haber entrada en memoria y recibe cada descarga.
+    """
+
+    def __init__(self, window: int = 300, store=None):
+        self.window = int(window)
+        self.store = store
+        self._flight = SingleFlight()
+        self._aflight = AsyncSingleFlight()
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._lock = threading.Lock()
+
+        self._bar_listeners: list = []
+
+        self.hits = 0
+        self.misses = 0
+        self.incremental = 0
+
+    # --------------------------------------------------------
+    # Lectura
+    # --------------------------------------------------------
+    def get(
+        self,
+        symbol: str,
+        tf: str,
+        limit: int,
+        loader: Callable[[int, Optional[int]], Optional[Candles]],
+    ) -> Optional[Candles]:
+        """
+        Lectura síncrona: `loader` bloquea hasta tener las velas.
+        Hilos concurrentes con el mismo plan comparten una sola descarga.
+        """
+        key, now, hit, plan = self._plan(symbol, tf, limit)
+        if hit is not None:
+            return hit
+
+        def load():
+            candles = self._commit(
+                key, tf, now, plan, self._safe_load(loader, plan, tf)
+            )
+            if candles is None and plan[1] is not None:
+                # El refresco de cola falló o ya no hay base → carga completa
+                full = self._full_plan(limit)
+                fetched = self._safe_load(loader, full, tf)
+                candles = self._commit(key, tf, now, full, fetched)
+            return candles
+
+        candles = self._flight.do((key, plan), load)
+        return None if candles is None else candles.tail(limit)
+
+    async def aget(
+        self,
+        symbol: str,
+        tf: str,
+        limit: int,
+        loader: Callable[[int, Optional[int]], Awaitable[Optional[Candles]]],
+    ) -> Optional[Candles]:
+        """Igual que get(), pero con un loader async (ccxt.async_support)."""
+        key, now, hit, plan = self._plan(symbol, tf, limit)
+        if hit is not None:
+            return hit
+
+        async def load():
+            candles = self._commit(
+                key, tf, now, plan, await self._safe_aload(loader, plan, tf)
+            )
+            if candles is None and plan[1] is not None:
+                full = self._full_plan(limit)
+                fetched = await self._safe_aload(loader, full, tf)
+                candles = self._commit(key, tf, now, full, fetched)
+            return candles
+
+        candles = await self._aflight.do((key, plan), load)
+        return None if candles is None else candles.tail(limit)
+
+    # --------------------------------------------------------
+    # Plan / commit (compartido por get y aget)
+    # --------------------------------------------------------
+    def _full_plan(self, limit: int) -> Tuple[int, None, int]:
+        # Solo lo pedido: una petición mayor volverá a pasar por aquí
+        limit = int(limit)
+        return limit, None, limit
+
+    def _plan(self, symbol: str, tf: str, limit: int):
+        """
+        Devuelve (key, now, hit, plan) con plan = (n, since, window):
+
+        - sin entrada / corta → (limit, None, limit)       (carga completa)
+        - entrada caducada    → (k + 2, last_ts, window)   (solo la cola)
+        - entrada vigente     → hit (vista), sin red
+        """
+        key = _cache_key(symbol, tf)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and limit <= entry.window and entry.expires_at > now:
+                self.hits += 1
+                return key, now, entry.candles.tail(limit), None
+            self.misses += 1
+
+        if entry is None and self.store is not None:
+            entry = self._warm_from_store(key)
+
+        if entry is not None and limit <= entry.window:
+            period = timeframe_to_seconds(tf)
+            if period:
+                last_ts = entry.last_ts_ms
+                elapsed = max(0, int(now * 1000) - last_ts) // (period * 1000)
+                if elapsed + 1 < entry.window:
+                    return key, now, None, (int(elapsed) + 2, last_ts, entry.window)
+
+        return key, now, None, self._full_plan(limit)
+
+    def _warm_from_store(self, key: Tuple[str, str]) -> Optional[_Entry]:
+        """Carga la ventana desde disco como entrada ya caducada."""
+        try:
+            candles = self.store.load(key[0], key[1], self.window)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo leer candle_store {key}: {e}")
+            return None
+
+        if candles is None or candles.empty:
+            return None
+
+        # La ventana es lo que había en disco: si no basta, carga completa
+        entry = _Entry(candles, min(self.window, len(candles)), 0.0)
+        with self._lock:
+            self._entries.setdefault(key, entry)
+        return entry
+
+    def _commit(
+        self,
+        key: Tuple[str, str],
+        tf: str,
+        now: float,
+        plan: Tuple[int, Optional[int], int],
+        fetched: Optional[Candles],
+    ) -> Optional[Candles]:
+        """
+        Guarda la descarga y devuelve la ventana completa (sin copiar).
+        Una cola incremental sin entrada sobre la que fusionarse (p. ej.
+        invalidada durante la descarga) no es una ventana: devuelve None
+        sin guardar nada y el llamador recarga completo.
+        """
+        if fetched is None or fetched.empty:
+            return None
+
+        _, since, window = plan
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if since is not None:
+                if entry is None:
+                    return None
+                candles = entry.candles.merge_tail(fetched, window)
+                self.incremental += 1
+            else:
+                candles = fetched.tail(window)
+            self._entries[key] = _Entry(candles, window, next_candle_close(tf, now))
+
+        if self.store is not None:
+            try:
+                self.store.save(key[0], key[1], fetched)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo persistir velas {key}: {e}")
+
+        return candles
+
+    @staticmethod
+    def _safe_load(loader, plan, tf: str) -> Optional[Candles]:
+        n, since, _ = plan
+        if since is None:
+            return loader(n, None)
+        try:
+            return loader(n, since)
+        except Exception as e:
+            logger.warning(f"⚠️ Refresco incremental falló ({tf}): {e}")
+            return None
+
+    @staticmethod
+    async def _safe_aload(loader, plan, tf: str) -> Optional[Candles]:
+        n, since, _ = plan
+        if since is None:
+            return await loader(n, None)
+        try:
+            return await loader(n, since)
+        except Exception as e:
+            logger.warning(f"⚠️ Refresco incremental falló ({tf}): {e}")
+            return None
+
+    # --------------------------------------------------------
+    # Streaming (WebSocket kline)
+    # --------------------------------------------------------
+    def apply_stream_bar(
+        self,
+        symbol: str,
+        tf: str,
+        ts_ms: int,
+        ohlcv: Tuple[float, float, float, float, float],
+        confirmed: bool = False,
+    ) -> bool:
+        """
+        Aplica una vela recibida por WebSocket sobre la ventana en memoria.
+
+        - Solo actualiza entradas existentes (la carga inicial es REST).
+        - Mientras llegan velas, la entrada se mantiene vigente.
+        - Si hay hueco (se perdieron velas), se marca caducada para que
+          el siguiente get() complete la cola por REST.
+        - Las velas confirmadas se persisten en el store y se notifican a
+          los listeners (estado incremental de indicadores).
+        Devuelve True si se aplicó.
+        """
+        key = _cache_key(symbol, tf)
+        period = timeframe_to_seconds(tf)
+        if not period:
+            return False
+
+        row = Candles.from_rows([(int(ts_ms), *ohlcv)])
+        if row is None:
+            return False
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+
+            last_ts = entry.last_ts_ms
+            if ts_ms < last_ts:
+                return False
+            if ts_ms - last_ts > period * 1000:
+                entry.expires_at = 0.0
+                return False
+
+            candles = entry.candles.merge_tail(row, entry.window)
+            self._entries[key] = _Entry(
+                candles, entry.window, next_candle_close(tf, time.time())
+            )
+
+        if confirmed and self.store is not None:
+            try:
+                self.store.save(key[0], key[1], row)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo persistir vela WS {key}: {e}")
+
+        if confirmed:
+            for listener in self._bar_listeners:
+                try:
+                    # Los listeners reciben el timeframe tal como llegó
+                    listener(key[0], str(tf), int(ts_ms), ohlcv)
+                except Exception as e:
+                    logger.warning(f"⚠️ Listener de vela cerrada falló {key}: {e}")
+
+        return True
+
+    def add_bar_listener(
+        self, fn: Callable[[str, str, int, Tuple[float, ...]], None]
+    ) -> None:
+        """fn(symbol, tf, ts_ms, ohlcv) por cada vela cerrada del stream."""
+        self._bar_listeners.append(fn)
+
+    # --------------------------------------------------------
+    # Mantenimiento
+    # --------------------------------------------------------
+    def invalidate(self, symbol: str | None = None, tf: str | None = None) -> None:
+        with self._lock:
+            if symbol is None and tf is None:
+                self._entries.clear()
+                return
+            for key in list(self._entries):
+                if symbol is not None and key[0] != symbol.upper():
+                    continue
+                if tf is not None and key[1] != to_ccxt_timeframe(tf):
+                    continue
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "incremental": self.incremental,
+                "coalesced": self._flight.shared + self._aflight.shared,
+                "bytes": sum(e.candles.nbytes() for e in self._entries.values()),
+                "hit_ratio": (self.hits / total) if total else 0.0,
+            }
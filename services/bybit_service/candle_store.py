@@ -0,0 +1,237 @@
+"""
+candle_store.py — Archivo local de velas OHLCV (SQLite)
+-------------------------------------------------------
+Persistencia de velas por (symbol, timeframe) junto a trading_ai.db,
+para que un reinicio (systemd Restart=always) arranque con la caché
+caliente y solo complete la cola desde el exchange.
+
+También sirve como fuente de histórico para replay / benchmarks
+offline (load_history) y guarda los checkpoints del estado incremental
+de indicadores (indicator_state.py).
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+from typing import Optional
+
+import numpy as np
+
+from services.bybit_service.candle_cache import to_ccxt_timeframe
+from services.bybit_service.candles import Candles
+
+logger = logging.getLogger("candle_store")
+
+
+class CandleStore:
+    """
+    Tabla `candles` con clave (symbol, timeframe, ts) en epoch ms; el
+    timeframe se guarda normalizado a ccxt ("240" → "4h"), como la clave
+    de candle_cache. Una conexión por operación (como database.py) →
+    segura entre hilos.
+    """
+
+    def __init__(self, path: str = "market_data.db", dtype=np.float64):
+        self.path = path
+        self.dtype = dtype
+        self._write_lock = threading.Lock()
+        self._init_schema()
+
+    # --------------------------------------------------------
+    # Conexión / esquema
+    # --------------------------------------------------------
+    def _get_conn(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._get_conn()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS candles (
+                    symbol TEXT NOT NULL,
+                    timeframe TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    open REAL NOT NULL,
+                    high REAL NOT NULL,
+                    low REAL NOT NULL,
+                    close REAL NOT NULL,
+                    volume REAL NOT NULL,
+                    PRIMARY KEY (symbol, timeframe, ts)
+                ) WITHOUT ROWID;
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS indicator_state (
+                    symbol TEXT NOT NULL,
+                    timeframe TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    last_ts INTEGER NOT NULL,
+                    scalars TEXT NOT NULL,
+                    series BLOB NOT NULL,
+                    PRIMARY KEY (symbol, timeframe)
+                );
+            """)
+            self._normalize_timeframes(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _normalize_timeframes(conn) -> None:
+        """Pasa las filas guardadas con timeframe Bybit ("240") a ccxt ("4h")."""
+        old = [
+            tf
+            for (tf,) in conn.execute("SELECT DISTINCT timeframe FROM candles")
+            if to_ccxt_timeframe(tf) != tf
+        ]
+        for tf in old:
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO candles
+                SELECT symbol, ?, ts, open, high, low, close, volume
+                FROM candles WHERE timeframe = ?
+                """,
+                (to_ccxt_timeframe(tf), tf),
+            )
+            conn.execute("DELETE FROM candles WHERE timeframe = ?", (tf,))
+        if old:
+            logger.info(f"🗂️ candle_store: timeframes normalizados {old}")
+
+    # --------------------------------------------------------
+    # Escritura
+    # --------------------------------------------------------
+    def save(self, symbol: str, tf: str, candles: Candles) -> None:
+        """Inserta / sobrescribe las velas (upsert por ts)."""
+        if candles is None or candles.empty:
+            return
+
+        key = (symbol.upper(), to_ccxt_timeframe(tf))
+        rows = [key + row for row in candles.rows()]
+
+        with self._write_lock:
+            conn = self._get_conn()
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+    def prune(self, keep_bars: int) -> None:
+        """Conserva solo las últimas `keep_bars` velas por (symbol, timeframe)."""
+        with self._write_lock:
+            conn = self._get_conn()
+            try:
+                conn.execute(
+                    """
+                    DELETE FROM candles
+                    WHERE (symbol, timeframe, ts) IN (
+                        SELECT symbol, timeframe, ts FROM (
+                            SELECT symbol, timeframe, ts,
+                                   ROW_NUMBER() OVER (
+                                       PARTITION BY symbol, timeframe
+                                       ORDER BY ts DESC
+                                   ) AS rn
+                            FROM candles
+                        ) WHERE rn > ?
+                    )
+                    """,
+                    (int(keep_bars),),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+    # --------------------------------------------------------
+    # Lectura
+    # --------------------------------------------------------
+    def load(self, symbol: str, tf: str, limit: int) -> Optional[Candles]:
+        """Últimas `limit` velas guardadas (orden ascendente) o None."""
+        conn = self._get_conn()
+        try:
+            rows = conn.execute(
+                """
+                SELECT ts, open, high, low, close, volume
+                FROM candles
+                WHERE symbol = ? AND timeframe = ?
+                ORDER BY ts DESC
+                LIMIT ?
+                """,
+                (symbol.upper(), to_ccxt_timeframe(tf), int(limit)),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        return Candles.from_rows(rows[::-1], dtype=self.dtype)
+
+    def load_history(
+        self,
+        symbol: str,
+        tf: str,
+        start_ms: int | None = None,
+        end_ms: int | None = None,
+    ) -> Optional[Candles]:
+        """Histórico completo (o rango [start_ms, end_ms]) para replay offline."""
+        query = (
+            "SELECT ts, open, high, low, close, volume FROM candles "
+            "WHERE symbol = ? AND timeframe = ?"
+        )
+        params: list = [symbol.upper(), to_ccxt_timeframe(tf)]
+        if start_ms is not None:
+            query += " AND ts >= ?"
+            params.append(int(start_ms))
+        if end_ms is not None:
+            query += " AND ts <= ?"
+            params.append(int(end_ms))
+        query += " ORDER BY ts ASC"
+
+        conn = self._get_conn()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
+        return Candles.from_rows(rows, dtype=self.dtype)
+
+    # --------------------------------------------------------
+    # Checkpoints de indicadores (indicator_state.py)
+    # --------------------------------------------------------
+    def save_indicator_state(
+        self,
+        symbol: str,
+        tf: str,
+        params: str,
+        last_ts: int,
+        scalars: str,
+        series: bytes,
+    ) -> None:
+        with self._write_lock:
+            conn = self._get_conn()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO indicator_state VALUES (?, ?, ?, ?, ?, ?)",
+                    (symbol.upper(), str(tf), params, int(last_ts), scalars, series),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+    def load_indicator_state(self, symbol: str, tf: str, params: str):
+        """(last_ts, scalars, series) o None si no hay checkpoint compatible."""
+        conn = self._get_conn()
+        try:
+            row = conn.execute(
+                """
+                SELECT last_ts, scalars, series FROM indicator_state
+                WHERE symbol = ? AND timeframe = ? AND params = ?
+                """,
+                (symbol.upper(), str(tf), params),
+            ).fetchone()
+        finally:
+            conn.close()
+        return row
@@ -0,0 +1,167 @@
+"""
+candles.py — Contenedor OHLCV sobre arrays NumPy
+------------------------------------------------
+Sustituye al DataFrame construido en cada llamada:
+
+- ts:      int64 epoch ms (contiguo)
+- o/h/l/c/v: un único bloque float (5, n), cada fila contigua;
+  float64 por defecto, float32 opcional (CANDLE_FLOAT_DTYPE).
+
+Los arrays se marcan como solo-lectura: tail() y to_frame() devuelven
+vistas sin copiar, y nadie puede corromper la ventana compartida de
+candle_cache por accidente. Quien necesite pandas pide to_frame().
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+OHLCV_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+class Candles:
+    __slots__ = ("ts", "_block")
+
+    def __init__(self, ts: np.ndarray, block: np.ndarray):
+        self.ts = ts
+        self._block = block
+        self.ts.flags.writeable = False
+        self._block.flags.writeable = False
+
+    # --------------------------------------------------------
+    # Construcción
+    # --------------------------------------------------------
+    @classmethod
+    def from_rows(
+        cls, rows: Sequence[Sequence[float]], dtype=np.float64
+    ) -> Optional["Candles"]:
+        """
+        Desde [[ts, o, h, l, c, v], ...] (ccxt / SQLite).
+        Una conversión a ndarray + una trasposición; filas con NaN fuera.
+        """
+        if rows is None or len(rows) == 0:
+            return None
+
+        arr = np.asarray(rows, dtype=np.float64)
+        if arr.ndim != 2 or arr.shape[1] < 6:
+            return None
+
+        finite = np.isfinite(arr[:, :6]).all(axis=1)
+        if not finite.all():
+            arr = arr[finite]
+            if len(arr) == 0:
+                return None
+
+        ts = arr[:, 0].astype(np.int64)
+        block = np.ascontiguousarray(arr[:, 1:6].T, dtype=dtype)
+        return cls(ts, block)
+
+    # --------------------------------------------------------
+    # Acceso
+    # --------------------------------------------------------
+    @property
+    def open(self) -> np.ndarray:
+        return self._block[0]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self._block[1]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self._block[2]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self._block[3]
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self._block[4]
+
+    @property
+    def dtype(self):
+        return self._block.dtype
+
+    @property
+    def empty(self) -> bool:
+        return len(self.ts) == 0
+
+    @property
+    def last_ts_ms(self) -> int:
+        return int(self.ts[-1])
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def nbytes(self) -> int:
+        return self.ts.nbytes + self._block.nbytes
+
+    # --------------------------------------------------------
+    # Operaciones (sin copia salvo merge)
+    # --------------------------------------------------------
+    def tail(self, n: int) -> "Candles":
+        """Últimas n velas como vista."""
+        if n >= len(self.ts):
+            return self
+        return Candles(self.ts[-n:], self._block[:, -n:])
+
+    def merge_tail(self, tail: "Candles", window: int) -> "Candles":
+        """
+        Sobrescribe / añade `tail` al final y recorta a `window` velas.
+        La vela en formación anterior queda reemplazada por su versión
+        cerrada.
+        """
+        cut = int(np.searchsorted(self.ts, tail.ts[0], side="left"))
+        ts = np.concatenate([self.ts[:cut], tail.ts])[-window:]
+        block = np.concatenate(
+            [self._block[:, :cut], tail._block.astype(self._block.dtype, copy=False)],
+            axis=1,
+        )[:, -window:]
+        return Candles(ts, block)
+
+    def rows(self) -> list:
+        """[(ts, o, h, l, c, v), ...] para persistir."""
+        return list(zip(self.ts.tolist(), *(col.tolist() for col in self._block)))
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Vista pandas (índice datetime, columnas OHLCV) sin copiar datos.
+        Añadir columnas es seguro; escribir en las OHLCV no (solo-lectura).
+        """
+        index = pd.DatetimeIndex(self.ts.astype("datetime64[ms]"), name="timestamp")
+        return pd.DataFrame(
+            {name: self._block[i] for i, name in enumerate(OHLCV_FIELDS)},
+            index=index,
+            copy=False,
+        )
+
+
+def stack_tails(
+    items: Sequence[Optional[Candles]],
+    bars: int,
+    fields: Sequence[str] = ("high", "low", "close"),
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Apila las últimas `bars` velas de N series en arrays (N, bars),
+    alineadas a la derecha (última columna = última vela de cada una).
+    Historias más cortas (o None) quedan rellenas con NaN a la izquierda
+    y ts = 0.
+    """
+    n = len(items)
+    ts = np.zeros((n, bars), dtype=np.int64)
+    out = {name: np.full((n, bars), np.nan) for name in fields}
+
+    for i, candles in enumerate(items):
+        if candles is None or candles.empty:
+            continue
+        tail = candles.tail(bars)
+        k = len(tail)
+        ts[i, bars - k :] = tail.ts
+        for name in fields:
+            out[name][i, bars - k :] = getattr(tail, name)
+
+    return ts, out
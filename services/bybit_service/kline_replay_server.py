@@ -0,0 +1,126 @@
+"""
+kline_replay_server.py — Servidor WebSocket local que imita Bybit v5
+--------------------------------------------------------------------
+Reproduce frames kline grabados (JSONL, uno por línea, tal como los
+graba KlineStream con BYBIT_WS_RECORD_PATH) para probar todo el flujo
+WebSocket → candle_cache sin red.
+
+Protocolo soportado (subset de Bybit v5 public):
+  → {"op": "subscribe",   "args": ["kline.15.BTCUSDT", ...]}
+  → {"op": "unsubscribe", "args": [...]}
+  → {"op": "ping"}
+  ← {"success": true, "ret_msg": "", "op": "..."}
+  ← {"topic": "kline.15.BTCUSDT", "type": "snapshot", "data": [...]}
+
+Uso:
+  python -m services.bybit_service.kline_replay_server frames.jsonl --port 8765
+  BYBIT_WS_ENABLED=true BYBIT_WS_URL=ws://127.0.0.1:8765 python main.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, List, Set
+
+from aiohttp import WSMsgType, web
+
+logger = logging.getLogger("kline_replay_server")
+
+
+def load_frames(path: str) -> Dict[str, List[str]]:
+    """Agrupa los frames grabados por topic, en orden de llegada."""
+    by_topic: Dict[str, List[str]] = defaultdict(list)
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                topic = json.loads(line).get("topic")
+            except Exception:
+                continue
+            if topic and topic.startswith("kline."):
+                by_topic[topic].append(line)
+    return dict(by_topic)
+
+
+def build_app(frames: Dict[str, List[str]], interval: float = 0.05) -> web.Application:
+    """
+    Crea la aplicación aiohttp. Cada conexión recibe, para cada topic al
+    que se suscribe, sus frames grabados separados `interval` segundos.
+    """
+
+    async def ws_handler(request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        subscribed: Set[str] = set()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def replay(topic: str) -> None:
+            for raw in frames.get(topic, []):
+                if topic not in subscribed or ws.closed:
+                    return
+                await ws.send_str(raw)
+                await asyncio.sleep(interval)
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    req = json.loads(msg.data)
+                except Exception:
+                    continue
+
+                op = req.get("op")
+                args = req.get("args") or []
+
+                if op == "ping":
+                    await ws.send_json({"success": True, "ret_msg": "pong", "op": "ping"})
+                elif op == "subscribe":
+                    for topic in args:
+                        if topic not in subscribed:
+                            subscribed.add(topic)
+                            tasks[topic] = asyncio.create_task(replay(topic))
+                    await ws.send_json({"success": True, "ret_msg": "", "op": op})
+                elif op == "unsubscribe":
+                    for topic in args:
+                        subscribed.discard(topic)
+                        task = tasks.pop(topic, None)
+                        if task:
+                            task.cancel()
+                    await ws.send_json({"success": True, "ret_msg": "", "op": op})
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/", ws_handler)
+    app.router.add_get("/v5/public/linear", ws_handler)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay local de klines Bybit v5")
+    parser.add_argument("frames", help="Archivo JSONL con frames grabados")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    frames = load_frames(args.frames)
+    logger.info(f"▶️ {sum(len(v) for v in frames.values())} frames / {len(frames)} topics")
+
+    web.run_app(build_app(frames, args.interval), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
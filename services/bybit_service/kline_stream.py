@@ -0,0 +1,280 @@
+"""
+kline_stream.py — Consumidor WebSocket de klines Bybit v5
+---------------------------------------------------------
+Mantiene candle_cache al día en tiempo real con los topics públicos
+`kline.{interval}.{symbol}` en lugar de hacer polling REST.
+
+Conjunto vigilado (watch set) = unión de:
+  - posiciones abiertas      → set_watch("positions", [...])
+  - señales pendientes       → set_watch("signals", [...])
+  - análisis puntuales       → touch(symbol)   (expira tras TTL)
+
+Los cambios del conjunto se traducen en subscribe / unsubscribe
+dinámicos sobre la conexión abierta. Al entrar un símbolo nuevo se
+siembra su ventana por REST async (fetch_timeframes) y a partir de ahí
+el WebSocket solo actualiza la cola.
+
+Para pruebas offline: kline_replay_server.py reproduce frames grabados
+(ver BYBIT_WS_RECORD_PATH).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+import aiohttp
+
+logger = logging.getLogger("kline_stream")
+
+PING_INTERVAL_SEC = 20
+MAX_ARGS_PER_REQUEST = 10  # límite Bybit por mensaje subscribe/unsubscribe
+
+
+class KlineStream:
+    def __init__(
+        self,
+        cache,
+        url: str,
+        timeframes: Iterable[str],
+        touch_ttl: int = 3600,
+        record_path: Optional[str] = None,
+        seed=None,
+    ):
+        """
+        cache:      CandleCache destino (apply_stream_bar).
+        seed:       coroutine opcional seed(symbol, timeframes) para cargar
+                    la ventana inicial por REST al entrar un símbolo.
+        """
+        self.cache = cache
+        self.url = url
+        self.timeframes = list(timeframes)
+        self.touch_ttl = touch_ttl
+        self.record_path = record_path
+        self.seed = seed
+
+        self._owners: Dict[str, Set[str]] = {}
+        self._touched: Dict[str, float] = {}
+        self._subscribed: Set[str] = set()
+        self._changed: Optional[asyncio.Event] = None
+        self._running = False
+
+        self.frames_received = 0
+        self.bars_applied = 0
+
+    # ========================================================
+    # Watch set
+    # ========================================================
+    def set_watch(self, owner: str, symbols: Iterable[str]) -> None:
+        """Reemplaza el conjunto de símbolos de un origen (positions/signals)."""
+        new = {s.upper() for s in symbols if s}
+        if self._owners.get(owner) != new:
+            self._owners[owner] = new
+            self._notify()
+
+    def touch(self, symbol: str) -> None:
+        """Mantiene el símbolo suscrito durante touch_ttl segundos."""
+        if not symbol:
+            return
+        symbol = symbol.upper()
+        is_new = symbol not in self.watched_symbols()
+        self._touched[symbol] = time.time() + self.touch_ttl
+        if is_new:
+            self._notify()
+
+    def watched_symbols(self) -> Set[str]:
+        now = time.time()
+        for sym, until in list(self._touched.items()):
+            if until <= now:
+                del self._touched[sym]
+
+        out: Set[str] = set(self._touched)
+        for syms in self._owners.values():
+            out |= syms
+        return out
+
+    def _wanted_topics(self) -> Set[str]:
+        return {
+            f"kline.{tf}.{sym}"
+            for sym in self.watched_symbols()
+            for tf in self.timeframes
+        }
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+
+    # ========================================================
+    # Loop principal
+    # ========================================================
+    async def run(self) -> None:
+        """Conecta, sincroniza suscripciones y reconecta con backoff."""
+        self._running = True
+        self._changed = asyncio.Event()
+        backoff = 1.0
+
+        logger.info(f"📡 KlineStream iniciado → {self.url}")
+
+        while self._running:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.url, heartbeat=None) as ws:
+                        logger.info("✅ WebSocket kline conectado")
+                        backoff = 1.0
+                        self._subscribed = set()
+                        await self._serve(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ WebSocket kline desconectado: {e}")
+
+            if self._running:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    def stop(self) -> None:
+        self._running = False
+        self._notify()
+
+    async def _serve(self, ws) -> None:
+        reader = asyncio.create_task(self._read_loop(ws))
+        try:
+            await self._sync_subscriptions(ws)
+            last_ping = time.monotonic()
+
+            while self._running and not reader.done():
+                try:
+                    # Despierta por cambio del watch set o para revisar TTLs
+                    await asyncio.wait_for(self._changed.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+                self._changed.clear()
+
+                await self._sync_subscriptions(ws)
+
+                if time.monotonic() - last_ping >= PING_INTERVAL_SEC:
+                    await ws.send_json({"op": "ping"})
+                    last_ping = time.monotonic()
+        finally:
+            reader.cancel()
+            try:
+                await reader
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def _sync_subscriptions(self, ws) -> None:
+        wanted = self._wanted_topics()
+        to_add = sorted(wanted - self._subscribed)
+        to_remove = sorted(self._subscribed - wanted)
+
+        for chunk in _chunks(to_remove, MAX_ARGS_PER_REQUEST):
+            await ws.send_json({"op": "unsubscribe", "args": chunk})
+        self._subscribed -= set(to_remove)
+
+        for chunk in _chunks(to_add, MAX_ARGS_PER_REQUEST):
+            await ws.send_json({"op": "subscribe", "args": chunk})
+        self._subscribed |= set(to_add)
+
+        if to_add or to_remove:
+            logger.info(
+                f"📡 Klines: +{len(to_add)} / -{len(to_remove)} topics "
+                f"({len(self._subscribed)} activos)"
+            )
+
+        new_symbols = {t.split(".", 2)[2] for t in to_add}
+        if new_symbols and self.seed is not None:
+            for sym in new_symbols:
+                asyncio.create_task(self._seed_symbol(sym))
+
+    async def _seed_symbol(self, symbol: str) -> None:
+        try:
+            await self.seed(symbol, self.timeframes)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo sembrar velas de {symbol}: {e}")
+
+    async def _read_loop(self, ws) -> None:
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                self._record(msg.data)
+                self.handle_message(msg.data)
+            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                break
+
+    # ========================================================
+    # Procesado de frames
+    # ========================================================
+    def handle_message(self, raw: str) -> int:
+        """
+        Procesa un frame Bybit v5. Devuelve el número de velas aplicadas.
+
+        {"topic": "kline.5.BTCUSDT", "type": "snapshot",
+         "data": [{"start": ..., "open": "...", "high": "...", "low": "...",
+                   "close": "...", "volume": "...", "confirm": false}]}
+        """
+        try:
+            payload = json.loads(raw)
+        except Exception:
+            return 0
+
+        topic = payload.get("topic") or ""
+        if not topic.startswith("kline."):
+            if payload.get("op") == "subscribe" and not payload.get("success", True):
+                logger.warning(f"⚠️ Suscripción rechazada: {payload.get('ret_msg')}")
+            return 0
+
+        self.frames_received += 1
+
+        try:
+            _, tf, symbol = topic.split(".", 2)
+        except ValueError:
+            return 0
+
+        applied = 0
+        for bar in payload.get("data") or []:
+            try:
+                ohlcv = (
+                    float(bar["open"]),
+                    float(bar["high"]),
+                    float(bar["low"]),
+                    float(bar["close"]),
+                    float(bar["volume"]),
+                )
+                if self.cache.apply_stream_bar(
+                    symbol,
+                    tf,
+                    int(bar["start"]),
+                    ohlcv,
+                    confirmed=bool(bar.get("confirm")),
+                ):
+                    applied += 1
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        self.bars_applied += applied
+        return applied
+
+    def _record(self, raw: str) -> None:
+        if not self.record_path:
+            return
+        try:
+            with open(self.record_path, "a", encoding="utf-8") as fh:
+                fh.write(raw.strip() + "\n")
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo grabar frame WS: {e}")
+            self.record_path = None
+
+    def stats(self) -> dict:
+        return {
+            "watched_symbols": len(self.watched_symbols()),
+            "subscribed_topics": len(self._subscribed),
+            "frames_received": self.frames_received,
+            "bars_applied": self.bars_applied,
+        }
+
+
+def _chunks(items: List[str], size: int):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
@@ -0,0 +1,240 @@
+"""
+rate_limiter.py — Planificador único de peticiones REST a Bybit
+---------------------------------------------------------------
+Token buckets por clase de endpoint (límites v5 por UID) más un bucket
+global por IP, compartidos por TODAS las salidas: ccxt síncrono, ccxt
+async y el cliente firmado (_get / _post).
+
+- Prioridad: órdenes > posiciones > cuenta > market data. Una petición
+  solo espera detrás de otras de mayor prioridad que compitan por sus
+  mismos buckets; el market data no retrasa una orden.
+- Un 10006 (rate limit) vacía el bucket afectado durante un instante en
+  vez de reintentar a ciegas.
+- stats(): profundidad de cola y tiempos de espera.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger("rate_limiter")
+
+
+# ============================================================
+# 📋 Reglas por endpoint
+# ============================================================
+# (prefijo de ruta, clase, prioridad) — menor prioridad = antes
+ENDPOINT_RULES: List[Tuple[str, str, int]] = [
+    ("v5/order/", "order", 0),
+    ("v5/position/", "position", 1),
+    ("v5/account/", "account", 2),
+    ("v5/asset/", "account", 2),
+    ("v5/market/", "market", 3),
+]
+DEFAULT_CLASS = ("other", 2)
+
+# clase → (peticiones por segundo, ráfaga)
+CLASS_LIMITS: Dict[str, Tuple[float, float]] = {
+    "order": (10, 10),
+    "position": (50, 50),
+    "account": (50, 50),
+    "market": (50, 100),
+    "other": (20, 20),
+}
+
+
+def classify(path: str) -> Tuple[str, int]:
+    """Ruta REST ("/v5/order/create" o "v5/market/kline") → (clase, prioridad)."""
+    path = str(path).lstrip("/")
+    for prefix, cls, priority in ENDPOINT_RULES:
+        if path.startswith(prefix):
+            return cls, priority
+    return DEFAULT_CLASS
+
+
+# ============================================================
+# 🪣 Token bucket
+# ============================================================
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, weight: float, now: float) -> float:
+        """Segundos hasta disponer de `weight` tokens (0 = ya)."""
+        self._refill(now)
+        missing = weight - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self, weight: float) -> None:
+        self.tokens -= weight
+
+    def drain(self, seconds: float) -> None:
+        """Deja el bucket en negativo: nada sale hasta dentro de `seconds`."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+class _Ticket:
+    __slots__ = ("order", "buckets", "weight")
+
+    def __init__(self, order: Tuple[int, int], buckets: tuple, weight: float):
+        self.order = order
+        self.buckets = buckets
+        self.weight = weight
+
+
+# ============================================================
+# 🚦 Planificador
+# ============================================================
+class RateScheduler:
+    def __init__(
+        self,
+        ip_rate: float = 100,
+        ip_burst: float | None = None,
+        limits: Dict[str, Tuple[float, float]] | None = None,
+    ):
+        limits = limits or CLASS_LIMITS
+        self._buckets = {cls: TokenBucket(r, b) for cls, (r, b) in limits.items()}
+        self._ip = TokenBucket(ip_rate, ip_burst or ip_rate)
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting: List[_Ticket] = []
+
+        self.granted: Dict[str, int] = {cls: 0 for cls in self._buckets}
+        self.delayed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.rate_limited = 0
+
+    # --------------------------------------------------------
+    # Núcleo (siempre bajo self._cond)
+    # --------------------------------------------------------
+    def _enqueue(self, path: str, weight: float, priority: int | None):
+        cls, default_priority = classify(path)
+        if cls not in self._buckets:
+            cls = DEFAULT_CLASS[0]
+        priority = default_priority if priority is None else priority
+        ticket = _Ticket(
+            (priority, next(self._seq)), (self._buckets[cls], self._ip), weight
+        )
+        self._waiting.append(ticket)
+        return cls, ticket
+
+    def _try_grant(self, ticket: _Ticket) -> float:
+        """Concede si puede (devuelve 0) o indica cuánto esperar."""
+        now = time.monotonic()
+
+        # Alguien con más prioridad compite por nuestros buckets → detrás
+        for other in self._waiting:
+            if other.order < ticket.order and any(
+                b in ticket.buckets for b in other.buckets
+            ):
+                blocker = max(b.wait_time(other.weight, now) for b in other.buckets)
+                return max(blocker, 0.001)
+
+        delay = max(b.wait_time(ticket.weight, now) for b in ticket.buckets)
+        if delay > 0:
+            return delay
+
+        for b in ticket.buckets:
+            b.take(ticket.weight)
+        self._waiting.remove(ticket)
+        self._cond.notify_all()
+        return 0.0
+
+    def _done(self, cls: str, waited: float) -> None:
+        self.granted[cls] += 1
+        if waited > 0.001:
+            self.delayed += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def _abandon(self, ticket: _Ticket) -> None:
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            self._cond.notify_all()
+
+    # --------------------------------------------------------
+    # API
+    # --------------------------------------------------------
+    def acquire(
+        self, path: str, weight: float = 1, priority: int | None = None
+    ) -> float:
+        """Bloquea hasta poder lanzar la petición. Devuelve la espera (s)."""
+        start = time.monotonic()
+        with self._cond:
+            cls, ticket = self._enqueue(path, weight, priority)
+            try:
+                while True:
+                    delay = self._try_grant(ticket)
+                    if delay == 0:
+                        break
+                    self._cond.wait(delay)
+            finally:
+                self._abandon(ticket)
+            waited = time.monotonic() - start
+            self._done(cls, waited)
+        return waited
+
+    async def acquire_async(
+        self, path: str, weight: float = 1, priority: int | None = None
+    ) -> float:
+        """Igual que acquire(), esperando con asyncio.sleep (no bloquea el loop)."""
+        start = time.monotonic()
+        with self._cond:
+            cls, ticket = self._enqueue(path, weight, priority)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._try_grant(ticket)
+                if delay == 0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            with self._cond:
+                self._abandon(ticket)
+        waited = time.monotonic() - start
+        with self._cond:
+            self._done(cls, waited)
+        return waited
+
+    def penalize(self, path: str, seconds: float = 1.0) -> None:
+        """Bybit devolvió 10006: frenar esa clase durante `seconds`."""
+        cls, _ = classify(path)
+        with self._cond:
+            self._buckets.get(cls, self._buckets[DEFAULT_CLASS[0]]).drain(seconds)
+            self.rate_limited += 1
+        logger.warning(f"⏳ Rate limit de Bybit en {path} → pausa de {seconds}s ({cls})")
+
+    def stats(self) -> dict:
+        with self._cond:
+            by_priority: Dict[int, int] = {}
+            for t in self._waiting:
+                by_priority[t.order[0]] = by_priority.get(t.order[0], 0) + 1
+            return {
+                "queue_depth": len(self._waiting),
+                "queue_by_priority": by_priority,
+                "granted": dict(self.granted),
+                "delayed": self.delayed,
+                "wait_avg_ms": (
+                    self.wait_total / self.delayed * 1000 if self.delayed else 0.0
+                ),
+                "wait_max_ms": self.wait_max * 1000,
+                "rate_limited": self.rate_limited,
+            }
+
@@ -0,0 +1,223 @@
+"""
+symbol_registry.py — Registro de instrumentos de Bybit
+------------------------------------------------------
+Lista de símbolos negociables (perpetuos lineales) cargada UNA vez de la
+lista de instrumentos del exchange, persistida en SQLite (junto al
+candle_store) y refrescada de forma perezosa.
+
+Con ella, validar un símbolo es una búsqueda en un set en memoria en
+lugar de descargar velas por cada candidato. De paso guarda el
+launchTime de cada instrumento, que aprovecha el timeframe_index.
+
+Las consultas no bloquean por red si ya hay lista (main.py la calienta
+al arrancar en un hilo): las recargas por antigüedad o por símbolo
+desconocido corren en un hilo aparte y la consulta sigue con la lista
+actual. Solo sin ninguna lista se descarga en línea.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger("symbol_registry")
+
+
+class SymbolRegistry:
+    def __init__(
+        self,
+        loader: Callable[[], Dict[str, Optional[int]]],
+        path: str | None = None,
+        refresh_sec: int = 21600,
+        miss_refresh_sec: int = 300,
+    ):
+        """
+        loader:           función () → {symbol: launch_ms | None}.
+        path:             SQLite donde persistir el registro (None = memoria).
+        refresh_sec:      antigüedad a partir de la cual se recarga la lista.
+        miss_refresh_sec: ante un símbolo desconocido se recarga como mucho
+                          una vez por este intervalo (listados nuevos).
+        """
+        self.loader = loader
+        self.path = path
+        self.refresh_sec = refresh_sec
+        self.miss_refresh_sec = miss_refresh_sec
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._symbols: Dict[str, Optional[int]] = {}
+        self._loaded_at = 0.0
+
+        self.refreshes = 0
+        self.lookups = 0
+        self.misses = 0
+
+        if self.path:
+            self._load()
+
+    # --------------------------------------------------------
+    # Persistencia
+    # --------------------------------------------------------
+    def _get_conn(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _load(self) -> None:
+        try:
+            conn = self._get_conn()
+            try:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS symbol_registry (
+                        symbol TEXT PRIMARY KEY,
+                        launch_ms INTEGER,
+                        updated_at REAL NOT NULL
+                    );
+                """)
+                conn.commit()
+                rows = conn.execute(
+                    "SELECT symbol, launch_ms, updated_at FROM symbol_registry"
+                ).fetchall()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo cargar symbol_registry: {e}")
+            return
+
+        if not rows:
+            return
+
+        with self._lock:
+            self._symbols = {symbol: launch_ms for symbol, launch_ms, _ in rows}
+            self._loaded_at = min(updated_at for _, _, updated_at in rows)
+
+    def _save(self, symbols: Dict[str, Optional[int]], updated_at: float) -> None:
+        if not self.path:
+            return
+        try:
+            conn = self._get_conn()
+            try:
+                conn.execute("DELETE FROM symbol_registry")
+                conn.executemany(
+                    "INSERT INTO symbol_registry VALUES (?, ?, ?)",
+                    [(s, launch, updated_at) for s, launch in symbols.items()],
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo persistir symbol_registry: {e}")
+
+    # --------------------------------------------------------
+    # Refresco
+    # --------------------------------------------------------
+    def refresh(self, max_age: float | None = None) -> bool:
+        """
+        Recarga la lista si tiene más de `max_age` segundos (por defecto
+        refresh_sec). Si otro hilo ya está recargando, no espera: se
+        sigue usando la lista actual. Devuelve True si se recargó.
+        """
+        max_age = self.refresh_sec if max_age is None else max_age
+        if time.time() - self._loaded_at < max_age:
+            return False
+
+        if not self._refresh_lock.acquire(blocking=not self._symbols):
+            return False
+        try:
+            if time.time() - self._loaded_at < max_age:
+                return False
+
+            try:
+                symbols = self.loader()
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo descargar la lista de instrumentos: {e}")
+                return False
+
+            if not symbols:
+                return False
+
+            now = time.time()
+            symbols = {s.upper(): launch for s, launch in symbols.items()}
+            with self._lock:
+                self._symbols = symbols
+                self._loaded_at = now
+                self.refreshes += 1
+            self._save(symbols, now)
+            logger.info(f"🔄 symbol_registry: {len(symbols)} instrumentos.")
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh_soon(self, max_age: float) -> None:
+        """refresh() sin bloquear al llamador si ya hay lista (event loop)."""
+        if time.time() - self._loaded_at < max_age:
+            return
+        if not self._symbols:
+            self.refresh(max_age)
+            return
+        if self._refresh_lock.locked():
+            return
+        threading.Thread(
+            target=self.refresh,
+            args=(max_age,),
+            name="symbol-registry",
+            daemon=True,
+        ).start()
+
+    # --------------------------------------------------------
+    # Consulta
+    # --------------------------------------------------------
+    @property
+    def ready(self) -> bool:
+        return bool(self._symbols)
+
+    def contains(self, symbol: str) -> Optional[bool]:
+        """True/False según el registro; None si no hay lista disponible."""
+        self._refresh_soon(self.refresh_sec)
+        if not self._symbols:
+            return None
+        with self._lock:
+            self.lookups += 1
+            return symbol.upper() in self._symbols
+
+    def resolve(self, candidates: Iterable[str]) -> Optional[str]:
+        """
+        Primer candidato que existe en el exchange.
+        None si ninguno existe (o si no hay lista disponible).
+        """
+        candidates = [c.upper() for c in candidates]
+        self._refresh_soon(self.refresh_sec)
+
+        with self._lock:
+            symbols = self._symbols
+            if symbols:
+                self.lookups += 1
+        if not symbols:
+            return None
+
+        for sym in candidates:
+            if sym in symbols:
+                return sym
+
+        # Puede ser un listado nuevo: recarga acotada en segundo plano (la
+        # siguiente consulta ya lo verá)
+        self._refresh_soon(self.miss_refresh_sec)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def launch_time_ms(self, symbol: str) -> Optional[int]:
+        with self._lock:
+            launch = self._symbols.get(symbol.upper())
+        return int(launch) if launch else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "symbols": len(self._symbols),
+                "age_sec": (time.time() - self._loaded_at) if self._loaded_at else None,
+                "refreshes": self.refreshes,
+                "lookups": self.lookups,
+                "misses": self.misses,
+            }
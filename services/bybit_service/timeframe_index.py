@@ -0,0 +1,147 @@
+"""
+timeframe_index.py — Índice de disponibilidad de temporalidades
+---------------------------------------------------------------
+Responde "¿tiene este símbolo al menos N velas en este TF?" sin tocar
+la red en estado estable.
+
+Por símbolo se guarda el timestamp de la primera vela (listing): a
+partir de él, las velas disponibles en cualquier TF se calculan con
+aritmética. El dato sale del launchTime del instrumento o de una única
+sonda diaria, se persiste en SQLite (junto al candle_store) y se
+refresca de forma perezosa una vez al día.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from services.bybit_service.candle_cache import timeframe_to_seconds
+
+logger = logging.getLogger("timeframe_index")
+
+
+class TimeframeIndex:
+    def __init__(
+        self,
+        probe: Callable[[str], Optional[int]],
+        path: str | None = None,
+        refresh_sec: int = 86400,
+    ):
+        """
+        probe:  función symbol → epoch ms de la primera vela (o None).
+        path:   SQLite donde persistir el índice (None = solo memoria).
+        """
+        self.probe = probe
+        self.path = path
+        self.refresh_sec = refresh_sec
+
+        self._lock = threading.Lock()
+        # symbol → (first_ts_ms, checked_at_s)
+        self._index: Dict[str, Tuple[int, float]] = {}
+
+        self.probes = 0
+
+        if self.path:
+            self._load()
+
+    # --------------------------------------------------------
+    # Persistencia
+    # --------------------------------------------------------
+    def _get_conn(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _load(self) -> None:
+        try:
+            conn = self._get_conn()
+            try:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS tf_availability (
+                        symbol TEXT PRIMARY KEY,
+                        first_ts INTEGER NOT NULL,
+                        checked_at REAL NOT NULL
+                    );
+                """)
+                conn.commit()
+                rows = conn.execute(
+                    "SELECT symbol, first_ts, checked_at FROM tf_availability"
+                ).fetchall()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo cargar tf_availability: {e}")
+            return
+
+        with self._lock:
+            for symbol, first_ts, checked_at in rows:
+                self._index[symbol] = (int(first_ts), float(checked_at))
+
+    def _save(self, symbol: str, first_ts: int, checked_at: float) -> None:
+        if not self.path:
+            return
+        try:
+            conn = self._get_conn()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO tf_availability VALUES (?, ?, ?)",
+                    (symbol, int(first_ts), float(checked_at)),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo persistir tf_availability {symbol}: {e}")
+
+    # --------------------------------------------------------
+    # Consulta
+    # --------------------------------------------------------
+    def first_bar_ms(self, symbol: str) -> Optional[int]:
+        """Primera vela conocida del símbolo; sondea solo si falta o caducó."""
+        symbol = symbol.upper()
+        now = time.time()
+
+        with self._lock:
+            known = self._index.get(symbol)
+        if known and now - known[1] < self.refresh_sec:
+            return known[0]
+
+        try:
+            first_ts = self.probe(symbol)
+        except Exception as e:
+            logger.warning(f"⚠️ Sonda de disponibilidad falló para {symbol}: {e}")
+            first_ts = None
+
+        with self._lock:
+            self.probes += 1
+
+        if first_ts is None:
+            # Mejor un dato viejo que ninguno
+            return known[0] if known else None
+
+        with self._lock:
+            self._index[symbol] = (int(first_ts), now)
+        self._save(symbol, first_ts, now)
+        return int(first_ts)
+
+    def bars_available(self, symbol: str, tf: str) -> Optional[int]:
+        """Velas disponibles en `tf` (incluida la vela en curso) o None."""
+        period = timeframe_to_seconds(tf)
+        first_ts = self.first_bar_ms(symbol)
+        if not period or first_ts is None:
+            return None
+        elapsed_ms = max(0, int(time.time() * 1000) - first_ts)
+        return int(elapsed_ms // (period * 1000)) + 1
+
+    def has_min_bars(self, symbol: str, tf: str, min_bars: int) -> Optional[bool]:
+        """True/False según el índice; None si no se pudo determinar."""
+        bars = self.bars_available(symbol, tf)
+        if bars is None:
+            return None
+        return bars >= min_bars
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"symbols": len(self._index), "probes": self.probes}
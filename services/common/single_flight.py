@@ -0,0 +1,135 @@
+"""
+single_flight.py — Coalescencia de peticiones idénticas concurrentes
+--------------------------------------------------------------------
+Si varias tareas piden lo mismo (misma clave) mientras ya hay una
+ejecución en curso, esperan a esa ejecución en lugar de lanzar otra.
+
+- SingleFlight:       hilos (caché síncrona de velas).
+- AsyncSingleFlight:  asyncio (fetch async, snapshot del motor).
+
+El resultado se comparte tal cual entre todos los que esperaban: quien
+lo use debe tratarlo como solo-lectura (o copiarlo).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger("single_flight")
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Versión para hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executed": self.executed,
+                "shared": self.shared,
+            }
+
+
+class AsyncSingleFlight:
+    """
+    Versión asyncio (un único event loop).
+
+    cancel_orphans=True: si todos los interesados dejan de esperar
+    (cancelados / timeout), el trabajo compartido se cancela también.
+    """
+
+    def __init__(self, cancel_orphans: bool = False):
+        self.cancel_orphans = cancel_orphans
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._inflight.get(key)
+        if fut is not None and fut.cancelled():
+            # Cancelado pero el done-callback aún no lo ha retirado
+            fut = None
+        if fut is not None:
+            self.shared += 1
+        else:
+            fut = asyncio.ensure_future(fn())
+            self._inflight[key] = fut
+            self.executed += 1
+            fut.add_done_callback(lambda f, k=key: self._forget(k, f))
+
+        self._waiters[fut] = self._waiters.get(fut, 0) + 1
+        try:
+            # shield: cancelar a un interesado no cancela el trabajo compartido
+            return await asyncio.shield(fut)
+        finally:
+            left = self._waiters.pop(fut, 1) - 1
+            if left > 0:
+                self._waiters[fut] = left
+            elif self.cancel_orphans and not fut.done():
+                # Fuera de _inflight YA: quien llegue antes del done-callback
+                # debe abrir un vuelo nuevo, no unirse a uno cancelado
+                if self._inflight.get(key) is fut:
+                    del self._inflight[key]
+                fut.cancel()
+
+    def _forget(self, key: Hashable, fut: asyncio.Future) -> None:
+        # Solo si sigue siendo el vuelo de la clave (puede haber uno nuevo)
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "executed": self.executed,
+            "shared": self.shared,
+        }
@@ -0,0 +1,186 @@
+"""
+worker_pool.py — Pool acotado para trabajo bloqueante desde asyncio
+-------------------------------------------------------------------
+El motor técnico es síncrono (ccxt + NumPy/pandas). Ejecutarlo dentro
+del event loop congela el bot de Telegram, el lector de Telethon y el
+monitor de posiciones mientras dura el análisis.
+
+WorkerPool lo saca del loop:
+
+- mode="thread":  ThreadPoolExecutor (comparte cachés del proceso).
+- mode="process": ProcessPoolExecutor (spawn); usa todos los núcleos,
+  la función y sus argumentos deben ser picklables.
+- max_concurrency: tope de trabajos en curso; el resto espera en el
+  loop (cancelable), no en la cola del executor. El hueco se libera
+  cuando el trabajo termina de verdad en el executor, no cuando deja de
+  esperarlo quien lo pidió.
+- run(..., timeout=): el tiempo cuenta desde que se pide el hueco. Al
+  vencer o al cancelarse, si el trabajo aún no empezó se descarta; si ya
+  corre, termina en segundo plano (ocupando su hueco) y su resultado se
+  ignora.
+- run(..., on_done=): se llama una sola vez cuando el trabajo ya no
+  puede tocar sus recursos (terminó en el executor o no llegó a
+  enviarse), aunque quien lo pidió haya dejado de esperar.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger("worker_pool")
+
+
+class WorkerPool:
+    def __init__(
+        self,
+        mode: str = "thread",
+        max_workers: int = 4,
+        max_concurrency: int | None = None,
+        name: str = "worker",
+    ):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"mode debe ser 'thread' o 'process', no {mode!r}")
+        self.mode = mode
+        self.max_workers = max(1, int(max_workers))
+        self.max_concurrency = max(1, int(max_concurrency or self.max_workers))
+        self.name = name
+
+        self._executor: Executor | None = None
+        self._executor_lock = threading.Lock()
+        self._sem: asyncio.Semaphore | None = None
+
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+
+    # --------------------------------------------------------
+    # Executor (perezoso: nada se arranca hasta el primer uso)
+    # --------------------------------------------------------
+    def _get_executor(self) -> Executor:
+        with self._executor_lock:
+            if self._executor is None:
+                if self.mode == "process":
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=self.name,
+                    )
+                logger.info(
+                    f"🧵 Pool {self.name}: {self.mode} × {self.max_workers} "
+                    f"(concurrencia {self.max_concurrency})"
+                )
+            return self._executor
+
+    # --------------------------------------------------------
+    # API
+    # --------------------------------------------------------
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        timeout: float | None = None,
+        on_done: Callable[[], None] | None = None,
+        **kwargs,
+    ) -> Any:
+        """Ejecuta fn(*args, **kwargs) en el pool sin bloquear el loop."""
+        if timeout is None:
+            return await self._run(fn, args, kwargs, on_done)
+        try:
+            return await asyncio.wait_for(
+                self._run(fn, args, kwargs, on_done), timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    async def _run(self, fn, args, kwargs, on_done=None) -> Any:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+
+        loop = asyncio.get_running_loop()
+        cf = None
+        try:
+            self.waiting += 1
+            try:
+                await self._sem.acquire()
+            finally:
+                self.waiting -= 1
+
+            try:
+                cf = self._get_executor().submit(
+                    functools.partial(fn, *args, **kwargs)
+                )
+            except BaseException:
+                self._sem.release()
+                raise
+        finally:
+            # Nunca llegó al executor: nada más tocará sus recursos
+            if cf is None and on_done is not None:
+                self._call_on_done(on_done)
+
+        self.running += 1
+        cf.add_done_callback(lambda _cf: self._release_threadsafe(loop))
+        if on_done is not None:
+            cf.add_done_callback(lambda _cf: self._call_on_done(on_done))
+
+        try:
+            # wrap_future: cancelar la espera cancela cf si aún no empezó
+            result = await asyncio.wrap_future(cf)
+            self.completed += 1
+            return result
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Done-callback del executor (otro hilo): libera el hueco en el loop."""
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Loop cerrado: nadie más esperará el semáforo
+            pass
+
+    def _call_on_done(self, on_done: Callable[[], None]) -> None:
+        try:
+            on_done()
+        except Exception as e:
+            logger.warning(f"⚠️ Pool {self.name}: on_done falló: {e}")
+
+    def _release(self) -> None:
+        self.running -= 1
+        self._sem.release()
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+        }
@@ -11,10 +11,18 @@ class SignalCoordinator:
     - reactivación
     """
 
-    def __init__(self, signal_service, analysis_service, reactivation_engine, notifier):
+    def __init__(
+        self,
+        signal_service,
+        analysis_service,
+        reactivation_engine,
+        notifier,
+        market_stream=None,
+    ):
         self.signal_service = signal_service
         self.analysis_service = analysis_service
         self.notifier = notifier
+        self.market_stream = market_stream
 
         logger.info("🔧 SignalCoordinator inicializado correctamente.")
 
@@ -30,29 +38,50 @@ class SignalCoordinator:
     async def auto_reactivate(self, limit: int = 10):
         pending = self.signal_service.get_pending_signals(limit=limit) or []
 
+        if self.market_stream:
+            self.market_stream.set_watch("signals", [s["symbol"] for s in pending])
+
         if not pending:
             logger.info("📭 No hay señales pendientes.")
             return
 
         logger.info(f"🔁 Auto-reactivación: {len(pending)} señales pendientes.")
 
+        # Un único lote: descargas en paralelo y cada señal se evalúa al
+        # terminar su análisis (pares repetidos se analizan una vez)
+        by_pair = {}
         for signal in pending:
-            await self.evaluate_signal(signal, context="reactivation")
+            key = (signal["symbol"].upper(), signal["direction"].lower())
+            by_pair.setdefault(key, []).append(signal)
+
+        async for symbol, direction, analysis in self.analysis_service.analyze_many(
+            [symbol for symbol, _ in by_pair],
+            [direction for _, direction in by_pair],
+            context="reactivation",
+        ):
+            for signal in by_pair.get((symbol, direction), []):
+                await self.evaluate_signal(
+                    signal, context="reactivation", analysis=analysis
+                )
 
     # ==============================================================
     # 🧠 MÉTODO ÚNICO CENTRAL (ESTE ERA EL QUE FALTABA)
     # ==============================================================
-    async def evaluate_signal(self, signal: dict, context: str):
+    async def evaluate_signal(
+        self, signal: dict, context: str, analysis: dict | None = None
+    ):
         symbol = signal["symbol"]
         direction = signal["direction"]
 
         logger.info(f"🔍 Evaluando {symbol} | contexto={context}")
 
-        analysis = await self.analysis_service.analyze_symbol(
-            symbol=symbol,
-            direction=direction,
-            context=context,
-        )
+        # `analysis` ya calculado (lote de auto_reactivate) o análisis propio
+        if analysis is None:
+            analysis = await self.analysis_service.analyze_symbol(
+                symbol=symbol,
+                direction=direction,
+                context=context,
+            )
 
         allowed = analysis.get("allowed", False)
 
@@ -17,6 +17,7 @@ class Kernel:
 
         # Instancias (se llenan en build)
         self.notifier = None
+        self.kline_stream = None
 
         self.analysis_service = None
         self.signal_service = None
@@ -35,6 +36,11 @@ class Kernel:
         # ------------------------
         self.notifier = Notifier(bot=self.bot, chat_id=TELEGRAM_USER_ID)
 
+        # ------------------------
+        # 📡 Klines WebSocket (opcional)
+        # ------------------------
+        self.kline_stream = self._build_kline_stream()
+
         # ------------------------
         # 📦 Application services
         # ------------------------
@@ -42,7 +48,7 @@ class Kernel:
         from services.application.signal_service import SignalService
         from services.application.operation_service import OperationService
 
-        self.analysis_service = AnalysisService()
+        self.analysis_service = AnalysisService(market_stream=self.kline_stream)
         self.signal_service = SignalService()
         self.operation_service = OperationService(self.notifier)
 
@@ -56,6 +62,7 @@ class Kernel:
             analysis_service=self.analysis_service,
             reactivation_engine=None,
             notifier=self.notifier,
+            market_stream=self.kline_stream,
         )
 
         # ------------------------
@@ -68,7 +75,38 @@ class Kernel:
         self.open_position_engine = OpenPositionEngine(
             notifier=self.notifier,
             analysis_service=self.analysis_service,
+            market_stream=self.kline_stream,
         )
 
         logger.info("✅ Kernel build() completado correctamente.")
         return self
+
+    def _build_kline_stream(self):
+        from config import (
+            BYBIT_WS_ENABLED,
+            BYBIT_WS_URL,
+            BYBIT_WS_RECORD_PATH,
+            KLINE_WS_TIMEFRAMES,
+            KLINE_WS_TOUCH_TTL,
+        )
+
+        if not BYBIT_WS_ENABLED:
+            return None
+
+        from services.bybit_service.bybit_client import candle_cache
+        from services.bybit_service.async_market_data import fetch_timeframes
+        from services.bybit_service.kline_stream import KlineStream
+        from services.technical_engine.motor_wrapper_core import ANALYSIS_BARS
+
+        async def seed(symbol, timeframes):
+            # La ventana que usará el motor (la mayor de todos los contextos)
+            await fetch_timeframes(symbol, timeframes, limit=ANALYSIS_BARS)
+
+        return KlineStream(
+            cache=candle_cache,
+            url=BYBIT_WS_URL,
+            timeframes=KLINE_WS_TIMEFRAMES,
+            touch_ttl=KLINE_WS_TOUCH_TTL,
+            record_path=BYBIT_WS_RECORD_PATH,
+            seed=seed,
+        )
@@ -33,10 +33,13 @@ class OpenPositionEngine:
 
     COOLDOWN_SEC = 300  # 5 minutos
 
-    def __init__(self, notifier=None, analysis_service=None, **kwargs):
+    def __init__(
+        self, notifier=None, analysis_service=None, market_stream=None, **kwargs
+    ):
         # kwargs extra para evitar que Kernel rompa si pasa args nuevos
         self.notifier = notifier
         self.analysis_service = analysis_service
+        self.market_stream = market_stream
 
         # dedupe
         self._last_action_by_symbol: Dict[str, str] = {}
@@ -63,6 +66,8 @@ class OpenPositionEngine:
 
         if not positions_raw:
             self.last_position_count = 0
+            if self.market_stream:
+                self.market_stream.set_watch("positions", [])
             logger.info("📭 No hay posiciones abiertas actualmente.")
             return
 
@@ -73,31 +78,43 @@ class OpenPositionEngine:
                 normalized.append(p)
 
         self.last_position_count = len(normalized)
+        if self.market_stream:
+            self.market_stream.set_watch("positions", [p["symbol"] for p in normalized])
         logger.info(f"📌 Posiciones abiertas detectadas: {len(normalized)}")
 
+        # 1) Acción base por ROI
+        evaluated = []
         for p in normalized[:50]:
             try:
-                symbol = p["symbol"]
-                direction = p["direction"]  # "long" | "short"
-                leverage = p["leverage"]
-
                 price_change_pct, roi_pct = self._calc_price_and_roi(
                     entry=p["entry_price"],
                     mark=p["mark_price"],
-                    direction=direction,
-                    leverage=leverage,
+                    direction=p["direction"],
+                    leverage=p["leverage"],
                 )
-
-                # 1) Acción base por ROI
                 base_action = self._decide_action_by_roi(roi_pct)
+                evaluated.append((p, price_change_pct, roi_pct, base_action))
+            except Exception as e:
+                logger.exception(f"❌ Error evaluando posición {p}: {e}")
 
-                # 2) Confirmación técnica (si aplica) para C4.3/C4.4
-                tech = None
-                if (
-                    base_action in ("warning", "critical", "force_close")
-                    and self.analysis_service
-                ):
-                    tech = await self._safe_analyze(symbol, direction)
+        # 2) Confirmación técnica (si aplica) para C4.3/C4.4, en un solo lote
+        techs: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+        if self.analysis_service:
+            techs = await self._safe_analyze_many(
+                [
+                    (p["symbol"], p["direction"])
+                    for p, _, _, base_action in evaluated
+                    if base_action in ("warning", "critical", "force_close")
+                ]
+            )
+
+        for p, price_change_pct, roi_pct, base_action in evaluated:
+            try:
+                symbol = p["symbol"]
+                direction = p["direction"]  # "long" | "short"
+                leverage = p["leverage"]
+
+                tech = techs.get((symbol, direction))
 
                 final_action, reason, risk = self._final_decision(
                     symbol=symbol,
@@ -271,6 +288,35 @@ class OpenPositionEngine:
             logger.warning(f"⚠️ Error análisis técnico {symbol}: {e}")
             return None
 
+    async def _safe_analyze_many(
+        self, pairs: List[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], Optional[Dict[str, Any]]]:
+        """
+        {(symbol, direction): análisis} con analysis_service.analyze_many
+        (un lote); si no existe, uno a uno con _safe_analyze.
+        """
+        if not pairs:
+            return {}
+
+        fn = getattr(self.analysis_service, "analyze_many", None)
+        if not fn:
+            return {pair: await self._safe_analyze(*pair) for pair in pairs}
+
+        wanted = {(s.upper(), d.lower()): (s, d) for s, d in pairs}
+        results: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+        try:
+            async for symbol, direction, analysis in fn(
+                [s for s, _ in wanted],
+                [d for _, d in wanted],
+                context="open_position",
+            ):
+                pair = wanted.get((symbol, direction))
+                if pair is not None:
+                    results[pair] = analysis
+        except Exception as e:
+            logger.warning(f"⚠️ Error análisis técnico en lote: {e}")
+        return results
+
     # =========================================================
     # C4.3 + C4.4: decisión final
     # =========================================================
@@ -0,0 +1,173 @@
+"""
+divergence_engine.py — Divergencias precio / indicador sobre pivotes
+-------------------------------------------------------------------
+Sustituye a la comparación "últimas 5 velas vs resto" por pivotes reales:
+
+- Los pivotes (máximos / mínimos locales de ±width velas) del precio se
+  calculan UNA vez por serie con ventanas deslizantes (NumPy, sin bucles
+  por vela). Las últimas `width` velas pueden ser pivote provisional con
+  la parte derecha disponible.
+- Para cada indicador (RSI, MACD...) se toma su extremo en ±width
+  alrededor de cada pivote de precio.
+- El último pivote se compara con TODOS los anteriores dentro del mayor
+  lookback a la vez (un vector de pares). Solo cuentan pivotes previos
+  que dominan a los intermedios (swings reales); se queda el par más
+  fuerte y se informa el lookback más corto que lo contiene.
+
+Resultado por indicador:
+  {
+    "type": "alcista" | "bajista" | "ninguna",
+    "strength": 0..1,
+    "pivots": [i1, i2],        # índices en la serie de entrada
+    "bars_ago": [b1, b2],
+    "lookback": 20 | 40 | 80 | None,
+  }
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Sequence
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from services.technical_engine import jit_kernels
+
+DEFAULT_LOOKBACKS = (20, 40, 80)
+
+
+def _none() -> dict:
+    return {
+        "type": "ninguna",
+        "strength": 0.0,
+        "pivots": [],
+        "bars_ago": [],
+        "lookback": None,
+    }
+
+
+def _windows(x: np.ndarray, width: int, fill: float) -> np.ndarray:
+    """Ventanas centradas de 2·width+1 (bordes rellenos con `fill`)."""
+    pad = np.full(width, fill)
+    return sliding_window_view(np.concatenate([pad, x, pad]), 2 * width + 1)
+
+
+def pivots(x: np.ndarray, width: int = 3, kind: str = "high") -> np.ndarray:
+    """
+    Índices de pivotes: x[i] es el extremo de x[i−width : i+width+1]
+    (en mesetas cuenta solo la primera vela).
+    """
+    if jit_kernels.JIT_ENABLED:
+        return np.flatnonzero(jit_kernels.pivot_mask(x, width, kind == "high"))
+    return _pivots_numpy(x, width, kind)
+
+
+def _pivots_numpy(x: np.ndarray, width: int = 3, kind: str = "high") -> np.ndarray:
+    x = np.asarray(x, dtype=np.float64)
+    fill = -np.inf if kind == "high" else np.inf
+    xs = np.where(np.isfinite(x), x, fill)
+    win = _windows(xs, width, fill)
+    ext = win.argmax(axis=1) if kind == "high" else win.argmin(axis=1)
+    return np.flatnonzero((ext == width) & np.isfinite(x))
+
+
+def detect_divergences(
+    close: np.ndarray,
+    indicators: Dict[str, np.ndarray],
+    lookbacks: Sequence[int] = DEFAULT_LOOKBACKS,
+    width: int = 3,
+    tolerance: float = 0.01,
+    ind_tolerance: float = 0.05,
+    recent: int | None = None,
+) -> Dict[str, dict]:
+    """
+    Divergencias regulares de cada indicador contra el precio.
+
+    - Bajista: precio hace máximo más alto y el indicador uno más bajo.
+    - Alcista: precio hace mínimo más bajo y el indicador uno más alto.
+
+    tolerance:     movimiento mínimo relativo del precio entre pivotes.
+    ind_tolerance: movimiento mínimo del indicador, relativo a su |máximo|
+                   en la ventana.
+    recent:        el último pivote debe estar a ≤ recent velas del final
+                   (por defecto 2·width + 2).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    results = {name: _none() for name in indicators}
+    lookbacks = sorted(int(lb) for lb in lookbacks)
+    if not lookbacks or n < lookbacks[0] + width + 1:
+        return results
+
+    recent = 2 * width + 2 if recent is None else recent
+    start = max(0, n - lookbacks[-1] - 1)
+    price = close[start:]
+    m = len(price)
+
+    price_pivots = {
+        "bajista": pivots(price, width, "high"),
+        "alcista": pivots(price, width, "low"),
+    }
+
+    for name, series in indicators.items():
+        ind = np.asarray(series, dtype=np.float64)[start:]
+        if len(ind) != m or not np.isfinite(ind).any():
+            continue
+
+        scale = float(np.nanmax(np.abs(ind))) or 1.0
+        finite = np.isfinite(ind)
+        hi, lo = np.where(finite, ind, -np.inf), np.where(finite, ind, np.inf)
+        extremes = {
+            "bajista": _windows(hi, width, -np.inf).max(axis=1),
+            "alcista": _windows(lo, width, np.inf).min(axis=1),
+        }
+
+        best = None
+        for kind, idx in price_pivots.items():
+            if len(idx) < 2 or idx[-1] < m - 1 - recent:
+                continue
+
+            p2, p1 = idx[-1], idx[:-1]
+            ext = extremes[kind]
+            sign = 1.0 if kind == "bajista" else -1.0
+            with np.errstate(invalid="ignore", divide="ignore"):
+                price_move = (price[p2] - price[p1]) / price[p1]
+                ind_move = (ext[p2] - ext[p1]) / scale
+
+            # p1 debe dominar a los pivotes intermedios (swing real, no
+            # un pico cualquiera dentro de otro tramo)
+            swing = sign * price[p1]
+            later = np.maximum.accumulate(swing[::-1])[::-1]
+            dominant = np.append(swing[:-1] > later[1:], True)
+
+            ok = (
+                dominant
+                & (sign * price_move > tolerance)
+                & (-sign * ind_move > ind_tolerance)
+                & np.isfinite(ind_move)
+            )
+            if not ok.any():
+                continue
+
+            strength = 0.5 * (
+                np.minimum(np.abs(price_move) / (5 * tolerance), 1.0)
+                + np.minimum(np.abs(ind_move) / (10 * ind_tolerance), 1.0)
+            )
+            scored = np.where(ok, strength, -1.0)
+            j = int(scored.argmax())
+            if best is None or scored[j] > best[0]:
+                best = (float(scored[j]), kind, int(p1[j]), int(p2))
+
+        if best is not None:
+            s, kind, i1, i2 = best
+            # Lookback más corto que contiene el par
+            lb = next(lb for lb in lookbacks if i2 - i1 <= lb)
+            results[name] = {
+                "type": kind,
+                "strength": round(s, 3),
+                "pivots": [start + i1, start + i2],
+                "bars_ago": [m - 1 - i1, m - 1 - i2],
+                "lookback": lb,
+            }
+
+    return results
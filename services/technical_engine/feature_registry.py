@@ -0,0 +1,279 @@
+"""
+feature_registry.py — Registro único de indicadores (features)
+--------------------------------------------------------------
+Un solo sitio donde se declaran los indicadores que usan
+motor_wrapper_core e indicators.py:
+
+- Cada feature (o grupo: MACD → línea, histograma y señal) se registra
+  con @register y se calcula con numpy_indicators.
+- Los consumidores piden SOLO lo que necesitan
+  (registry.compute(df, symbol, tf, needs=[...])); las dependencias se
+  resuelven bajo demanda (bb_width → bandas) y lo caro (bandas, MFI)
+  no se materializa si nadie lo pide.
+- Un FeatureFrame memoiza lo ya calculado; el registro guarda los
+  frames en un LRU por (symbol, tf, parámetros, ventana, última vela),
+  así cada feature se calcula como mucho una vez por vela.
+
+La última vela (aún en formación) forma parte de la clave con su OHLCV:
+si cambia el precio, cambia la clave y se recalcula.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.technical_engine import numpy_indicators as npi
+from services.technical_engine.indicator_state import IndicatorParams
+from config import FEATURE_CACHE_FRAMES
+
+logger = logging.getLogger("feature_registry")
+
+BASE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+# Series de motor_wrapper_core._calc_indicators
+CORE_FEATURES = (
+    "ema_short",
+    "ema_long",
+    "macd",
+    "macd_histogram",
+    "macd_signal_line",
+    "rsi",
+    "atr",
+)
+
+BB_LENGTH = 20
+BB_STD = 2.0
+MFI_LENGTH = 14
+
+
+# ============================================================
+# 📋 Registro
+# ============================================================
+class Feature(NamedTuple):
+    outputs: Tuple[str, ...]
+    fn: Callable[["FeatureFrame"], Dict[str, np.ndarray]]
+
+
+FEATURES: Dict[str, Feature] = {}
+
+
+def register(*outputs: str):
+    """Decorador: fn(frame) → {output: array} para todas las `outputs`."""
+
+    def deco(fn):
+        feature = Feature(tuple(outputs), fn)
+        for name in outputs:
+            FEATURES[name] = feature
+        return fn
+
+    return deco
+
+
+@register("ema_short")
+def _ema_short(f: "FeatureFrame") -> Dict[str, np.ndarray]:
+    return {"ema_short": npi.ema(f["close"], f.params.ema_short)}
+
+
+@register("ema_long")
+def _ema_long(f: "FeatureFrame") -> Dict[str, np.ndarray]:
+    return {"ema_long": npi.ema(f["close"], f.params.ema_long)}
+
+
+@register("macd", "macd_histogram", "macd_signal_line")
+def _macd(f: "FeatureFrame") -> Dict[str, np.ndarray]:
+    p = f.params
+    line, hist, sig = npi.macd(f["close"], p.macd_fast, p.macd_slow, p.macd_signal)
+    return {"macd": line, "macd_histogram": hist, "macd_signal_line": sig}
+
+
+@register("rsi")
+def _rsi(f: "FeatureFrame") -> Dict[str, np.ndarray]:
+    return {"rsi": npi.rsi(f["close"], f.params.rsi)}
+
+
+@register("atr")
+def _atr(f: "FeatureFrame") -> Dict[str, np.ndarray]:
+    return {"atr": npi.atr(f["high"], f["low"], f["close"], f.params.atr)}
+
+
+@register("atr_rel")
+def _atr_rel(f: "FeatureFrame") -> Dict[str, np.ndarray]:
+    return {"atr_rel": f["atr"] / f["close"]}
+
+
+@register("bb_lower", "bb_mid", "bb_upper")
+def _bbands(f: "FeatureFrame") -> Dict[str, np.ndarray]:
+    lower, mid, upper = npi.bbands(f["close"], BB_LENGTH, BB_STD)
+    return {"bb_lower": lower, "bb_mid": mid, "bb_upper": upper}
+
+
+@register("bb_width")
+def _bb_width(f: "FeatureFrame") -> Dict[str, np.ndarray]:
+    return {"bb_width": (f["bb_upper"] - f["bb_lower"]) / f["bb_mid"]}
+
+
+@register("mfi")
+def _mfi(f: "FeatureFrame") -> Dict[str, np.ndarray]:
+    return {
+        "mfi": npi.mfi(f["high"], f["low"], f["close"], f["volume"], MFI_LENGTH)
+    }
+
+
+@register("wick_ratio")
+def _wick_ratio(f: "FeatureFrame") -> Dict[str, np.ndarray]:
+    """(mecha superior + inferior) / cuerpo, vela a vela."""
+    o, h, l, c = f["open"], f["high"], f["low"], f["close"]
+    body = np.abs(c - o)
+    upper = np.maximum(0.0, h - np.maximum(o, c))
+    lower = np.maximum(0.0, np.minimum(o, c) - l)
+    return {"wick_ratio": (upper + lower) / (body + 1e-8)}
+
+
+# ============================================================
+# 🧮 Frame memoizado
+# ============================================================
+class FeatureFrame:
+    """Columnas OHLCV + features calculadas bajo demanda (solo-lectura)."""
+
+    def __init__(self, columns: Dict[str, np.ndarray], params: IndicatorParams):
+        self.params = params
+        self._values: Dict[str, np.ndarray] = {}
+        self._lock = threading.RLock()
+        self.computed = 0
+        for name, values in columns.items():
+            self._store(name, np.asarray(values, dtype=np.float64))
+
+    def _store(self, name: str, values: np.ndarray) -> None:
+        values.flags.writeable = False
+        self._values[name] = values
+
+    def has(self, name: str) -> bool:
+        return name in self._values
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        values = self._values.get(name)
+        if values is not None:
+            return values
+
+        feature = FEATURES.get(name)
+        if feature is None:
+            raise KeyError(f"feature desconocida: {name}")
+
+        with self._lock:
+            if name not in self._values:
+                for out, values in feature.fn(self).items():
+                    self._store(out, values)
+                self.computed += 1
+        return self._values[name]
+
+    def get(self, names: Iterable[str]) -> Dict[str, np.ndarray]:
+        return {name: self[name] for name in names}
+
+    def provide(self, values: Dict[str, np.ndarray]) -> None:
+        """
+        Inyecta series ya calculadas fuera (p. ej. indicator_states).
+        Solo se aceptan grupos completos de features registradas.
+        """
+        with self._lock:
+            for name, feature in FEATURES.items():
+                if name in self._values:
+                    continue
+                if all(out in values for out in feature.outputs):
+                    for out in feature.outputs:
+                        self._store(out, np.array(values[out], dtype=np.float64))
+
+
+# ============================================================
+# 🗂️ Registro con LRU de frames
+# ============================================================
+class FeatureRegistry:
+    def __init__(self, max_frames: int = 512):
+        self.max_frames = int(max_frames)
+        self._frames: "OrderedDict[tuple, FeatureFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        return {c: df[c].to_numpy(dtype=np.float64) for c in BASE_COLUMNS if c in df}
+
+    @staticmethod
+    def _key(
+        symbol: str, tf: str, params: IndicatorParams, df: pd.DataFrame
+    ) -> Optional[tuple]:
+        if not isinstance(df.index, pd.DatetimeIndex) or df.empty:
+            return None
+        last = tuple(float(df[c].iloc[-1]) for c in BASE_COLUMNS if c in df)
+        return (
+            symbol.upper(),
+            str(tf),
+            params,
+            len(df),
+            df.index[0].value,
+            df.index[-1].value,
+            last,
+        )
+
+    def frame(
+        self,
+        df: pd.DataFrame,
+        params: IndicatorParams,
+        symbol: str | None = None,
+        tf: str | None = None,
+    ) -> FeatureFrame:
+        """FeatureFrame de `df`; compartido mientras no cambie la última vela."""
+        key = self._key(symbol, tf, params, df) if symbol and tf else None
+        if key is None:
+            return FeatureFrame(self._columns(df), params)
+
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return frame
+
+        frame = FeatureFrame(self._columns(df), params)
+        with self._lock:
+            frame = self._frames.setdefault(key, frame)
+            self._frames.move_to_end(key)
+            self.misses += 1
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+        return frame
+
+    def compute(
+        self,
+        df: pd.DataFrame,
+        needs: Iterable[str],
+        params: IndicatorParams,
+        symbol: str | None = None,
+        tf: str | None = None,
+    ) -> Dict[str, np.ndarray]:
+        """Solo las features pedidas (y sus dependencias), como arrays."""
+        return self.frame(df, params, symbol, tf).get(needs)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "frames": len(self._frames),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+feature_registry = FeatureRegistry(max_frames=FEATURE_CACHE_FRAMES)
@@ -0,0 +1,538 @@
+"""
+indicator_state.py — Estado incremental de indicadores por (symbol, tf)
+----------------------------------------------------------------------
+EMA, MACD, RSI (Wilder) y ATR son recursivos: con el último valor de
+cada media basta para avanzar una vela en O(1). Aquí se guarda ese
+estado por (symbol, timeframe):
+
+- Se siembra UNA vez con numpy_indicators sobre el histórico (ventana de
+  la caché o, si cubre más, el candle_store).
+- Cada vela cerrada del WebSocket (CandleCache.add_bar_listener) avanza
+  el estado en O(1); por REST, lookup() avanza solo las velas nuevas.
+- La vela en formación se evalúa de forma provisional, sin tocar el
+  estado.
+- Un ring con las últimas `window` velas cerradas conserva las series
+  (RSI, histograma...) que piden las divergencias.
+- Checkpoint en el candle_store: tras un reinicio se retoma el estado
+  (incluida la memoria larga de las EMAs) en vez de volver a sembrar.
+  Los checkpoints se escriben en un hilo aparte, como mucho uno por
+  (symbol, tf) cada `checkpoint_interval` segundos: ni el listener del
+  WebSocket (event loop) ni lookup() tocan SQLite para escribir.
+- Lock por (symbol, tf): la lectura del histórico y la siembra de un
+  símbolo no bloquean las consultas de los demás.
+
+Nota: al sembrarse con más historia que la ventana de análisis, los
+valores pueden diferir mínimamente de recalcular solo esa ventana (la
+semilla SMA pesa menos): es el valor "de largo plazo" del indicador.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from services.bybit_service.candle_cache import timeframe_to_seconds
+from services.technical_engine import numpy_indicators as npi
+
+logger = logging.getLogger("indicator_state")
+
+_EPS = sys.float_info.epsilon
+
+# Filas del ring (mismos nombres que numpy_indicators.compute_core)
+SERIES_FIELDS = (
+    "close",
+    "ema_short",
+    "ema_long",
+    "macd",
+    "macd_histogram",
+    "macd_signal_line",
+    "rsi",
+    "atr",
+)
+_SCALARS = (
+    "ema_s",
+    "ema_l",
+    "ema_f",
+    "ema_sl",
+    "sig",
+    "up",
+    "down",
+    "atr",
+    "prev_close",
+)
+
+
+class IndicatorParams(NamedTuple):
+    ema_short: int
+    ema_long: int
+    macd_fast: int
+    macd_slow: int
+    macd_signal: int
+    rsi: int = 14
+    atr: int = 14
+
+    def key(self) -> str:
+        return ",".join(str(v) for v in self)
+
+    @property
+    def min_bars(self) -> int:
+        """Velas cerradas necesarias para que todas las medias existan."""
+        slow = max(self.macd_fast, self.macd_slow)
+        return max(
+            self.ema_short,
+            self.ema_long,
+            slow + self.macd_signal - 1,
+            self.rsi + 1,
+            self.atr + 1,
+        )
+
+
+# ============================================================
+# 🧠 Estado de una (symbol, tf)
+# ============================================================
+class IndicatorState:
+    __slots__ = ("params", "window", "last_ts", "_ring", "_head", "count") + _SCALARS
+
+    def __init__(self, params: IndicatorParams, window: int):
+        self.params = params
+        self.window = int(window)
+        self.last_ts = 0
+        self._ring = np.full((len(SERIES_FIELDS), self.window), np.nan)
+        self._head = 0
+        self.count = 0
+        for name in _SCALARS:
+            setattr(self, name, math.nan)
+
+    # --------------------------------------------------------
+    # Siembra (vectorizada, una vez)
+    # --------------------------------------------------------
+    @classmethod
+    def seed(
+        cls,
+        params: IndicatorParams,
+        window: int,
+        ts: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+    ) -> Optional["IndicatorState"]:
+        """Estado tras la última vela de `close` (todas cerradas) o None."""
+        if len(close) < params.min_bars:
+            return None
+
+        fast, slow = sorted((params.macd_fast, params.macd_slow))
+        out = npi.compute_core(
+            high,
+            low,
+            close,
+            params.ema_short,
+            params.ema_long,
+            fast,
+            slow,
+            params.macd_signal,
+            rsi_length=params.rsi,
+            atr_length=params.atr,
+        )
+        up, down = npi.wilder_averages(close, params.rsi)
+
+        state = cls(params, window)
+        state.ema_s = float(out["ema_short"][-1])
+        state.ema_l = float(out["ema_long"][-1])
+        state.ema_f = float(npi.ema(close, fast)[-1])
+        state.ema_sl = float(npi.ema(close, slow)[-1])
+        state.sig = float(out["macd_signal_line"][-1])
+        state.up = float(up[-1])
+        state.down = float(down[-1])
+        state.atr = float(out["atr"][-1])
+        state.prev_close = float(close[-1])
+        state.last_ts = int(ts[-1])
+
+        if any(math.isnan(getattr(state, name)) for name in _SCALARS):
+            return None
+
+        close = np.asarray(close, dtype=np.float64)
+        series = np.vstack([close] + [out[name] for name in SERIES_FIELDS[1:]])
+        keep = min(state.window, series.shape[1])
+        state._ring[:, :keep] = series[:, -keep:]
+        state._head = keep % state.window
+        state.count = keep
+        return state
+
+    # --------------------------------------------------------
+    # Paso O(1)
+    # --------------------------------------------------------
+    def _advance(self, high: float, low: float, close: float):
+        """(escalares nuevos, valores de la vela) sin modificar el estado."""
+        p = self.params
+        fast, slow = sorted((p.macd_fast, p.macd_slow))
+
+        ema_s = self.ema_s + 2.0 / (p.ema_short + 1) * (close - self.ema_s)
+        ema_l = self.ema_l + 2.0 / (p.ema_long + 1) * (close - self.ema_l)
+        ema_f = self.ema_f + 2.0 / (fast + 1) * (close - self.ema_f)
+        ema_sl = self.ema_sl + 2.0 / (slow + 1) * (close - self.ema_sl)
+        line = ema_f - ema_sl
+        sig = self.sig + 2.0 / (p.macd_signal + 1) * (line - self.sig)
+
+        diff = close - self.prev_close
+        up = self.up + (max(diff, 0.0) - self.up) / p.rsi
+        down = self.down + (max(-diff, 0.0) - self.down) / p.rsi
+        rsi = 100.0 * up / (up + down) if (up + down) > 0 else math.nan
+
+        hl = (high - low) or _EPS
+        pc = self.prev_close
+        tr = max(abs(hl), abs(high - pc), abs(pc - low))
+        atr = self.atr + (tr - self.atr) / p.atr
+
+        scalars = (ema_s, ema_l, ema_f, ema_sl, sig, up, down, atr, close)
+        values = (close, ema_s, ema_l, line, line - sig, sig, rsi, atr)
+        return scalars, values
+
+    def update(self, ts_ms: int, high: float, low: float, close: float) -> None:
+        """Aplica una vela CERRADA."""
+        scalars, values = self._advance(high, low, close)
+        for name, value in zip(_SCALARS, scalars):
+            setattr(self, name, value)
+        self._ring[:, self._head] = values
+        self._head = (self._head + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+        self.last_ts = int(ts_ms)
+
+    def provisional(self, high: float, low: float, close: float) -> np.ndarray:
+        """Valores de la vela en formación (no se guardan)."""
+        return np.asarray(self._advance(high, low, close)[1])
+
+    def series(self, n: int) -> np.ndarray:
+        """(len(SERIES_FIELDS), n): últimas n velas cerradas, NaN delante si faltan."""
+        idx = (self._head - n + np.arange(n)) % self.window
+        out = self._ring[:, idx]
+        if n > self.count:
+            out[:, : n - self.count] = np.nan
+        return out
+
+    # --------------------------------------------------------
+    # Checkpoint
+    # --------------------------------------------------------
+    def to_checkpoint(self) -> Tuple[int, str, bytes]:
+        scalars = {name: getattr(self, name) for name in _SCALARS}
+        scalars["count"] = self.count
+        series = np.ascontiguousarray(self.series(self.window))
+        return self.last_ts, json.dumps(scalars), series.tobytes()
+
+    @classmethod
+    def from_checkpoint(
+        cls,
+        params: IndicatorParams,
+        window: int,
+        last_ts: int,
+        scalars: str,
+        series: bytes,
+    ) -> "IndicatorState":
+        data = json.loads(scalars)
+        state = cls(params, window)
+        for name in _SCALARS:
+            setattr(state, name, float(data[name]))
+        state.last_ts = int(last_ts)
+
+        ring = np.frombuffer(series, dtype=np.float64).reshape(len(SERIES_FIELDS), -1)
+        keep = min(state.window, ring.shape[1], int(data.get("count", ring.shape[1])))
+        if keep:
+            state._ring[:, :keep] = ring[:, -keep:]
+        state._head = keep % state.window
+        state.count = keep
+        return state
+
+
+# ============================================================
+# 🗂️ Registro de estados
+# ============================================================
+class StreamingIndicators:
+    """
+    (symbol, tf) → IndicatorState, compartido por el motor y el stream.
+
+    `store` (opcional) es el CandleStore: fuente de histórico para la
+    siembra y destino de los checkpoints.
+    """
+
+    def __init__(
+        self,
+        params: IndicatorParams,
+        window: int = 260,
+        store=None,
+        seed_bars: int = 1000,
+        checkpoint_interval: float = 60.0,
+    ):
+        self.params = params
+        self.window = int(window)
+        self.store = store
+        self.seed_bars = int(seed_bars)
+        self.checkpoint_interval = float(checkpoint_interval)
+
+        self._states: Dict[Tuple[str, str], IndicatorState] = {}
+        # _lock solo protege los dicts; el trabajo va con el lock de la clave
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+        # Checkpoints pendientes (claves) y su hilo escritor
+        self._dirty: set = set()
+        self._writer: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+
+        self.seeds = 0
+        self.restores = 0
+        self.steps = 0
+        self.lookups = 0
+        self.checkpoints = 0
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    # --------------------------------------------------------
+    # Lectura
+    # --------------------------------------------------------
+    def lookup(
+        self,
+        symbol: str,
+        tf: str,
+        ts: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        now_ms: int | None = None,
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Series alineadas con `ts` (última vela en formación incluida).
+        None si no se puede servir desde el estado: el llamador recalcula.
+        """
+        period = timeframe_to_seconds(tf)
+        n = len(ts)
+        if not period or n == 0:
+            return None
+
+        period_ms = period * 1000
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        closed = n if int(ts[-1]) + period_ms <= now_ms else n - 1
+        if closed < self.params.min_bars:
+            return None
+
+        key = (symbol.upper(), str(tf))
+        last_closed = int(ts[closed - 1])
+
+        # Restauración / siembra (disco) solo bloquean esta clave
+        with self._key_lock(key):
+            with self._lock:
+                state = self._states.get(key)
+            if state is None:
+                state = self._restore(key)
+
+            if state is not None and state.last_ts > last_closed:
+                # Ventana más vieja que el estado (lectura concurrente)
+                return None
+
+            start = None
+            if state is not None and state.last_ts >= int(ts[0]):
+                i = int(np.searchsorted(ts[:closed], state.last_ts))
+                if i < closed and int(ts[i]) == state.last_ts:
+                    start = i + 1
+
+            changed = False
+            if start is None:
+                state = self._seed(key, ts[:closed], high, low, close)
+                if state is None:
+                    return None
+                changed = True
+            elif start < closed:
+                for j in range(start, closed):
+                    state.update(
+                        int(ts[j]), float(high[j]), float(low[j]), float(close[j])
+                    )
+                changed = True
+
+            out = state.series(closed)
+            if closed < n:
+                live = state.provisional(
+                    float(high[-1]), float(low[-1]), float(close[-1])
+                )
+                out = np.concatenate([out, live[:, None]], axis=1)
+
+            with self._lock:
+                self._states[key] = state
+                self.lookups += 1
+                if start is not None and start < closed:
+                    self.steps += closed - start
+
+        if changed:
+            self._mark_dirty(key)
+
+        return {name: out[i] for i, name in enumerate(SERIES_FIELDS)}
+
+    # --------------------------------------------------------
+    # Stream (velas cerradas)
+    # --------------------------------------------------------
+    def on_closed_bar(self, symbol: str, tf: str, ts_ms: int, ohlcv) -> None:
+        """
+        Listener de CandleCache: avanza el estado en O(1). Corre en el
+        event loop: si la clave está ocupada (siembra en curso) no espera;
+        el siguiente lookup() pondrá el estado al día por REST.
+        """
+        period = timeframe_to_seconds(tf)
+        if not period:
+            return
+        key = (symbol.upper(), str(tf))
+        _, high, low, close, _ = ohlcv
+
+        lock = self._key_lock(key)
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                state = self._states.get(key)
+            if state is None or ts_ms <= state.last_ts:
+                return
+            if ts_ms - state.last_ts != period * 1000:
+                # Hueco: se vuelve a sembrar en el próximo lookup
+                with self._lock:
+                    self._states.pop(key, None)
+                return
+            state.update(int(ts_ms), float(high), float(low), float(close))
+            with self._lock:
+                self.steps += 1
+        finally:
+            lock.release()
+
+        self._mark_dirty(key)
+
+    # --------------------------------------------------------
+    # Siembra / persistencia
+    # --------------------------------------------------------
+    def _seed(self, key, ts, high, low, close) -> Optional[IndicatorState]:
+        """Siembra con la ventana dada o, si cubre más, con el candle_store."""
+        closed = len(ts)
+        src = (ts, high[:closed], low[:closed], close[:closed])
+
+        history = self._load_history(key, int(ts[-1]))
+        if history is not None and len(history) > closed:
+            src = (history.ts, history.high, history.low, history.close)
+
+        state = IndicatorState.seed(self.params, self.window, *src)
+        if state is not None:
+            with self._lock:
+                self.seeds += 1
+        return state
+
+    def _load_history(self, key, last_ts: int):
+        """Histórico contiguo del store que termina exactamente en last_ts."""
+        if self.store is None:
+            return None
+        try:
+            history = self.store.load_history(key[0], key[1], end_ms=last_ts)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo leer histórico {key}: {e}")
+            return None
+
+        if history is None or history.last_ts_ms != last_ts:
+            return None
+
+        history = history.tail(self.seed_bars)
+        period_ms = timeframe_to_seconds(key[1]) * 1000
+        gaps = np.flatnonzero(np.diff(history.ts) != period_ms)
+        if len(gaps):
+            history = history.tail(len(history) - int(gaps[-1]) - 1)
+        return history
+
+    def _restore(self, key) -> Optional[IndicatorState]:
+        if self.store is None:
+            return None
+        try:
+            row = self.store.load_indicator_state(key[0], key[1], self.params.key())
+            if row is None:
+                return None
+            state = IndicatorState.from_checkpoint(self.params, self.window, *row)
+        except Exception as e:
+            logger.warning(f"⚠️ Checkpoint de indicadores ilegible {key}: {e}")
+            return None
+
+        with self._lock:
+            self.restores += 1
+        return state
+
+    def _mark_dirty(self, key) -> None:
+        """Apunta la clave para el próximo lote de checkpoints (sin E/S)."""
+        if self.store is None:
+            return
+        with self._lock:
+            self._dirty.add(key)
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._writer_loop, name="indicator-checkpoints", daemon=True
+                )
+                self._writer.start()
+
+    def _writer_loop(self) -> None:
+        while True:
+            self._wake.wait(self.checkpoint_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Escribe los checkpoints pendientes (hilo escritor o al apagar)."""
+        with self._lock:
+            keys, self._dirty = self._dirty, set()
+
+        written = 0
+        for key in keys:
+            with self._key_lock(key):
+                with self._lock:
+                    state = self._states.get(key)
+                if state is None:
+                    continue
+                checkpoint = state.to_checkpoint()
+            if self._checkpoint(key, checkpoint):
+                written += 1
+
+        with self._lock:
+            self.checkpoints += written
+        return written
+
+    def _checkpoint(self, key, checkpoint) -> bool:
+        if self.store is None:
+            return False
+        last_ts, scalars, series = checkpoint
+        try:
+            self.store.save_indicator_state(
+                key[0], key[1], self.params.key(), last_ts, scalars, series
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo guardar checkpoint de indicadores {key}: {e}")
+            return False
+
+    def invalidate(self, symbol: str | None = None) -> None:
+        with self._lock:
+            if symbol is None:
+                self._states.clear()
+                return
+            for key in [k for k in self._states if k[0] == symbol.upper()]:
+                del self._states[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "states": len(self._states),
+                "seeds": self.seeds,
+                "restores": self.restores,
+                "steps": self.steps,
+                "lookups": self.lookups,
+                "checkpoints": self.checkpoints,
+                "pending_checkpoints": len(self._dirty),
+            }
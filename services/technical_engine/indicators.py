@@ -6,10 +6,11 @@ de las 3 mejores temporalidades disponibles para trading de futuros (20x).
 """
 import pandas as pd
 import numpy as np
-import pandas_ta as ta
 import logging
 
-from services.bybit_service.bybit_client import get_ohlcv_data
+from services.bybit_service.bybit_client import get_ohlcv_data, timeframe_index
+from services.technical_engine.feature_registry import feature_registry
+from services.technical_engine.indicator_state import IndicatorParams
 from services.technical_engine.smart_divergences import detect_smart_divergences
 
 logger = logging.getLogger("indicators")
@@ -41,13 +42,14 @@ def _strength_to_score(value):
 # 🧠 Selección inteligente de temporalidades
 # ================================================================
 PREFERRED_INTERVALS = ["4h", "1h", "30m", "15m", "5m", "3m", "1m"]
+MIN_VALID_BARS = 150  # velas mínimas para indicadores confiables
 
 
 def _is_valid_df(df):
     """Evalúa si un dataframe tiene suficiente calidad."""
     if df is None or df.empty:
         return False
-    if len(df) < 150:  # velas mínimas para indicadores confiables
+    if len(df) < MIN_VALID_BARS:
         return False
     return True
 
@@ -64,10 +66,14 @@ def select_best_intervals(symbol: str, n=3):
 
     for tf in PREFERRED_INTERVALS:
         try:
-            tf_numerical = tf.replace("m", "").replace("h", "")
-            df = get_ohlcv_data(symbol, interval=tf_numerical)
-
-            if _is_valid_df(df):
+            # Índice de disponibilidad: sin red en estado estable
+            known = timeframe_index.has_min_bars(symbol, tf, MIN_VALID_BARS)
+            if known is None:
+                tf_numerical = tf.replace("m", "").replace("h", "")
+                df = get_ohlcv_data(symbol, interval=tf_numerical)
+                known = _is_valid_df(df)
+
+            if known:
                 valid.append(tf)
         except Exception:
             continue
@@ -178,6 +184,24 @@ def enrich_with_divergences(df: pd.DataFrame):
 # ================================================================
 # 📊 Cálculo técnico principal
 # ================================================================
+# EMA 10/30, MACD 12/26/9, RSI 14, ATR 14 (independiente de config)
+TECHNICAL_PARAMS = IndicatorParams(10, 30, 12, 26, 9, 14, 14)
+
+# Features que consume get_technical_data (el MFI ya no se pide: no se usaba)
+TECHNICAL_FEATURES = (
+    "ema_short",
+    "ema_long",
+    "rsi",
+    "macd",
+    "macd_histogram",
+    "macd_signal_line",
+    "atr",
+    "atr_rel",
+    "bb_width",
+    "wick_ratio",
+)
+
+
 def get_technical_data(symbol: str, intervals=None):
     """
     Calcula indicadores técnicos para múltiples temporalidades.
@@ -197,53 +221,31 @@ def get_technical_data(symbol: str, intervals=None):
             if not _validate_df(df, symbol, tf):
                 continue
 
-            # === Indicadores ===
-            df["ema_short"] = ta.ema(df["close"], length=10)
-            df["ema_long"] = ta.ema(df["close"], length=30)
-            df["rsi"] = ta.rsi(df["close"], length=14)
-
-            macd = ta.macd(df["close"], fast=12, slow=26, signal=9)
-            if isinstance(macd, pd.DataFrame):
-                df["macd"], df["macd_signal"], df["macd_hist"] = macd.iloc[:, 0], macd.iloc[:, 1], macd.iloc[:, 2]
-
-            bb = ta.bbands(df["close"], length=20)
-            if isinstance(bb, pd.DataFrame):
-                df["bb_upper"], df["bb_mid"], df["bb_lower"] = bb.iloc[:, 0], bb.iloc[:, 1], bb.iloc[:, 2]
-
-            df["atr"] = ta.atr(df["high"], df["low"], df["close"], length=14)
-            df["atr_rel"] = df["atr"] / df["close"]
-            df["bb_width"] = (df["bb_upper"] - df["bb_lower"]) / df["bb_mid"]
-
-            try:
-                df["mfi"] = ta.mfi(df["high"], df["low"], df["close"], df["volume"], length=14)
-            except Exception:
-                df["mfi"] = np.nan
+            # === Indicadores (feature_registry, memoizados por vela) ===
+            feats = feature_registry.compute(
+                df, TECHNICAL_FEATURES, TECHNICAL_PARAMS, symbol, tf
+            )
+            for col in ("ema_short", "ema_long", "rsi", "macd", "atr", "atr_rel"):
+                df[col] = feats[col]
+            df["bb_width"] = feats["bb_width"]
+            # Mismo convenio que motor_wrapper_core: señal y histograma
+            df["macd_signal"] = feats["macd_signal_line"]
+            df["macd_hist"] = feats["macd_histogram"]
+            df["macd_histogram"] = feats["macd_histogram"]
 
             last = df.iloc[-1]
             bars_count = len(df)
 
             # 🔍 Cuerpo y mechas de la última vela
-            try:
-                o = float(last["open"])
-                h = float(last["high"])
-                l = float(last["low"])
-                c = float(last["close"])
-
-                body = abs(c - o)
-                upper_wick = max(0.0, h - max(o, c))
-                lower_wick = max(0.0, min(o, c) - l)
-                total_wick = upper_wick + lower_wick
-                wick_ratio = float(total_wick / (body + 1e-8))
-            except Exception:
-                wick_ratio = 0.0
+            wick_ratio = float(np.nan_to_num(feats["wick_ratio"][-1]))
 
             trend = "bullish" if last["ema_short"] > last["ema_long"] else "bearish"
 
             # 🔍 Enriquecimiento con divergencias simples (legacy)
             divs = enrich_with_divergences(df)
 
-            # 🆕 Divergencias avanzadas "tipo TradingView"
-            smart_divs = detect_smart_divergences(df)
+            # 🆕 Divergencias avanzadas (estado incremental por symbol/tf)
+            smart_divs = detect_smart_divergences(df, symbol, tf)
 
             data[tf] = {
                 "price": float(last["close"]),
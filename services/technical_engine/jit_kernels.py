@@ -0,0 +1,234 @@
+"""
+jit_kernels.py — Bucles recursivos compilados (numba) opcionales
+----------------------------------------------------------------
+Las recursiones exponenciales (EMA / RSI / ATR) y el barrido de pivotes
+son bucles por vela. numpy_indicators y divergence_engine los resuelven
+con NumPy (bloques matriciales, ventanas deslizantes); si numba está
+instalado (pip install numba) estos kernels compilados los sustituyen.
+
+- INDICATOR_JIT=auto (defecto): numba si se puede importar, si no NumPy.
+- INDICATOR_JIT=off: siempre NumPy.
+- Sin numba no cambia nada: mismos resultados por la ruta NumPy.
+- Los kernels compilados se guardan en NUMBA_CACHE_DIR (config.py), no
+  en el __pycache__ del código; si no se puede escribir ahí, se compilan
+  en cada arranque.
+
+Los kernels se escriben como Python plano; numba.njit los compila. Las
+versiones sin compilar sirven para comprobar la lógica (parity(...,
+backend="python")), nunca para producción.
+
+parity() y benchmark() comparan cada kernel contra la ruta NumPy en
+ventanas de 260 y 10 000 velas:
+
+  python -m services.technical_engine.jit_kernels
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from typing import Callable, Dict, Sequence
+
+import numpy as np
+
+from config import INDICATOR_JIT, NUMBA_CACHE_DIR
+
+logger = logging.getLogger("jit_kernels")
+
+try:
+    import numba
+
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba es opcional
+    numba = None
+    NUMBA_AVAILABLE = False
+
+
+# ============================================================
+# 🧮 Kernels (Python plano, compilables)
+# ============================================================
+def _ewm_rows_py(x, alpha, y0, out):
+    """out[r, t] = (1−α)·out[r, t−1] + α·x[r, t], con out[r, −1] = y0[r]."""
+    decay = 1.0 - alpha
+    rows, n = x.shape
+    for r in range(rows):
+        prev = y0[r]
+        for t in range(n):
+            prev = decay * prev + alpha * x[r, t]
+            out[r, t] = prev
+
+
+def _pivot_mask_py(x, width, is_high, out):
+    """
+    out[i] = True si x[i] es el extremo de x[i−width : i+width+1] y es su
+    primera aparición en la ventana (misma regla que argmax / argmin).
+    NaN nunca es pivote y cuenta como ausente.
+    """
+    n = x.shape[0]
+    for i in range(n):
+        xi = x[i]
+        out[i] = False
+        if xi != xi:
+            continue
+        ok = True
+        lo = max(0, i - width)
+        hi = min(n, i + width + 1)
+        for j in range(lo, hi):
+            if j == i:
+                continue
+            xj = x[j]
+            if xj != xj:
+                continue
+            if is_high:
+                if xj > xi or (j < i and xj == xi):
+                    ok = False
+                    break
+            else:
+                if xj < xi or (j < i and xj == xi):
+                    ok = False
+                    break
+        out[i] = ok
+
+
+def _cache_dir_writable(path: str) -> bool:
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        return False
+    return os.access(path, os.W_OK)
+
+
+if NUMBA_AVAILABLE:
+    # numba lee NUMBA_CACHE_DIR al importarse; se fija también aquí por si
+    # ya estaba importado
+    numba.config.CACHE_DIR = NUMBA_CACHE_DIR
+    _jit_cache = _cache_dir_writable(NUMBA_CACHE_DIR)
+    if not _jit_cache:
+        logger.warning(f"⚠️ NUMBA_CACHE_DIR sin escritura: {NUMBA_CACHE_DIR}")
+    _ewm_rows_jit = numba.njit(cache=_jit_cache, nogil=True)(_ewm_rows_py)
+    _pivot_mask_jit = numba.njit(cache=_jit_cache, nogil=True)(_pivot_mask_py)
+else:
+    _ewm_rows_jit = None
+    _pivot_mask_jit = None
+
+JIT_ENABLED = NUMBA_AVAILABLE and INDICATOR_JIT != "off"
+BACKEND = "numba" if JIT_ENABLED else "numpy"
+
+
+# ============================================================
+# 🔌 API usada por numpy_indicators / divergence_engine
+# ============================================================
+def ewm_rows(x: np.ndarray, alpha: float, y0, kernel: Callable | None = None):
+    """Recursión exponencial sobre (..., n) con el kernel compilado."""
+    kernel = kernel or _ewm_rows_jit
+    x = np.asarray(x, dtype=np.float64)
+    lead = x.shape[:-1]
+    flat = np.ascontiguousarray(x.reshape(-1, x.shape[-1]))
+    y0 = np.ascontiguousarray(
+        np.broadcast_to(np.asarray(y0, dtype=np.float64), lead).reshape(-1)
+    )
+    out = np.empty_like(flat)
+    kernel(flat, float(alpha), y0, out)
+    return out.reshape(x.shape)
+
+
+def pivot_mask(
+    x: np.ndarray, width: int, is_high: bool, kernel: Callable | None = None
+) -> np.ndarray:
+    kernel = kernel or _pivot_mask_jit
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    out = np.empty(x.shape[0], dtype=np.bool_)
+    kernel(x, int(width), bool(is_high), out)
+    return out
+
+
+# ============================================================
+# ✅ Paridad / ⏱️ benchmark
+# ============================================================
+def _kernels(backend: str) -> Dict[str, Callable]:
+    if backend == "python":
+        return {"ewm": _ewm_rows_py, "pivots": _pivot_mask_py}
+    if not NUMBA_AVAILABLE:
+        raise RuntimeError("numba no está instalado")
+    return {"ewm": _ewm_rows_jit, "pivots": _pivot_mask_jit}
+
+
+def _cases(bars: int, seed: int):
+    from services.technical_engine import divergence_engine as de
+    from services.technical_engine import numpy_indicators as npi
+
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    close[rng.integers(0, bars, max(1, bars // 100))] = np.round(close[0], 2)
+    x = rng.normal(0, 1, (4, bars))
+
+    return {
+        "ewm": (
+            lambda k: ewm_rows(x, 0.1, x[:, 0], kernel=k),
+            lambda: npi._ewm_from_numpy(x, 0.1, x[:, 0]),
+        ),
+        "pivots_high": (
+            lambda k: np.flatnonzero(pivot_mask(close, 3, True, kernel=k)),
+            lambda: de._pivots_numpy(close, 3, "high"),
+        ),
+        "pivots_low": (
+            lambda k: np.flatnonzero(pivot_mask(close, 3, False, kernel=k)),
+            lambda: de._pivots_numpy(close, 3, "low"),
+        ),
+    }
+
+
+def parity(
+    bars: Sequence[int] = (260, 10_000), backend: str = "numba", seed: int = 7
+) -> dict:
+    """Diferencia máxima kernel vs NumPy por caso y tamaño (0 = idéntico)."""
+    kernels = _kernels(backend)
+    result = {"backend": backend}
+    for n in bars:
+        for name, (fast, ref) in _cases(n, seed).items():
+            kernel = kernels["ewm" if name == "ewm" else "pivots"]
+            a, b = fast(kernel), ref()
+            if a.shape != b.shape:
+                result[f"{name}_{n}"] = f"forma distinta {a.shape} vs {b.shape}"
+            elif a.dtype.kind == "f":
+                result[f"{name}_{n}"] = float(np.nanmax(np.abs(a - b)))
+            else:
+                result[f"{name}_{n}"] = int((a != b).sum())
+    return result
+
+
+def benchmark(
+    bars: Sequence[int] = (260, 10_000),
+    runs: int = 50,
+    backend: str = "numba",
+    seed: int = 7,
+) -> dict:
+    """Tiempos medios (µs) kernel vs NumPy y speedup por caso y tamaño."""
+    kernels = _kernels(backend)
+    result = {"backend": backend, "runs": runs}
+    for n in bars:
+        for name, (fast, ref) in _cases(n, seed).items():
+            kernel = kernels["ewm" if name == "ewm" else "pivots"]
+            fast(kernel)  # compilación fuera de la medida
+            timings = {}
+            for label, fn in (("kernel", lambda: fast(kernel)), ("numpy", ref)):
+                start = time.perf_counter()
+                for _ in range(runs):
+                    fn()
+                timings[label] = (time.perf_counter() - start) / runs * 1e6
+            result[f"{name}_{n}"] = {
+                "kernel_us": round(timings["kernel"], 1),
+                "numpy_us": round(timings["numpy"], 1),
+                "speedup": round(timings["numpy"] / timings["kernel"], 2),
+            }
+    return result
+
+
+if __name__ == "__main__":
+    import json
+
+    backend = "numba" if NUMBA_AVAILABLE else "python"
+    print(json.dumps({"backend_activo": BACKEND}, indent=2))
+    print(json.dumps(parity(backend=backend), indent=2))
+    print(json.dumps(benchmark(backend=backend, runs=3), indent=2))
@@ -13,7 +13,8 @@ Responsabilidades:
   * MACD (12/26/9 por defecto)
   * RSI (14)
 - Clasificar tendencia por timeframe (Alcista / Bajista / Lateral)
-- Detectar divergencias simples RSI / MACD (alcista / bajista)
+- Detectar divergencias RSI / MACD sobre pivotes (divergence_engine):
+  tipo, fuerza y pivotes implicados
 - Calcular votación de tendencia y compatibilidad con la dirección
   sugerida por la señal (LONG/SHORT).
 
@@ -22,15 +23,37 @@ trend_system_final.py en analyze_and_format().
 """
 
 from __future__ import annotations
+import asyncio
 import logging
+import time
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
 import pandas as pd
-import pandas_ta as ta
 
 
-from services.bybit_service.bybit_client import get_ohlcv_data
+from services.bybit_service.bybit_client import (
+    candle_cache,
+    candle_store,
+    get_candles,
+    get_ohlcv_data,
+    timeframe_index,
+)
+from services.bybit_service.async_market_data import fetch_timeframes, get_candles_async
+from services.bybit_service.candle_cache import timeframe_to_seconds
+from services.bybit_service.candles import Candles, stack_tails
+from services.technical_engine import numpy_indicators as npi
+from services.technical_engine.divergence_engine import (
+    DEFAULT_LOOKBACKS,
+    detect_divergences,
+)
+from services.technical_engine.feature_registry import CORE_FEATURES, feature_registry
+from services.technical_engine.indicator_state import (
+    IndicatorParams,
+    StreamingIndicators,
+)
+from services.technical_engine.result_cache import ResultCache
+from services.technical_engine.snapshot_records import series_view
 from config import (
     EMA_SHORT_PERIOD,
     EMA_LONG_PERIOD,
@@ -38,6 +61,15 @@ from config import (
     MACD_SLOW,
     MACD_SIGNAL,
     ANALYSIS_MODE,
+    INDICATOR_ENGINE,
+    STREAMING_INDICATORS_ENABLED,
+    INDICATOR_SEED_BARS,
+    INDICATOR_CHECKPOINT_SEC,
+    TF_RESULT_CACHE_ENABLED,
+    TF_RESULT_CACHE_MAX_ENTRIES,
+    TF_RESULT_CACHE_MAX_MB,
+    ANALYSIS_WARMUP_MARGIN,
+    OPEN_POSITION_DIVERGENCE_LOOKBACK,
 )
 
 
@@ -46,7 +78,46 @@ logger = logging.getLogger("motor_wrapper")
 # ============================================================
 # 🔧 Utilidades internas
 # ============================================================
-MIN_BARS_PER_TF = 120  # mínimo para considerar un TF “usable”
+INDICATOR_PARAMS = IndicatorParams(
+    EMA_SHORT_PERIOD, EMA_LONG_PERIOD, MACD_FAST, MACD_SLOW, MACD_SIGNAL, 14, 14
+)
+DIVERGENCE_WIDTH = 3  # velas a cada lado de un pivote (divergence_engine)
+
+# Lookback de divergencias por contexto; el resto usa el mayor de
+# DEFAULT_LOOKBACKS. Una ventana más corta basta para vigilar posiciones.
+CONTEXT_LOOKBACKS = {"open_position": OPEN_POSITION_DIVERGENCE_LOOKBACK}
+
+
+def warmup_bars(lookback: int | None = None) -> int:
+    """
+    Velas necesarias para que EMA / MACD / RSI / ATR existan en todo el
+    tramo que miran las divergencias (lookback + pivote confirmado).
+    """
+    lookback = max(DEFAULT_LOOKBACKS) if lookback is None else lookback
+    return INDICATOR_PARAMS.min_bars + lookback + DIVERGENCE_WIDTH + 1
+
+
+def context_lookbacks(context: str | None = None) -> Tuple[int, ...]:
+    """Lookbacks de divergencia para un contexto (entry, open_position...)."""
+    limit = CONTEXT_LOOKBACKS.get(context)
+    if limit is None:
+        return tuple(DEFAULT_LOOKBACKS)
+    return tuple(lb for lb in DEFAULT_LOOKBACKS if lb <= limit) or (limit,)
+
+
+def analysis_bars(context: str | None = None) -> int:
+    """Ventana a descargar: calentamiento + margen de convergencia."""
+    return warmup_bars(max(context_lookbacks(context))) + ANALYSIS_WARMUP_MARGIN
+
+
+# Mínimo para considerar un TF "usable": 134 con los periodos por defecto
+# (antes 120 fijo). Con 120 velas el lookback de 80 de las divergencias
+# empezaba dentro del calentamiento de la EMA 50 y leía indicadores NaN.
+MIN_BARS_PER_TF = warmup_bars()
+ANALYSIS_BARS = analysis_bars()  # ventana descargada por analyze_single_tf
+
+PREFERRED_TFS = ["240", "60", "30", "15"]  # 4h, 1h, 30m, 15m
+FALLBACK_TFS = ["60", "30", "15", "5"]  # 1h, 30m, 15m, 5m
 
 
 def _get_ohlcv(symbol: str, interval: str, limit: int = 300) -> pd.DataFrame | None:
@@ -62,12 +133,27 @@ def _get_ohlcv(symbol: str, interval: str, limit: int = 300) -> pd.DataFrame | N
             logger.warning(f"⚠️ {symbol} ({interval}) sin columnas OHLCV completas.")
             return None
 
-        return df.copy()
+        # Vista sobre candle_cache: OHLCV solo-lectura, añadir columnas es seguro
+        return df
     except Exception as e:
         logger.error(f"❌ Error obteniendo OHLCV {symbol} ({interval}): {e}")
         return None
 
 
+def _tf_usable(symbol: str, tf: str) -> bool:
+    """
+    ¿Tiene el TF al menos MIN_BARS_PER_TF velas?
+    Responde el timeframe_index (sin red); solo si no lo sabe se sondea
+    descargando OHLCV como antes.
+    """
+    known = timeframe_index.has_min_bars(symbol, tf, MIN_BARS_PER_TF)
+    if known is not None:
+        return known
+
+    df = _get_ohlcv(symbol, tf, limit=MIN_BARS_PER_TF)
+    return df is not None and len(df) >= MIN_BARS_PER_TF
+
+
 def _choose_timeframes(symbol: str) -> List[str]:
     """
     Elige las temporalidades usando la política acordada:
@@ -78,39 +164,93 @@ def _choose_timeframes(symbol: str) -> List[str]:
     Si 4h no tiene suficientes velas:
       ["60", "30", "15", "5"]   (1h, 30m, 15m, 5m)
     """
-    preferred = ["240", "60", "30", "15"]
-    fallback = ["60", "30", "15", "5"]
+    preferred = PREFERRED_TFS
+    fallback = FALLBACK_TFS
 
     # Comprobar 4h solamente; si no hay datos suficientes, usamos fallback
-    df_4h = _get_ohlcv(symbol, "240", limit=MIN_BARS_PER_TF)
-    if df_4h is None or len(df_4h) < MIN_BARS_PER_TF:
+    if not _tf_usable(symbol, "240"):
         logger.info(f"ℹ️ {symbol}: 4h insuficiente → usando TF fallback.")
-        tfs = []
-        for tf in fallback:
-            df = _get_ohlcv(symbol, tf, limit=MIN_BARS_PER_TF)
-            if df is not None and len(df) >= MIN_BARS_PER_TF:
-                tfs.append(tf)
-        return tfs
+        return [tf for tf in fallback if _tf_usable(symbol, tf)]
 
     # 4h sí disponible → intentar usar los 4 TF preferidos
-    tfs: List[str] = []
-    for tf in preferred:
-        df = _get_ohlcv(symbol, tf, limit=MIN_BARS_PER_TF)
-        if df is not None and len(df) >= MIN_BARS_PER_TF:
-            tfs.append(tf)
+    tfs: List[str] = [tf for tf in preferred if _tf_usable(symbol, tf)]
 
     # En caso extremo, si algo falla, devolvemos lo que haya
     if not tfs:
-        for tf in fallback:
-            df = _get_ohlcv(symbol, tf, limit=MIN_BARS_PER_TF)
-            if df is not None and len(df) >= MIN_BARS_PER_TF:
-                tfs.append(tf)
+        tfs = [tf for tf in fallback if _tf_usable(symbol, tf)]
 
     return tfs
 
 
-def _calc_indicators(df: pd.DataFrame) -> pd.DataFrame:
-    """Añade EMA, MACD, RSI y ATR al DataFrame."""
+INDICATOR_COLUMNS = (
+    "ema_short",
+    "ema_long",
+    "macd",
+    "macd_signal",
+    "macd_hist",
+    "rsi",
+    "atr",
+)
+
+
+# Estado incremental por (symbol, tf): con el stream de klines, analizar
+# un símbolo vigilado es una consulta, no un recálculo
+indicator_states = None
+if STREAMING_INDICATORS_ENABLED and INDICATOR_ENGINE != "pandas_ta":
+    indicator_states = StreamingIndicators(
+        INDICATOR_PARAMS,
+        window=ANALYSIS_BARS,
+        store=candle_store,
+        seed_bars=INDICATOR_SEED_BARS,
+        checkpoint_interval=INDICATOR_CHECKPOINT_SEC,
+    )
+    candle_cache.add_bar_listener(indicator_states.on_closed_bar)
+
+
+def _calc_indicators_numpy(
+    df: pd.DataFrame, symbol: str | None = None, tf: str | None = None
+) -> pd.DataFrame:
+    """
+    EMA, MACD, RSI y ATR desde el feature_registry (sin pandas_ta).
+    Con symbol/tf se memoiza por última vela y, si aún no están, se
+    sirven desde indicator_states.
+    """
+    frame = feature_registry.frame(df, INDICATOR_PARAMS, symbol, tf)
+
+    if indicator_states is not None and symbol and tf and not frame.has("rsi"):
+        out = indicator_states.lookup(
+            symbol,
+            tf,
+            df.index.as_unit("ms").asi8,
+            frame["high"],
+            frame["low"],
+            frame["close"],
+        )
+        if out is not None:
+            frame.provide(out)
+
+    for col, values in _indicator_columns(frame.get(CORE_FEATURES)).items():
+        df[col] = values
+    return df
+
+
+def _indicator_columns(out: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Salida de numpy_indicators → columnas de _calc_indicators."""
+    return {
+        "ema_short": out["ema_short"],
+        "ema_long": out["ema_long"],
+        "macd": out["macd"],
+        "macd_signal": out["macd_signal_line"],
+        "macd_hist": out["macd_histogram"],
+        "rsi": out["rsi"],
+        "atr": out["atr"],
+    }
+
+
+def _calc_indicators_pandas_ta(df: pd.DataFrame) -> pd.DataFrame:
+    """Ruta original con pandas_ta (INDICATOR_ENGINE=pandas_ta)."""
+    import pandas_ta as ta
+
     close = df["close"]
 
     # EMAs
@@ -120,9 +260,10 @@ def _calc_indicators(df: pd.DataFrame) -> pd.DataFrame:
     # MACD
     macd = ta.macd(close, fast=MACD_FAST, slow=MACD_SLOW, signal=MACD_SIGNAL)
     if macd is not None:
+        # Columnas de ta.macd: MACD, MACDh (histograma), MACDs (señal)
         df["macd"] = macd.iloc[:, 0]
-        df["macd_signal"] = macd.iloc[:, 1]
-        df["macd_hist"] = macd.iloc[:, 2]
+        df["macd_hist"] = macd.iloc[:, 1]
+        df["macd_signal"] = macd.iloc[:, 2]
     else:
         df["macd"] = np.nan
         df["macd_signal"] = np.nan
@@ -140,6 +281,40 @@ def _calc_indicators(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def _calc_indicators(
+    df: pd.DataFrame, symbol: str | None = None, tf: str | None = None
+) -> pd.DataFrame:
+    """Añade EMA, MACD, RSI y ATR al DataFrame (motor según INDICATOR_ENGINE)."""
+    if INDICATOR_ENGINE == "pandas_ta":
+        return _calc_indicators_pandas_ta(df)
+    return _calc_indicators_numpy(df, symbol, tf)
+
+
+def _trend_votes(
+    ema_s: float, ema_l: float, macd_hist: float, rsi: float
+) -> Tuple[int, int]:
+    """Votos (bull, bear) de EMA corta/larga, histograma MACD y RSI."""
+    bull = 0
+    bear = 0
+
+    if ema_s > ema_l:
+        bull += 1
+    else:
+        bear += 1
+
+    if macd_hist > 0:
+        bull += 1
+    else:
+        bear += 1
+
+    if rsi >= 55:
+        bull += 1
+    elif rsi <= 45:
+        bear += 1
+
+    return bull, bear
+
+
 def _trend_from_votes(bull: int, bear: int) -> Tuple[str, str]:
     """
     Devuelve (trend_label, trend_code):
@@ -154,57 +329,79 @@ def _trend_from_votes(bull: int, bear: int) -> Tuple[str, str]:
     return "Lateral / Mixta", "sideways"
 
 
-def _detect_simple_divergence(
-    price: pd.Series,
-    indicator: pd.Series,
-    lookback: int = 40,
-    tolerance: float = 0.01,
-) -> str:
-    """
-    Detección MUY SIMPLE de divergencias:
-
-    - Divergencia bajista:
-        precio hace máx. más alto y el indicador un máx. más bajo.
-    - Divergencia alcista:
-        precio hace mín. más bajo y el indicador un mín. más alto.
-
-    Usamos solo el tramo reciente (lookback).
-    Retorna: 'alcista', 'bajista' o 'ninguna'.
-    """
-    price = price.dropna()
-    indicator = indicator.dropna()
-    if len(price) < lookback + 5 or len(indicator) < lookback + 5:
-        return "ninguna"
-
-    p = price.iloc[-lookback:]
-    i = indicator.iloc[-lookback:]
-
-    # Máximos y mínimos “globales” en la ventana
-    p1_high = p.iloc[:-5].max()
-    p2_high = p.iloc[-5:].max()
-    i1_high = i.iloc[:-5].max()
-    i2_high = i.iloc[-5:].max()
+# ============================================================
+# 🗃️ Memo de analyze_single_tf por vela cerrada
+# ============================================================
+# Dentro de una vela el resultado solo cambia por la vela en formación:
+# monitor de posiciones (60 s), reactivaciones (300 s) y análisis manuales
+# reutilizan el primer cálculo del periodo.
+ANALYSIS_PARAMS_KEY = hash((INDICATOR_PARAMS, ANALYSIS_BARS, DEFAULT_LOOKBACKS))
+
+tf_result_cache = (
+    ResultCache(
+        max_entries=TF_RESULT_CACHE_MAX_ENTRIES,
+        max_bytes=int(TF_RESULT_CACHE_MAX_MB * 1024 * 1024),
+    )
+    if TF_RESULT_CACHE_ENABLED
+    else None
+)
 
-    p1_low = p.iloc[:-5].min()
-    p2_low = p.iloc[-5:].min()
-    i1_low = i.iloc[:-5].min()
-    i2_low = i.iloc[-5:].min()
 
-    # Bearish: precio sube, indicador baja
-    if p2_high > p1_high * (1 + tolerance) and i2_high < i1_high * (1 - tolerance):
-        return "bajista"
+def _last_closed_bar_ms(tf: str, now_ms: int | None = None) -> int | None:
+    """Apertura de la última vela cerrada de `tf` según el reloj (sin red)."""
+    period = timeframe_to_seconds(tf)
+    if not period:
+        return None
+    period_ms = period * 1000
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    return (now_ms // period_ms - 1) * period_ms
 
-    # Bullish: precio baja, indicador sube
-    if p2_low < p1_low * (1 - tolerance) and i2_low > i1_low * (1 + tolerance):
-        return "alcista"
 
-    return "ninguna"
+def analyze_single_tf(
+    symbol: str,
+    tf: str,
+    context: str | None = None,
+    candles: Candles | None = None,
+) -> Dict[str, Any] | None:
+    """
+    analyze_single_tf memoizado por (symbol, tf, última vela cerrada,
+    ventana, parámetros). Devuelve una copia superficial: se puede añadir
+    claves sin tocar la caché (las series se comparten, no mutarlas).
+    `context` elige la ventana (analysis_bars / context_lookbacks).
+    `candles` evita la descarga (velas ya leídas, p. ej. en un worker).
+    """
+    if tf_result_cache is None:
+        return _analyze_single_tf(symbol, tf, context, candles)
+
+    bar_ms = _last_closed_bar_ms(tf)
+    if bar_ms is None:
+        return _analyze_single_tf(symbol, tf, context, candles)
+
+    key = (
+        symbol.upper(),
+        str(tf),
+        bar_ms,
+        context_lookbacks(context),
+        ANALYSIS_PARAMS_KEY,
+    )
+    res = tf_result_cache.get(key)
+    if res is None:
+        res = _analyze_single_tf(symbol, tf, context, candles)
+        if res is None:
+            return None
+        tf_result_cache.put(key, res)
+    return dict(res)
 
 
 # ============================================================
 # 🔍 Análisis por timeframe
 # ============================================================
-def analyze_single_tf(symbol: str, tf: str) -> Dict[str, Any] | None:
+def _analyze_single_tf(
+    symbol: str,
+    tf: str,
+    context: str | None = None,
+    candles: Candles | None = None,
+) -> Dict[str, Any] | None:
     """
     Retorna dict por timeframe, ejemplo (DOCUMENTACIÓN):
       {
@@ -220,19 +417,25 @@ def analyze_single_tf(symbol: str, tf: str) -> Dict[str, Any] | None:
         "ema_long": 0.1200,
         "close": 0.1250,
         "atr": 0.0021,
-        "rsi_series": [...],
-        "macd_hist_series": [...],
-        "close_series": [...],
+        "rsi_series": ndarray,        # vistas solo-lectura (snapshot_records)
+        "macd_hist_series": ndarray,
+        "close_series": ndarray,
         "div_rsi": "alcista|bajista|ninguna",
         "div_macd": "alcista|bajista|ninguna",
+        "div_rsi_info": {"type", "strength", "pivots", "bars_ago", "lookback"},
+        "div_macd_info": {...},
       }
     """
 
-    df = _get_ohlcv(symbol, tf, limit=260)
-    if df is None or len(df) < MIN_BARS_PER_TF:
+    lookbacks = context_lookbacks(context)
+    if candles is not None:
+        df = candles.tail(analysis_bars(context)).to_frame()
+    else:
+        df = _get_ohlcv(symbol, tf, limit=analysis_bars(context))
+    if df is None or len(df) < warmup_bars(max(lookbacks)):
         return None
 
-    df = _calc_indicators(df)
+    df = _calc_indicators(df, symbol, tf)
 
     # ✅ Validación fuerte de columnas requeridas
     required = {"rsi", "ema_short", "ema_long", "macd_hist", "close"}
@@ -270,35 +473,23 @@ def analyze_single_tf(symbol: str, tf: str) -> Dict[str, Any] | None:
         except Exception:
             atr_val = 0.0
 
-    # ✅ Series completas (para divergencias / debug)
-    rsi_series = df["rsi"].dropna().astype(float).tolist()
-    macd_hist_series = df["macd_hist"].dropna().astype(float).tolist()
-    close_series = df["close"].dropna().astype(float).tolist()
+    # ✅ Series completas (para divergencias / debug): vistas, sin copiar
+    rsi_arr = df["rsi"].to_numpy(dtype=float)
+    macd_hist_arr = df["macd_hist"].to_numpy(dtype=float)
+    close_arr = df["close"].to_numpy(dtype=float)
 
     # Votos de tendencia (misma lógica que ya tienes)
-    bull = 0
-    bear = 0
-
-    if ema_s > ema_l:
-        bull += 1
-    else:
-        bear += 1
-
-    if macd_hist > 0:
-        bull += 1
-    else:
-        bear += 1
-
-    if rsi >= 55:
-        bull += 1
-    elif rsi <= 45:
-        bear += 1
+    bull, bear = _trend_votes(ema_s, ema_l, macd_hist, rsi)
 
     trend_label, trend_code = _trend_from_votes(bull, bear)
 
-    # ✅ Divergencias simples: RSI vs Close, MACD_HIST vs Close
-    div_rsi = _detect_simple_divergence(df["close"], df["rsi"])
-    div_macd = _detect_simple_divergence(df["close"], df["macd_hist"])
+    # ✅ Divergencias sobre pivotes: RSI y MACD_HIST vs Close en una pasada
+    divs = detect_divergences(
+        close_arr,
+        {"rsi": rsi_arr, "macd": macd_hist_arr},
+        lookbacks=lookbacks,
+        width=DIVERGENCE_WIDTH,
+    )
 
     tf_map = {"240": "4h", "60": "1h", "30": "30m", "15": "15m", "5": "5m", "1": "1m"}
     tf_label = tf_map.get(tf, tf)
@@ -316,44 +507,197 @@ def analyze_single_tf(symbol: str, tf: str) -> Dict[str, Any] | None:
         "ema_long": ema_l,
         "close": close,
         "atr": atr_val,  # ✅ antes estaba "atr" sin definir
-        "rsi_series": rsi_series,
-        "macd_hist_series": macd_hist_series,
-        "close_series": close_series,
-        "div_rsi": div_rsi,
-        "div_macd": div_macd,
+        "rsi_series": series_view(rsi_arr),
+        "macd_hist_series": series_view(macd_hist_arr),
+        "close_series": series_view(close_arr),
+        "div_rsi": divs["rsi"]["type"],
+        "div_macd": divs["macd"]["type"],
+        "div_rsi_info": divs["rsi"],
+        "div_macd_info": divs["macd"],
     }
 
 
 # ============================================================
-# 🧠 Motor principal multi-TF
+# ⚡ Precarga async de velas
 # ============================================================
-def get_multi_tf_snapshot(
+async def prefetch_timeframes(symbol: str, bars: int = ANALYSIS_BARS) -> None:
+    """
+    Descarga en paralelo (ccxt async) todas las TF que usará el motor y
+    las deja en candle_cache. Después, _choose_timeframes y
+    analyze_single_tf ya no tocan la red.
+    """
+    frames = await fetch_timeframes(symbol, PREFERRED_TFS, limit=bars)
+
+    c_4h = frames.get("240")
+    if c_4h is None or len(c_4h) < MIN_BARS_PER_TF:
+        missing = [tf for tf in FALLBACK_TFS if tf not in frames]
+        if missing:
+            await fetch_timeframes(symbol, missing, limit=bars)
+
+
+async def get_multi_tf_snapshot_async(
     symbol: str,
     direction_hint: str | None = None,
+    context: str | None = None,
 ) -> Dict[str, Any]:
     """
-    Analiza el símbolo en varias temporalidades y devuelve un snapshot:
+    Versión async de get_multi_tf_snapshot: latencia de red ≈ un round
+    trip en lugar de uno por temporalidad.
+    """
+    try:
+        await prefetch_timeframes(symbol, analysis_bars(context))
+    except Exception as e:
+        # Sin precarga el motor síncrono descarga lo que falte
+        logger.warning(f"⚠️ Precarga async falló para {symbol}: {e}")
 
-    {
-      "symbol": "EPICUSDT",
-      "direction_hint": "long" / "short" / None,
-      "timeframes": [...],
-      "major_trend_label": "...",
-      "major_trend_code": "bull/bear/sideways",
-      "trend_score": float 0–1,
-      "match_ratio": float 0–100,
-      "divergences": { "RSI": "...", "MACD": "..." },
-      "smart_bias_code": "...",
-      "confidence": float 0–1,
-      "technical_score": float 0–100,
-      "grade": "A" / "B" / "C" / "D",
-    }
+    return get_multi_tf_snapshot(symbol, direction_hint, context)
+
+
+def load_timeframe_candles(
+    symbol: str, context: str | None = None
+) -> Dict[str, Candles]:
     """
-    direction_hint = (direction_hint or "").lower()
-    if direction_hint not in ("long", "short"):
-        direction_hint = None
+    {tf: Candles} con las temporalidades elegidas y la ventana del
+    contexto (vistas de candle_cache). Con esto get_multi_tf_snapshot
+    puede correr en otro proceso sin tocar la red.
+    """
+    bars = analysis_bars(context)
+    frames: Dict[str, Candles] = {}
+    for tf in _choose_timeframes(symbol):
+        candles = get_candles(symbol, tf, bars)
+        if candles is not None and not candles.empty:
+            frames[tf] = candles
+    return frames
+
+
+# ============================================================
+# 🧮 Cribado multi-símbolo (lote vectorizado)
+# ============================================================
+async def scan_indicators(
+    symbols: List[str], tf: str, bars: int = ANALYSIS_BARS
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Indicadores de N símbolos en UNA pasada vectorizada por timeframe
+    (arrays (N, bars), historias cortas enmascaradas). Las velas se piden
+    en paralelo y salen de candle_cache si están calientes.
+
+    Devuelve {symbol: {close, ema_short, ema_long, macd_hist, rsi, atr,
+    votes_bull, votes_bear, trend_label, trend_code, bars}}; los símbolos
+    con menos de MIN_BARS_PER_TF velas quedan fuera.
+    """
+    symbols = list(dict.fromkeys(s.upper() for s in symbols))
+    if not symbols:
+        return {}
+
+    candles = await asyncio.gather(
+        *(get_candles_async(symbol, tf, bars) for symbol in symbols)
+    )
+    ts, arrays = stack_tails(candles, bars)
+    cols = _indicator_columns(
+        npi.compute_core_batch(
+            arrays["high"],
+            arrays["low"],
+            arrays["close"],
+            EMA_SHORT_PERIOD,
+            EMA_LONG_PERIOD,
+            MACD_FAST,
+            MACD_SLOW,
+            MACD_SIGNAL,
+            rsi_length=14,
+            atr_length=14,
+        )
+    )
+    lengths = (ts > 0).sum(axis=1)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for i, symbol in enumerate(symbols):
+        if lengths[i] < MIN_BARS_PER_TF:
+            continue
+
+        close = float(arrays["close"][i, -1])
+        last = {col: float(values[i, -1]) for col, values in cols.items()}
+        rsi = last["rsi"] if not np.isnan(last["rsi"]) else 50.0
+        ema_s = last["ema_short"] if not np.isnan(last["ema_short"]) else close
+        ema_l = last["ema_long"] if not np.isnan(last["ema_long"]) else close
+        macd_hist = last["macd_hist"] if not np.isnan(last["macd_hist"]) else 0.0
+        atr = last["atr"] if not np.isnan(last["atr"]) else 0.0
+
+        bull, bear = _trend_votes(ema_s, ema_l, macd_hist, rsi)
+        trend_label, trend_code = _trend_from_votes(bull, bear)
+
+        results[symbol] = {
+            "close": close,
+            "ema_short": ema_s,
+            "ema_long": ema_l,
+            "macd_hist": macd_hist,
+            "rsi": rsi,
+            "atr": atr,
+            "votes_bull": bull,
+            "votes_bear": bear,
+            "trend_label": trend_label,
+            "trend_code": trend_code,
+            "bars": int(lengths[i]),
+        }
+
+    return results
+
+
+# ============================================================
+# 🧠 Motor principal multi-TF
+# ============================================================
+# El snapshot se parte en dos:
+#   - núcleo (get_snapshot_core): indicadores, votos por TF, divergencias,
+#     trend_score y puntos sin dirección. Caro, cacheable por símbolo.
+#   - overlay (apply_direction): match_ratio, confianza y penalizaciones
+#     por divergencia contraria en 1h/4h. Aritmética sobre el núcleo.
+# Un núcleo sirve a long, short, posiciones hedge y a ambos lados de una
+# señal.
+snapshot_core_cache = (
+    ResultCache(max_entries=TF_RESULT_CACHE_MAX_ENTRIES // 4)
+    if TF_RESULT_CACHE_ENABLED
+    else None
+)
+
+# TF más corto que puede elegir _choose_timeframes: el núcleo no cambia
+# antes de que cierre una vela de este TF
+_FASTEST_TF = min(PREFERRED_TFS + FALLBACK_TFS, key=timeframe_to_seconds)
+
+
+def get_snapshot_core(
+    symbol: str,
+    context: str | None = None,
+    candles: Dict[str, Candles] | None = None,
+) -> Dict[str, Any]:
+    """
+    Núcleo del snapshot (sin dirección), memoizado hasta que cierra la
+    siguiente vela del TF más corto. Con `candles` ({tf: Candles}, ver
+    load_timeframe_candles) se usan esas velas y no se memoiza.
+
+    Devuelve copia superficial; los datos para el overlay van en
+    "direction_inputs".
+    """
+    if candles is not None or snapshot_core_cache is None:
+        return _snapshot_core(symbol, context, candles)
+
+    key = (
+        symbol.upper(),
+        _last_closed_bar_ms(_FASTEST_TF),
+        context_lookbacks(context),
+        ANALYSIS_PARAMS_KEY,
+    )
+    core = snapshot_core_cache.get(key)
+    if core is None:
+        core = _snapshot_core(symbol, context, candles)
+        snapshot_core_cache.put(key, core)
+    return dict(core)
 
-    tfs = _choose_timeframes(symbol)
+
+def _snapshot_core(
+    symbol: str,
+    context: str | None = None,
+    candles: Dict[str, Candles] | None = None,
+) -> Dict[str, Any]:
+    tfs = list(candles) if candles is not None else _choose_timeframes(symbol)
     if not tfs:
         raise RuntimeError(
             f"No se pudieron obtener temporalidades válidas para {symbol}."
@@ -361,7 +705,9 @@ def get_multi_tf_snapshot(
 
     tf_results: List[Dict[str, Any]] = []
     for tf in tfs:
-        res = analyze_single_tf(symbol, tf)
+        res = analyze_single_tf(
+            symbol, tf, context, candles.get(tf) if candles is not None else None
+        )
         if res:
             tf_results.append(res)
 
@@ -404,25 +750,6 @@ def get_multi_tf_snapshot(
         else (bear_w / total_w if major_trend_code == "bear" else side_w / total_w)
     )
 
-    # ---------------------- Match ratio con la señal ----------------------
-    match_ratio = 50.0
-    if direction_hint:
-        prefer = "bull" if direction_hint == "long" else "bear"
-        for_tf = 0.0
-        against_tf = 0.0
-        for tf_res in tf_results:
-            w = weights[tf_res["tf"]]
-            code = tf_res["trend_code"]
-            if code == prefer:
-                for_tf += w
-            elif code in ("bull", "bear"):
-                against_tf += w
-        denom = for_tf + against_tf
-        if denom > 0:
-            match_ratio = 100.0 * for_tf / denom
-        else:
-            match_ratio = 50.0  # neutro si no hay definición clara
-
     # ---------------------- Divergencias agregadas (texto) ----------------------
     div_rsi_global = "Ninguna"
     div_macd_global = "Ninguna"
@@ -465,7 +792,7 @@ def get_multi_tf_snapshot(
     elif major_trend_code in ("bull", "bear") and trend_score >= 0.6:
         smart_bias_code = "continuation"
 
-    # ---------------------- Confianza global (igual que antes) ----------------------
+    # ---------------------- Confianza base (sin dirección) ----------------------
     if ANALYSIS_MODE == "aggressive":
         base_conf = 0.35
     elif ANALYSIS_MODE == "conservative":
@@ -473,18 +800,6 @@ def get_multi_tf_snapshot(
     else:  # balanced
         base_conf = 0.30
 
-    conf = base_conf + (match_ratio / 100.0) * 0.5 + (trend_score * 0.2)
-
-    if direction_hint:
-        if direction_hint == "long" and "Bajista" in (div_rsi_global + div_macd_global):
-            conf -= 0.15
-        if direction_hint == "short" and "Alcista" in (
-            div_rsi_global + div_macd_global
-        ):
-            conf -= 0.15
-
-    conf = max(0.0, min(conf, 1.0))
-
     # ============================================================
     # 🧮 NUEVO SISTEMA DE PUNTAJES + ESCALA A–D
     # ============================================================
@@ -494,7 +809,6 @@ def get_multi_tf_snapshot(
 
     # 2) Multi-TF Coherency Score (0–25 pts)
     aligned = sum(1 for r in tf_results if r["trend_code"] == major_trend_code)
-    total = len(tf_results) or 1
     if aligned >= 3:
         mtf_pts = 25.0
     elif aligned == 2:
@@ -505,28 +819,32 @@ def get_multi_tf_snapshot(
         mtf_pts = 0.0
 
     # 3) Divergence Score (20 / 10 / 5 / -10)
-    support_div = 0
-    contra_div = 0
+    # Cada divergencia pesa 0.5..1 según la fuerza de sus pivotes
+    support_div = 0.0
+    contra_div = 0.0
     for r in tf_results:
         local_trend = r["trend_code"]
-        for d in (r["div_rsi"], r["div_macd"]):
+        for key in ("div_rsi", "div_macd"):
+            d = r[key]
+            info = r.get(f"{key}_info") or {}
+            weight = 0.5 + 0.5 * float(info.get("strength", 1.0))
             if d == "alcista":
                 if local_trend == "bull":
-                    support_div += 1
+                    support_div += weight
                 elif local_trend == "bear":
-                    contra_div += 1
+                    contra_div += weight
             elif d == "bajista":
                 if local_trend == "bear":
-                    support_div += 1
+                    support_div += weight
                 elif local_trend == "bull":
-                    contra_div += 1
+                    contra_div += weight
 
     if support_div == 0 and contra_div == 0:
         div_pts = 10.0  # neutro
     elif contra_div > support_div:
         div_pts = -10.0  # divergencias contra estructura
     elif support_div > 0 and contra_div == 0:
-        div_pts = 20.0 if support_div >= 2 else 10.0
+        div_pts = 20.0 if support_div >= 1.5 else 10.0
     else:
         div_pts = 5.0  # mixtas
 
@@ -561,46 +879,84 @@ def get_multi_tf_snapshot(
     technical_score = trend_pts + mtf_pts + div_pts + vol_pts + sb_pts
     technical_score = max(0.0, min(technical_score, 100.0))
 
+    # ---------------------- Entradas del overlay ----------------------
+    # 1h/4h con divergencia contraria a cada dirección (una por TF)
+    htf_against = {"long": 0, "short": 0}
+    for r in tf_results:
+        if r["tf_label"] in ("1h", "4h"):
+            if r["div_rsi"] == "bajista" or r["div_macd"] == "bajista":
+                htf_against["long"] += 1
+            if r["div_rsi"] == "alcista" or r["div_macd"] == "alcista":
+                htf_against["short"] += 1
+
+    global_divs = div_rsi_global + div_macd_global
+
+    return {
+        "symbol": symbol,
+        "timeframes": tf_results,
+        "major_trend_label": major_trend_label,
+        "major_trend_code": major_trend_code,
+        "trend_score": float(trend_score),
+        "divergences": divergences,
+        "smart_bias_code": smart_bias_code,
+        "direction_inputs": {
+            "bull_w": float(bull_w),
+            "bear_w": float(bear_w),
+            "base_conf": float(base_conf),
+            "base_score": float(technical_score),
+            "div_against": {
+                "long": "Bajista" in global_divs,
+                "short": "Alcista" in global_divs,
+            },
+            "htf_against": htf_against,
+        },
+    }
+
+
+def apply_direction(core: Dict[str, Any], direction_hint: str | None) -> Dict[str, Any]:
+    """
+    Overlay por dirección sobre un núcleo: match_ratio, confianza,
+    penalización por divergencia contraria en 1h/4h y grade. No modifica
+    el núcleo; devuelve el snapshot completo (ver get_multi_tf_snapshot).
+    """
+    direction_hint = (direction_hint or "").lower()
+    if direction_hint not in ("long", "short"):
+        direction_hint = None
+
+    inputs = core["direction_inputs"]
+
+    # ---------------------- Match ratio con la señal ----------------------
+    match_ratio = 50.0
+    if direction_hint:
+        if direction_hint == "long":
+            for_tf, against_tf = inputs["bull_w"], inputs["bear_w"]
+        else:
+            for_tf, against_tf = inputs["bear_w"], inputs["bull_w"]
+        denom = for_tf + against_tf
+        if denom > 0:
+            match_ratio = 100.0 * for_tf / denom
+        else:
+            match_ratio = 50.0  # neutro si no hay definición clara
+
+    # ---------------------- Confianza global ----------------------
+    conf = (
+        inputs["base_conf"] + (match_ratio / 100.0) * 0.5 + (core["trend_score"] * 0.2)
+    )
+
+    if direction_hint and inputs["div_against"][direction_hint]:
+        conf -= 0.15
+
+    conf = max(0.0, min(conf, 1.0))
+
     # ============================================================
     # ⚠️ AJUSTE: Penalización por divergencia contraria en 1h/4h
     # ============================================================
+    against = inputs["htf_against"][direction_hint] if direction_hint else 0
+    penalty = 20.0 * against
+    conf_penalty = 0.25 * against
 
-    penalty = 0.0
-    conf_penalty = 0.0
-    warning_divergence = False
-
-    # Detectar divergencias contrarias fuertes (solo 1h y 4h)
-    for r in tf_results:
-        if r["tf_label"] in ("1h", "4h"):
-            # Divergencia alcista contra SHORT
-            if direction_hint == "short" and (
-                r["div_rsi"] == "alcista" or r["div_macd"] == "alcista"
-            ):
-                penalty += 20.0
-                conf_penalty += 0.25
-                warning_divergence = True
-
-            # Divergencia bajista contra LONG
-            if direction_hint == "long" and (
-                r["div_rsi"] == "bajista" or r["div_macd"] == "bajista"
-            ):
-                penalty += 20.0
-                conf_penalty += 0.25
-                warning_divergence = True
-
-            if warning_divergence:
-                result_warning = "⚠️ Divergencia fuerte contraria detectada (1h/4h)."
-            else:
-                result_warning = ""
-
-    # Aplicar penalización correctamente usando conf (variable real del motor)
-    technical_score = max(0.0, technical_score - penalty)
-
-    try:
-        conf = max(0.0, conf - conf_penalty)
-    except Exception:
-        # Si conf no existiera por algún flujo raro, usamos valor estable
-        conf = max(0.0, (locals().get("conf", 0.3)) - conf_penalty)
+    technical_score = max(0.0, inputs["base_score"] - penalty)
+    conf = max(0.0, conf - conf_penalty)
 
     if technical_score >= 85.0:
         grade = "A"
@@ -612,16 +968,46 @@ def get_multi_tf_snapshot(
         grade = "D"
 
     return {
-        "symbol": symbol,
+        "symbol": core["symbol"],
         "direction_hint": direction_hint,
-        "timeframes": tf_results,
-        "major_trend_label": major_trend_label,
-        "major_trend_code": major_trend_code,
-        "trend_score": float(trend_score),
+        "timeframes": core["timeframes"],
+        "major_trend_label": core["major_trend_label"],
+        "major_trend_code": core["major_trend_code"],
+        "trend_score": core["trend_score"],
         "match_ratio": float(match_ratio),
-        "divergences": divergences,
-        "smart_bias_code": smart_bias_code,
+        "divergences": core["divergences"],
+        "smart_bias_code": core["smart_bias_code"],
         "confidence": float(conf),
         "technical_score": float(technical_score),
         "grade": grade,
     }
+
+
+def get_multi_tf_snapshot(
+    symbol: str,
+    direction_hint: str | None = None,
+    context: str | None = None,
+    candles: Dict[str, Candles] | None = None,
+) -> Dict[str, Any]:
+    """
+    Analiza el símbolo en varias temporalidades y devuelve un snapshot
+    (núcleo memoizado + overlay de dirección).
+    Con `candles` ({tf: Candles}, ver load_timeframe_candles) se usan esas
+    temporalidades y velas en lugar de elegirlas y descargarlas:
+
+    {
+      "symbol": "EPICUSDT",
+      "direction_hint": "long" / "short" / None,
+      "timeframes": [...],
+      "major_trend_label": "...",
+      "major_trend_code": "bull/bear/sideways",
+      "trend_score": float 0–1,
+      "match_ratio": float 0–100,
+      "divergences": { "RSI": "...", "MACD": "..." },
+      "smart_bias_code": "...",
+      "confidence": float 0–1,
+      "technical_score": float 0–100,
+      "grade": "A" / "B" / "C" / "D",
+    }
+    """
+    return apply_direction(get_snapshot_core(symbol, context, candles), direction_hint)
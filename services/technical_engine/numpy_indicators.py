@@ -0,0 +1,419 @@
+"""
+numpy_indicators.py — EMA / MACD / RSI / ATR en NumPy puro
+----------------------------------------------------------
+Réplica numérica de pandas_ta (modo sin TA-Lib) para las cuatro series
+que usa motor_wrapper_core._calc_indicators, sin Series ni DataFrames
+intermedios:
+
+- ema:  semilla SMA en length-1 (presma) + ewm(span, adjust=False)
+- rsi:  medias de Wilder (rma, alpha=1/length) de subidas / bajadas
+- macd: EMA rápida − EMA lenta; señal = EMA de la línea MACD desde su
+        primer valor válido; histograma = MACD − señal
+- atr:  true range (rango H-L no nulo, |H-Cprev|, |Cprev-L|), semilla
+        SMA en length-1 + rma
+- bbands / mfi: ventanas deslizantes (SMA ± k·desv. típica ddof=1;
+        flujo monetario positivo / negativo sobre el precio típico)
+
+La recursión exponencial se resuelve por bloques: dentro de cada bloque
+de _BLOCK velas es un producto matricial (pesos α·(1−α)^k, siempre ≤ 1,
+sin desbordes) y entre bloques solo se arrastra el último valor. Con
+numba instalado se usa el bucle compilado de jit_kernels. Todas
+las funciones aceptan arrays (..., n): la última dimensión es el tiempo.
+compute_core_batch() calcula N símbolos de una pasada, con máscara para
+historias de distinta longitud.
+
+benchmark() compara tiempos y diferencias contra la ruta pandas_ta.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from services.technical_engine import jit_kernels
+
+_BLOCK = 64
+_EPS = sys.float_info.epsilon
+
+
+# ============================================================
+# 🧮 Recursión exponencial por bloques
+# ============================================================
+@lru_cache(maxsize=64)
+def _ewm_weights(alpha: float) -> Tuple[np.ndarray, np.ndarray]:
+    """(W, powers): W[j, k] = α·(1−α)^(j−k) si k ≤ j; powers[j] = (1−α)^(j+1)."""
+    decay = 1.0 - alpha
+    j = np.arange(_BLOCK)
+    lag = j[:, None] - j[None, :]
+    w = np.where(lag >= 0, alpha * decay ** np.maximum(lag, 0), 0.0)
+    powers = decay ** (j + 1)
+    w.flags.writeable = False
+    powers.flags.writeable = False
+    return w, powers
+
+
+def ewm_from(x: np.ndarray, alpha: float, y0) -> np.ndarray:
+    """
+    y_t = (1−α)·y_{t−1} + α·x_t para t = 0..n−1, partiendo de y_{−1} = y0.
+    x: (..., n); y0: escalar o (...). Con numba (jit_kernels) es un bucle
+    compilado; si no, bloques matriciales.
+    """
+    if jit_kernels.JIT_ENABLED and np.shape(x)[-1]:
+        return jit_kernels.ewm_rows(x, alpha, y0)
+    return _ewm_from_numpy(x, alpha, y0)
+
+
+def _ewm_from_numpy(x: np.ndarray, alpha: float, y0) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-1]
+    lead = x.shape[:-1]
+    if n == 0:
+        return np.empty_like(x)
+
+    w, powers = _ewm_weights(float(alpha))
+    nb = -(-n // _BLOCK)
+    pad = nb * _BLOCK - n
+    if pad:
+        x = np.concatenate([x, np.zeros(lead + (pad,))], axis=-1)
+
+    blocks = x.reshape(lead + (nb, _BLOCK))
+    out = blocks @ w.T
+
+    prev = np.broadcast_to(np.asarray(y0, dtype=np.float64), lead)
+    for b in range(nb):
+        out[..., b, :] += prev[..., None] * powers
+        prev = out[..., b, -1]
+
+    return out.reshape(lead + (nb * _BLOCK,))[..., :n]
+
+
+def _seeded(values: np.ndarray, alpha: float, length: int) -> np.ndarray:
+    """Semilla SMA(length) en length−1 y recursión exponencial después."""
+    out = np.full(values.shape, np.nan)
+    n = values.shape[-1]
+    if n < length:
+        return out
+    seed = values[..., :length].mean(axis=-1)
+    out[..., length - 1] = seed
+    out[..., length:] = ewm_from(values[..., length:], alpha, seed)
+    return out
+
+
+# ============================================================
+# 📈 Indicadores
+# ============================================================
+def ema(close: np.ndarray, length: int = 10) -> np.ndarray:
+    """EMA con semilla SMA (pandas_ta.ema, presma=True)."""
+    close = np.asarray(close, dtype=np.float64)
+    return _seeded(close, 2.0 / (length + 1), length)
+
+
+def wilder_averages(
+    close: np.ndarray, length: int = 14
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Medias de Wilder de subidas / bajadas (NaN en el índice 0).
+    rma sin min_periods: arranca en el primer diff (índice 1).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    up_avg = np.full(close.shape, np.nan)
+    down_avg = np.full(close.shape, np.nan)
+    if close.shape[-1] < 2:
+        return up_avg, down_avg
+
+    diff = np.diff(close, axis=-1)
+    up = np.maximum(diff, 0.0)
+    down = -np.minimum(diff, 0.0)
+
+    alpha = 1.0 / length
+    up_avg[..., 1] = up[..., 0]
+    down_avg[..., 1] = down[..., 0]
+    up_avg[..., 2:] = ewm_from(up[..., 1:], alpha, up[..., 0])
+    down_avg[..., 2:] = ewm_from(down[..., 1:], alpha, down[..., 0])
+    return up_avg, down_avg
+
+
+def rsi(close: np.ndarray, length: int = 14) -> np.ndarray:
+    """RSI con medias de Wilder (pandas_ta.rsi, mamode='rma')."""
+    close = np.asarray(close, dtype=np.float64)
+    if close.shape[-1] < length + 1:
+        return np.full(close.shape, np.nan)
+
+    up_avg, down_avg = wilder_averages(close, length)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100.0 * up_avg / (up_avg + down_avg)
+
+
+def macd(
+    close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(macd, histograma, señal) — mismo orden de columnas que pandas_ta.macd."""
+    close = np.asarray(close, dtype=np.float64)
+    if slow < fast:
+        fast, slow = slow, fast
+
+    nan = np.full(close.shape, np.nan)
+    if close.shape[-1] < slow + signal - 1:
+        return nan, nan.copy(), nan.copy()
+
+    line = ema(close, fast) - ema(close, slow)
+    first = slow - 1  # primer valor válido de la línea MACD
+
+    sig = np.full(close.shape, np.nan)
+    sig[..., first:] = ema(line[..., first:], signal)
+    return line, line - sig, sig
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+
+    hl = high - low
+    hl = np.where(hl == 0, hl + _EPS, hl)
+
+    tr = np.abs(hl)
+    prev_close = close[..., :-1]
+    tr[..., 1:] = np.maximum.reduce(
+        [
+            tr[..., 1:],
+            np.abs(high[..., 1:] - prev_close),
+            np.abs(prev_close - low[..., 1:]),
+        ]
+    )
+    return tr
+
+
+def atr(
+    high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int = 14
+) -> np.ndarray:
+    """ATR de Wilder con semilla SMA (pandas_ta.atr, mamode='rma')."""
+    close = np.asarray(close, dtype=np.float64)
+    if close.shape[-1] < length + 1:
+        return np.full(close.shape, np.nan)
+    return _seeded(true_range(high, low, close), 1.0 / length, length)
+
+
+def sma(x: np.ndarray, length: int) -> np.ndarray:
+    """Media simple de `length` velas (NaN hasta length−1)."""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] >= length:
+        out[..., length - 1 :] = sliding_window_view(x, length, axis=-1).mean(-1)
+    return out
+
+
+def bbands(
+    close: np.ndarray, length: int = 20, std: float = 2.0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(inferior, media, superior) — pandas_ta.bbands sin TA-Lib (ddof=1)."""
+    close = np.asarray(close, dtype=np.float64)
+    dev = np.full(close.shape, np.nan)
+    if close.shape[-1] >= length:
+        win = sliding_window_view(close, length, axis=-1)
+        dev[..., length - 1 :] = win.std(axis=-1, ddof=1)
+    mid = sma(close, length)
+    return mid - std * dev, mid, mid + std * dev
+
+
+def mfi(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: np.ndarray,
+    length: int = 14,
+) -> np.ndarray:
+    """Money Flow Index (pandas_ta.mfi sin TA-Lib)."""
+    close = np.asarray(close, dtype=np.float64)
+    out = np.full(close.shape, np.nan)
+    if close.shape[-1] < length + 1:
+        return out
+
+    tp = (np.asarray(high) + np.asarray(low) + close) / 3.0
+    flow = tp * np.asarray(volume, dtype=np.float64)
+    up = np.zeros(close.shape)
+    up[..., 1:] = tp[..., 1:] > tp[..., :-1]
+    signed = np.where(up > 0, flow, -flow)
+
+    pos = sliding_window_view(np.maximum(signed, 0.0), length, axis=-1).sum(-1)
+    neg = sliding_window_view(np.maximum(-signed, 0.0), length, axis=-1).sum(-1)
+    out[..., length - 1 :] = 100.0 * pos / (pos + neg + _EPS)
+    out[..., :length] = np.nan
+    return out
+
+
+# ============================================================
+# 🧩 Conjunto del motor
+# ============================================================
+def compute_core(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    ema_short: int,
+    ema_long: int,
+    macd_fast: int,
+    macd_slow: int,
+    macd_signal: int,
+    rsi_length: int = 14,
+    atr_length: int = 14,
+) -> Dict[str, np.ndarray]:
+    """Las series de _calc_indicators en un solo paso, como arrays."""
+    line, hist, sig = macd(close, macd_fast, macd_slow, macd_signal)
+    return {
+        "ema_short": ema(close, ema_short),
+        "ema_long": ema(close, ema_long),
+        "macd": line,
+        "macd_histogram": hist,
+        "macd_signal_line": sig,
+        "rsi": rsi(close, rsi_length),
+        "atr": atr(high, low, close, atr_length),
+    }
+
+
+# ============================================================
+# 🧱 Lote de símbolos (N, velas)
+# ============================================================
+def trailing_lengths(valid: np.ndarray) -> np.ndarray:
+    """Longitud del tramo válido final de cada fila de una máscara (N, T)."""
+    invalid = ~valid[:, ::-1]
+    return np.where(invalid.any(axis=1), invalid.argmax(axis=1), valid.shape[1])
+
+
+def compute_core_batch(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    ema_short: int,
+    ema_long: int,
+    macd_fast: int,
+    macd_slow: int,
+    macd_signal: int,
+    rsi_length: int = 14,
+    atr_length: int = 14,
+    valid: np.ndarray | None = None,
+) -> Dict[str, np.ndarray]:
+    """
+    compute_core para N series a la vez, arrays (N, T) alineados a la
+    derecha (última columna = última vela de cada fila).
+
+    Historias desiguales: lo que queda a la izquierda del tramo válido
+    final (NaN o valid=False) se enmascara. Internamente cada fila se
+    alinea a la izquierda para que todas las semillas caigan en la misma
+    columna; el relleno queda DESPUÉS de los datos y, como los
+    indicadores son causales, no contamina ningún valor válido. Las filas
+    más cortas que el mínimo de un indicador salen enteras en NaN, igual
+    que en compute_core (el relleno no cuenta como historia).
+    """
+    high, low, close = (
+        np.atleast_2d(np.asarray(a, dtype=np.float64)) for a in (high, low, close)
+    )
+    n_rows, n_cols = close.shape
+    if valid is None:
+        valid = np.isfinite(high) & np.isfinite(low) & np.isfinite(close)
+
+    offset = n_cols - trailing_lengths(valid)
+    cols = np.arange(n_cols)
+
+    left = np.minimum(cols[None, :] + offset[:, None], n_cols - 1)
+    out = compute_core(
+        np.take_along_axis(high, left, axis=1),
+        np.take_along_axis(low, left, axis=1),
+        np.take_along_axis(close, left, axis=1),
+        ema_short,
+        ema_long,
+        macd_fast,
+        macd_slow,
+        macd_signal,
+        rsi_length=rsi_length,
+        atr_length=atr_length,
+    )
+
+    # Velas mínimas por indicador (los `if shape[-1] < ...` de cada uno)
+    macd_bars = max(macd_fast, macd_slow) + macd_signal - 1
+    min_bars = {
+        "macd": macd_bars,
+        "macd_histogram": macd_bars,
+        "macd_signal_line": macd_bars,
+        "rsi": rsi_length + 1,
+        "atr": atr_length + 1,
+    }
+    lengths = n_cols - offset
+
+    src = cols[None, :] - offset[:, None]
+    keep = src >= 0
+    src = np.clip(src, 0, n_cols - 1)
+    return {
+        name: np.where(
+            keep & (lengths >= min_bars.get(name, 0))[:, None],
+            np.take_along_axis(values, src, axis=1),
+            np.nan,
+        )
+        for name, values in out.items()
+    }
+
+
+# ============================================================
+# ⏱️ Benchmark / paridad contra pandas_ta
+# ============================================================
+def benchmark(bars: int = 260, runs: int = 200, seed: int = 7) -> dict:
+    """
+    Mide _calc_indicators con ambos motores sobre velas sintéticas y
+    devuelve tiempos medios (ms) y la diferencia máxima por columna.
+    """
+    import pandas as pd
+
+    from services.technical_engine import motor_wrapper_core as core
+
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    spread = np.abs(rng.normal(0, 0.004, bars)) * close
+    df = pd.DataFrame(
+        {
+            "open": close,
+            "high": close + spread,
+            "low": close - spread,
+            "close": close,
+            "volume": rng.uniform(1, 10, bars),
+        },
+        index=pd.date_range("2024-01-01", periods=bars, freq="15min"),
+    )
+
+    result = {"bars": bars, "runs": runs}
+    frames = {}
+    for engine, fn in (
+        ("numpy", core._calc_indicators_numpy),
+        ("pandas_ta", core._calc_indicators_pandas_ta),
+    ):
+        try:
+            frames[engine] = fn(df.copy())
+        except Exception as e:
+            result[engine] = f"no disponible: {e}"
+            continue
+        start = time.perf_counter()
+        for _ in range(runs):
+            fn(df.copy())
+        result[f"{engine}_ms"] = (time.perf_counter() - start) / runs * 1000
+
+    if len(frames) == 2:
+        diffs = {}
+        for col in core.INDICATOR_COLUMNS:
+            a = frames["numpy"][col].to_numpy(dtype=float)
+            b = frames["pandas_ta"][col].to_numpy(dtype=float)
+            both = np.isfinite(a) & np.isfinite(b)
+            diffs[col] = float(np.abs(a[both] - b[both]).max()) if both.any() else 0.0
+            diffs[f"{col}_nan_mismatch"] = int((np.isnan(a) != np.isnan(b)).sum())
+        result["max_abs_diff"] = diffs
+        result["speedup"] = result["pandas_ta_ms"] / result["numpy_ms"]
+
+    return result
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(benchmark(), indent=2, default=str))
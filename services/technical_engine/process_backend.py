@@ -0,0 +1,168 @@
+"""
+process_backend.py — Snapshots multi-TF en procesos (memoria compartida)
+------------------------------------------------------------------------
+Con ANALYSIS_POOL_MODE=process el cálculo de indicadores y puntuación
+corre en workers (spawn) y usa todos los núcleos, sin el GIL.
+
+Reparto del trabajo:
+
+- Proceso principal: precarga async de velas, elección de temporalidades
+  (load_timeframe_candles) y copia de las ventanas a UN bloque
+  multiprocessing.shared_memory por análisis. No se picklea ningún
+  DataFrame: al worker solo viajan el nombre del bloque y el layout.
+- Worker: se adjunta al bloque, copia las velas, calcula el núcleo del snapshot (get_snapshot_core)
+  sin red y devuelve un registro compacto (sin series, ver
+  snapshot_records.for_output). El overlay de dirección se aplica en el
+  proceso principal (apply_direction).
+- El bloque se libera cuando el trabajo termina de verdad en el
+  executor (on_done del pool), no cuando deja de esperarse: un timeout
+  no lo borra bajo un worker que aún no se ha adjuntado.
+- Los workers no persisten nada (config.IS_WORKER_PROCESS): sin
+  candle_store ni checkpoints de indicator_states.
+
+Layout del bloque, por temporalidad y contiguo:
+  ts int64[n] | OHLCV dtype[5, n]   (dtype = el de candle_cache)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from services.bybit_service.candles import Candles
+from services.common.worker_pool import WorkerPool
+from services.technical_engine.motor_wrapper_core import (
+    analysis_bars,
+    get_snapshot_core,
+    load_timeframe_candles,
+    prefetch_timeframes,
+)
+from services.technical_engine.snapshot_records import for_output
+
+logger = logging.getLogger("process_backend")
+
+# (tf, n, dtype, offset ts, offset OHLCV)
+Layout = List[Tuple[str, int, str, int, int]]
+
+
+# ============================================================
+# 📦 Velas ↔ memoria compartida
+# ============================================================
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def pack_candles(
+    frames: Dict[str, Candles],
+) -> Tuple[shared_memory.SharedMemory, Layout]:
+    """Copia {tf: Candles} a un bloque compartido nuevo. El llamador lo libera."""
+    layout: Layout = []
+    offset = 0
+    for tf, candles in frames.items():
+        n = len(candles)
+        dtype = np.dtype(candles.dtype)
+        ts_off = offset
+        block_off = _aligned(ts_off + 8 * n)
+        offset = _aligned(block_off + 5 * n * dtype.itemsize)
+        layout.append((tf, n, dtype.str, ts_off, block_off))
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 8))
+    try:
+        for (tf, n, dtype, ts_off, block_off) in layout:
+            candles = frames[tf]
+            np.ndarray((n,), np.int64, shm.buf, ts_off)[:] = candles.ts
+            block = np.ndarray((5, n), np.dtype(dtype), shm.buf, block_off)
+            block[0] = candles.open
+            block[1] = candles.high
+            block[2] = candles.low
+            block[3] = candles.close
+            block[4] = candles.volume
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+    return shm, layout
+
+
+def unpack_candles(buf, layout: Layout) -> Dict[str, Candles]:
+    """{tf: Candles} copiados del bloque (independientes de su vida)."""
+    frames: Dict[str, Candles] = {}
+    for (tf, n, dtype, ts_off, block_off) in layout:
+        ts = np.array(np.ndarray((n,), np.int64, buf, ts_off))
+        block = np.array(np.ndarray((5, n), np.dtype(dtype), buf, block_off))
+        frames[tf] = Candles(ts, block)
+    return frames
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Adjunta sin registrar el bloque en el resource_tracker del worker."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13: attach también registra el bloque
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+# ============================================================
+# 👷 Tarea del worker
+# ============================================================
+def snapshot_core_task(
+    shm_name: str, layout: Layout, symbol: str, context: str
+) -> dict:
+    """Se ejecuta en el worker: velas del bloque → núcleo compacto."""
+    shm = _attach(shm_name)
+    try:
+        frames = unpack_candles(shm.buf, layout)
+    finally:
+        shm.close()
+
+    core = get_snapshot_core(symbol, context, candles=frames)
+    return for_output(core, include_series=False)
+
+
+# ============================================================
+# 🔌 API (proceso principal)
+# ============================================================
+async def process_snapshot_core(
+    symbol: str, context: str, pool: WorkerPool, timeout: float | None = None
+) -> dict:
+    """
+    Núcleo del snapshot calculado en un worker de `pool` (mode="process").
+    Si no hay velas de ninguna temporalidad se lanza RuntimeError, como
+    el motor.
+    """
+    try:
+        await prefetch_timeframes(symbol, analysis_bars(context))
+    except Exception as e:
+        logger.warning(f"⚠️ Precarga async falló para {symbol}: {e}")
+
+    # Tras la precarga es lectura de caché; el índice de TF puede sondear
+    frames = await asyncio.to_thread(load_timeframe_candles, symbol, context)
+    if not frames:
+        raise RuntimeError(
+            f"No se pudieron obtener temporalidades válidas para {symbol}."
+        )
+
+    shm, layout = pack_candles(frames)
+
+    def release() -> None:
+        shm.close()
+        # Con spawn el worker comparte nuestro resource_tracker: su
+        # unregister (ver _attach) también borró nuestro registro
+        resource_tracker.register(shm._name, "shared_memory")
+        shm.unlink()
+
+    return await pool.run(
+        snapshot_core_task,
+        shm.name,
+        layout,
+        symbol,
+        context,
+        timeout=timeout,
+        on_done=release,
+    )
@@ -0,0 +1,104 @@
+"""
+result_cache.py — Caché LRU de resultados con tope de memoria
+-------------------------------------------------------------
+Memo genérico para resultados de análisis (dicts con series):
+
+- Expulsión LRU por número de entradas y por bytes aproximados.
+- El tamaño se estima sin serializar: arrays por nbytes, listas por
+  número de elementos, dicts recorriendo sus valores.
+- stats(): entradas, bytes, aciertos / fallos / expulsiones.
+
+La clave la decide el llamador (p. ej. motor_wrapper_core usa
+(symbol, tf, última vela cerrada, hash de parámetros)).
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+import numpy as np
+
+
+def approx_nbytes(value: Any) -> int:
+    """Tamaño aproximado en memoria de un resultado (dict / list / array)."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            approx_nbytes(v) + 64 for v in value.values()
+        )
+    if isinstance(value, (list, tuple)):
+        # float de Python (24 B) + puntero (8 B) por elemento
+        return sys.getsizeof(value) + 24 * len(value)
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    return 32
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+
+        self._data: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int | None = None) -> None:
+        size = approx_nbytes(value) if nbytes is None else int(nbytes)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+
+            while self._data and (
+                len(self._data) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, predicate=None) -> int:
+        """Borra todo, o solo las claves con predicate(key) True."""
+        with self._lock:
+            keys = [k for k in self._data if predicate is None or predicate(k)]
+            for k in keys:
+                self._bytes -= self._data.pop(k)[1]
+            return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -1,61 +1,375 @@
 """
 smart_divergences.py
-Detección simplificada de divergencias RSI / MACD para uso en TechnicalEngine.
+--------------------
+Detector de divergencias RSI / MACD en streaming por (symbol, tf).
+
+Para cada (symbol, tf) se guarda un estado pequeño y acotado:
+
+- Ring de las últimas 2·width+1 velas cerradas (close, RSI, histograma
+  MACD): al entrar una vela se confirma, o no, el pivote del centro.
+- Los últimos `keep` swings confirmados de máximos y de mínimos, con el
+  valor del precio y el extremo de cada indicador alrededor del pivote.
+- Escala de cada indicador (máximo |valor| con decaimiento) para que la
+  tolerancia valga igual para RSI y para el histograma.
+
+Cada vela cuesta O(width + keep): tiempo constante. Al confirmarse un
+swing se compara con los anteriores y se detectan divergencias:
+
+- Regular bajista: precio máximo más alto, indicador máximo más bajo.
+- Oculta bajista:  precio máximo más bajo, indicador máximo más alto.
+- Regular alcista: precio mínimo más bajo, indicador mínimo más alto.
+- Oculta alcista:  precio mínimo más alto, indicador mínimo más bajo.
+
+La divergencia queda activa `max_age` velas desde el segundo pivote.
+
+API:
+  detect_smart_divergences(df, symbol=None, tf=None) → {
+      "divergences": {"rsi": {...}, "macd": {...}},
+      "overall_bias": "bullish" | "bearish" | "neutral",
+      "confidence": 0..1,
+  }
+  detect_divergences(rsi, macd_hist, close) → {"RSI": ..., "MACD": ...}
+  (firma antigua, solo divergencias regulares)
 """
 
+from __future__ import annotations
+
 import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, NamedTuple, Optional
+
 import numpy as np
+import pandas as pd
+
+from services.bybit_service.candle_cache import timeframe_to_seconds
 
 logger = logging.getLogger("divergences")
 
+INDICATORS = ("rsi", "macd")
 
-def _detect_rsi_divergence(rsi_series: list, price_series: list) -> str:
-    """
-    Detecta divergencia alcista o bajista básica usando últimos 3 pivotes.
-    """
+_BIAS = {
+    "bullish": 1.0,
+    "hidden_bullish": 1.0,
+    "bearish": -1.0,
+    "hidden_bearish": -1.0,
+}
+_LEGACY = {"bullish": "alcista", "bearish": "bajista"}
 
-    if len(rsi_series) < 3 or len(price_series) < 3:
-        return "ninguna"
 
-    r1, r2 = rsi_series[-3], rsi_series[-1]
-    p1, p2 = price_series[-3], price_series[-1]
+def _none() -> dict:
+    return {
+        "type": "none",
+        "strength": 0.0,
+        "strength_label": "none",
+        "pivots_ts": [],
+        "bars_ago": None,
+    }
 
-    # Divergencia alcista: precio hace mínimo más bajo, RSI hace mínimo más alto
-    if p2 < p1 and r2 > r1:
-        return "alcista"
 
-    # Divergencia bajista: precio hace máximo más alto, RSI hace máximo más bajo
-    if p2 > p1 and r2 < r1:
-        return "bajista"
+def _strength_label(strength: float) -> str:
+    if strength >= 0.7:
+        return "strong"
+    if strength >= 0.4:
+        return "medium"
+    return "weak"
 
-    return "ninguna"
 
+class Swing(NamedTuple):
+    bar: int
+    ts: int
+    price: float
+    rsi: float
+    macd: float
 
-def _detect_macd_divergence(macd_series: list, price_series: list) -> str:
-    """
-    Divergencia básica MACD vs precio.
+
+# ============================================================
+# 🧠 Estado de una (symbol, tf)
+# ============================================================
+class DivergenceState:
+    def __init__(
+        self,
+        width: int = 3,
+        keep: int = 4,
+        max_age: int = 10,
+        max_span: int = 80,
+        tolerance: float = 0.01,
+        ind_tolerance: float = 0.05,
+    ):
+        self.width = int(width)
+        self.max_age = int(max_age)
+        self.max_span = int(max_span)
+        self.tolerance = float(tolerance)
+        self.ind_tolerance = float(ind_tolerance)
+
+        self._ring: deque = deque(maxlen=2 * self.width + 1)
+        self.highs: deque = deque(maxlen=keep)
+        self.lows: deque = deque(maxlen=keep)
+        self.scale = {name: 0.0 for name in INDICATORS}
+        self.active: Dict[str, Optional[dict]] = {name: None for name in INDICATORS}
+
+        self.bars = 0
+        self.last_ts: Optional[int] = None
+
+    # --------------------------------------------------------
+    # Avance (una vela cerrada)
+    # --------------------------------------------------------
+    def update(self, ts: int, close: float, rsi: float, macd: float) -> None:
+        self.bars += 1
+        self.last_ts = int(ts)
+        self._ring.append((self.bars, int(ts), float(close), float(rsi), float(macd)))
+
+        decay = 1.0 - 1.0 / self.max_span
+        for name, value in (("rsi", rsi), ("macd", macd)):
+            if np.isfinite(value):
+                self.scale[name] = max(abs(value), self.scale[name] * decay)
+
+        if len(self._ring) < self._ring.maxlen:
+            return
+
+        w = self.width
+        ring = self._ring
+        center = ring[w]
+        closes = [b[2] for b in ring]
+        left, right = closes[:w], closes[w + 1 :]
+
+        price = center[2]
+        if price > max(left) and price >= max(right):
+            swing = self._swing(center, max)
+            self._evaluate(self.highs, swing, kind="high")
+            self.highs.append(swing)
+        elif price < min(left) and price <= min(right):
+            swing = self._swing(center, min)
+            self._evaluate(self.lows, swing, kind="low")
+            self.lows.append(swing)
+
+    def _swing(self, center, pick) -> Swing:
+        """Swing en el centro del ring, con el extremo de cada indicador."""
+        rsi = [b[3] for b in self._ring if np.isfinite(b[3])]
+        macd = [b[4] for b in self._ring if np.isfinite(b[4])]
+        return Swing(
+            center[0],
+            center[1],
+            center[2],
+            pick(rsi) if rsi else float("nan"),
+            pick(macd) if macd else float("nan"),
+        )
+
+    def _evaluate(self, previous: deque, p2: Swing, kind: str) -> None:
+        """Compara el swing nuevo con los anteriores (a lo sumo `keep`)."""
+        sign = 1.0 if kind == "high" else -1.0
+        for name in INDICATORS:
+            scale = self.scale[name] or 1.0
+            best = None
+            dominant = float("-inf")  # extremo de los swings intermedios
+            for p1 in reversed(previous):
+                if p2.bar - p1.bar > self.max_span:
+                    break
+                swing_price = sign * p1.price
+                if swing_price <= dominant:
+                    continue
+                dominant = swing_price
+
+                ind1, ind2 = getattr(p1, name), getattr(p2, name)
+                if not (np.isfinite(ind1) and np.isfinite(ind2)):
+                    continue
+
+                price_move = (p2.price - p1.price) / p1.price
+                ind_move = (ind2 - ind1) / scale
+                if (
+                    sign * price_move > self.tolerance
+                    and -sign * ind_move > self.ind_tolerance
+                ):
+                    div = "bearish" if kind == "high" else "bullish"
+                elif (
+                    -sign * price_move > self.tolerance
+                    and sign * ind_move > self.ind_tolerance
+                ):
+                    div = "hidden_bearish" if kind == "high" else "hidden_bullish"
+                else:
+                    continue
+
+                strength = 0.5 * (
+                    min(abs(price_move) / (5 * self.tolerance), 1.0)
+                    + min(abs(ind_move) / (10 * self.ind_tolerance), 1.0)
+                )
+                if best is None or strength > best[0]:
+                    best = (strength, div, p1)
+
+            if best is not None:
+                strength, div, p1 = best
+                self.active[name] = {
+                    "type": div,
+                    "strength": round(strength, 3),
+                    "pivots_ts": [p1.ts, p2.ts],
+                    "confirmed_bar": self.bars,
+                }
+
+    # --------------------------------------------------------
+    # Lectura
+    # --------------------------------------------------------
+    def snapshot(self) -> dict:
+        divergences = {}
+        bias = 0.0
+        for name in INDICATORS:
+            div = self.active[name]
+            if div is None or self.bars - div["confirmed_bar"] > self.max_age:
+                divergences[name] = _none()
+                continue
+            divergences[name] = {
+                "type": div["type"],
+                "strength": div["strength"],
+                "strength_label": _strength_label(div["strength"]),
+                "pivots_ts": list(div["pivots_ts"]),
+                "bars_ago": self.bars - div["confirmed_bar"],
+            }
+            bias += _BIAS[div["type"]] * div["strength"]
+
+        if bias > 0.2:
+            overall = "bullish"
+        elif bias < -0.2:
+            overall = "bearish"
+        else:
+            overall = "neutral"
+
+        return {
+            "divergences": divergences,
+            "overall_bias": overall,
+            "confidence": round(min(1.0, abs(bias) / len(INDICATORS)), 3),
+        }
+
+
+# ============================================================
+# 🗂️ Estados por (symbol, tf)
+# ============================================================
+class SmartDivergenceTracker:
+    def __init__(self, max_keys: int = 1024, **state_kwargs):
+        self.max_keys = int(max_keys)
+        self.state_kwargs = state_kwargs
+        self._states: "OrderedDict[tuple, DivergenceState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.replays = 0
+        self.steps = 0
+
+    def feed(
+        self,
+        symbol: str,
+        tf: str,
+        ts: np.ndarray,
+        close: np.ndarray,
+        rsi: np.ndarray,
+        macd: np.ndarray,
+    ) -> dict:
+        """
+        Avanza el estado con las velas cerradas de la ventana que aún no
+        ha visto. Si la ventana no enlaza con el estado, se reconstruye.
+        """
+        key = (symbol.upper(), str(tf))
+        n = len(ts)
+        with self._lock:
+            state = self._states.get(key)
+            start = None
+            if state is not None and state.last_ts is not None and n:
+                i = int(np.searchsorted(ts, state.last_ts))
+                if i < n and int(ts[i]) == state.last_ts:
+                    start = i + 1
+                elif state.last_ts > int(ts[-1]):
+                    # Ventana más vieja que el estado: no retroceder
+                    self._states.move_to_end(key)
+                    return state.snapshot()
+
+            if start is None:
+                state = DivergenceState(**self.state_kwargs)
+                start = 0
+                self.replays += 1
+
+            for j in range(start, n):
+                state.update(int(ts[j]), close[j], rsi[j], macd[j])
+            self.steps += n - start
+
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+            return state.snapshot()
+
+    def invalidate(self, symbol: str | None = None) -> None:
+        with self._lock:
+            if symbol is None:
+                self._states.clear()
+                return
+            for key in [k for k in self._states if k[0] == symbol.upper()]:
+                del self._states[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "states": len(self._states),
+                "replays": self.replays,
+                "steps": self.steps,
+            }
+
+
+smart_divergence_tracker = SmartDivergenceTracker()
+
+
+# ============================================================
+# 🔌 API
+# ============================================================
+def _closed_rows(df: pd.DataFrame, tf: str | None, now_ms: int | None) -> int:
+    """Velas cerradas de df (la última puede estar en formación)."""
+    period = timeframe_to_seconds(tf) if tf else None
+    if not period or not isinstance(df.index, pd.DatetimeIndex) or df.empty:
+        return len(df)
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    last_open = int(df.index[-1].value // 1_000_000)
+    return len(df) if last_open + period * 1000 <= now_ms else len(df) - 1
+
+
+def detect_smart_divergences(
+    df: pd.DataFrame,
+    symbol: str | None = None,
+    tf: str | None = None,
+    now_ms: int | None = None,
+) -> dict:
     """
+    Divergencias regulares y ocultas (RSI / histograma MACD) de df.
 
-    if len(macd_series) < 3 or len(price_series) < 3:
-        return "ninguna"
+    Con symbol y tf se usa el estado incremental (solo velas nuevas);
+    sin ellos se recorre df con un estado desechable.
+    Usa "macd_histogram" si existe y si no "macd_hist".
+    """
+    try:
+        if df is None or df.empty or "rsi" not in df:
+            return DivergenceState().snapshot()
+        macd_col = "macd_histogram" if "macd_histogram" in df else "macd_hist"
+        if macd_col not in df:
+            return DivergenceState().snapshot()
 
-    m1, m2 = macd_series[-3], macd_series[-1]
-    p1, p2 = price_series[-3], price_series[-1]
+        closed = _closed_rows(df, tf, now_ms)
+        close = df["close"].to_numpy(dtype=float)[:closed]
+        rsi = df["rsi"].to_numpy(dtype=float)[:closed]
+        macd = df[macd_col].to_numpy(dtype=float)[:closed]
 
-    # Alcista: precio baja, MACD sube
-    if p2 < p1 and m2 > m1:
-        return "alcista"
+        if symbol and tf and isinstance(df.index, pd.DatetimeIndex):
+            ts = df.index.as_unit("ms").asi8[:closed]
+            return smart_divergence_tracker.feed(symbol, tf, ts, close, rsi, macd)
 
-    # Bajista: precio sube, MACD baja
-    if p2 > p1 and m2 < m1:
-        return "bajista"
+        state = DivergenceState()
+        for j in range(closed):
+            state.update(j, close[j], rsi[j], macd[j])
+        return state.snapshot()
 
-    return "ninguna"
+    except Exception as e:
+        logger.exception(f"❌ Error detectando divergencias: {e}")
+        return DivergenceState().snapshot()
 
 
 def detect_divergences(rsi_series, macd_hist_series, close_series) -> dict:
     """
-    Función principal usada por TechnicalEngine.
+    Firma antigua usada por TechnicalEngine.
 
     Devuelve:
     {
@@ -63,14 +377,20 @@ def detect_divergences(rsi_series, macd_hist_series, close_series) -> dict:
         "MACD": "alcista/bajista/ninguna"
     }
     """
-
     try:
-        rsi_div = _detect_rsi_divergence(rsi_series, close_series)
-        macd_div = _detect_macd_divergence(macd_hist_series, close_series)
+        n = min(len(rsi_series), len(macd_hist_series), len(close_series))
+        rsi = np.asarray(rsi_series, dtype=float)[-n:] if n else []
+        macd = np.asarray(macd_hist_series, dtype=float)[-n:] if n else []
+        close = np.asarray(close_series, dtype=float)[-n:] if n else []
+
+        state = DivergenceState()
+        for j in range(n):
+            state.update(j, close[j], rsi[j], macd[j])
+        divs = state.snapshot()["divergences"]
 
         return {
-            "RSI": rsi_div,
-            "MACD": macd_div,
+            "RSI": _LEGACY.get(divs["rsi"]["type"], "ninguna"),
+            "MACD": _LEGACY.get(divs["macd"]["type"], "ninguna"),
         }
 
     except Exception as e:
@@ -0,0 +1,71 @@
+"""
+snapshot_records.py — Series de los registros por timeframe
+-----------------------------------------------------------
+analyze_single_tf ya no convierte rsi / macd_hist / close en listas de
+~260 floats: cada registro lleva vistas NumPy de solo-lectura sobre los
+arrays ya calculados (sin copia). Se materializan como lista solo cuando
+alguien lo pide (series_list) o al serializar con include_series=True.
+
+Para logs y analysis_logs, for_output() devuelve una copia serializable
+del análisis SIN las series (ANALYSIS_SERIES_IN_LOGS=false, por
+defecto) o con ellas convertidas a listas.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, List
+
+import numpy as np
+
+from config import ANALYSIS_SERIES_IN_LOGS
+
+SERIES_KEYS = frozenset({"rsi_series", "macd_hist_series", "close_series"})
+
+
+def series_view(values) -> np.ndarray:
+    """Vista solo-lectura desde el primer valor válido (NaN de calentamiento fuera)."""
+    arr = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(arr)
+    start = int(finite.argmax()) if finite.any() else len(arr)
+    view = arr[start:]
+    view.flags.writeable = False
+    return view
+
+
+def series_list(record: dict, key: str) -> List[float]:
+    """Materializa una serie de un registro como lista de floats."""
+    values = record.get(key)
+    if values is None:
+        return []
+    if isinstance(values, np.ndarray):
+        return values.tolist()
+    return list(values)
+
+
+def for_output(obj: Any, include_series: bool | None = None) -> Any:
+    """
+    Copia serializable (JSON) de un análisis: dicts / listas recorridos,
+    escalares NumPy a float / int y las series omitidas o materializadas.
+    """
+    if include_series is None:
+        include_series = ANALYSIS_SERIES_IN_LOGS
+
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            if k in SERIES_KEYS and not include_series:
+                continue
+            out[k] = for_output(v, include_series)
+        return out
+    if isinstance(obj, (list, tuple)):
+        return [for_output(v, include_series) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def to_json(obj: Any, include_series: bool | None = None) -> str:
+    return json.dumps(for_output(obj, include_series))
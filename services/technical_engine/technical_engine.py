@@ -2,13 +2,41 @@
 #  technical_engine.py — Motor técnico unificado ESTABLE
 # ============================================================
 
+import asyncio
 import logging
-from services.technical_engine.motor_wrapper_core import get_multi_tf_snapshot
+from services.common.single_flight import AsyncSingleFlight
+from services.common.worker_pool import WorkerPool
+from services.technical_engine.motor_wrapper_core import (
+    analysis_bars,
+    apply_direction,
+    get_snapshot_core,
+    prefetch_timeframes,
+)
+from services.technical_engine.process_backend import process_snapshot_core
 from services.technical_engine.smart_entry_validator import evaluate_smart_entry
 from services.technical_engine.trend_system_final import evaluate_major_trend
 
+from config import (
+    ANALYSIS_POOL_MODE,
+    ANALYSIS_POOL_WORKERS,
+    ANALYSIS_MAX_CONCURRENCY,
+)
+
 logger = logging.getLogger("technical_engine")
 
+# Análisis concurrentes del mismo símbolo comparten un único núcleo de
+# snapshot (sea cual sea su dirección). Si todos dejan de esperar
+# (timeout), el trabajo se cancela y no ocupa el pool.
+_snapshot_flight = AsyncSingleFlight(cancel_orphans=True)
+
+# El snapshot (ccxt + cálculo) corre aquí, nunca en el event loop
+analysis_pool = WorkerPool(
+    mode=ANALYSIS_POOL_MODE,
+    max_workers=ANALYSIS_POOL_WORKERS,
+    max_concurrency=ANALYSIS_MAX_CONCURRENCY,
+    name="analysis",
+)
+
 
 def _safe_float(value, default=0.0):
     try:
@@ -75,17 +103,49 @@ def _apply_divergence_weight(
     return score, conf, reasons
 
 
+async def _build_core(
+    symbol: str, context: str, pool: WorkerPool, timeout: float | None = None
+) -> dict:
+    """
+    Precarga async de velas (en el loop, sin bloquear) y cálculo del
+    núcleo del snapshot en el pool. En modo proceso las velas viajan al
+    worker por memoria compartida (process_backend) y vuelve un registro
+    compacto.
+    """
+    if pool.mode == "process":
+        return await process_snapshot_core(symbol, context, pool, timeout)
+
+    try:
+        await prefetch_timeframes(symbol, analysis_bars(context))
+    except Exception as e:
+        logger.warning(f"⚠️ Precarga async falló para {symbol}: {e}")
+
+    return await pool.run(get_snapshot_core, symbol, context, timeout=timeout)
+
+
 # ============================================================
 #   API PRINCIPAL DEL MOTOR TÉCNICO
 # ============================================================
-async def analyze(symbol: str, direction: str = "auto", context: str = "entry") -> dict:
+async def analyze(
+    symbol: str,
+    direction: str = "auto",
+    context: str = "entry",
+    pool: WorkerPool | None = None,
+    timeout: float | None = None,
+) -> dict:
     """
     Motor técnico unificado usado por:
         - SignalCoordinator
         - ReactivationEngine
         - OpenPositionEngine
         - /analizar
+
+    El trabajo bloqueante va a `pool` (por defecto analysis_pool), con
+    `timeout` segundos como máximo en el pool. Si se agota se propaga
+    asyncio.TimeoutError (no es un resultado de error): quien llama lo
+    convierte en decision="timeout".
     """
+    pool = pool or analysis_pool
 
     logger.info("\n" + "=" * 70)
     logger.info(f"🔍 Análisis técnico → {symbol} ({direction})")
@@ -94,18 +154,23 @@ async def analyze(symbol: str, direction: str = "auto", context: str = "entry")
         # ----------------------------------------------------
         # 1) Snapshot multi-TF (NÚCLEO)
         # ----------------------------------------------------
-        snapshot = get_multi_tf_snapshot(symbol)
-        if not snapshot or not isinstance(snapshot, dict):
+        # La ventana depende del contexto (open_position usa una más corta)
+        core = await _snapshot_flight.do(
+            (symbol.upper(), analysis_bars(context)),
+            lambda: _build_core(symbol, context, pool, timeout),
+        )
+        if not core or not isinstance(core, dict):
             raise RuntimeError("Snapshot inválido o vacío")
 
-        timeframes = snapshot.get("timeframes")
+        timeframes = core.get("timeframes")
         if not timeframes or not isinstance(timeframes, list):
             raise RuntimeError("Snapshot sin timeframes válidos")
 
         # ----------------------------------------------------
-        # 2) Dirección
+        # 2) Dirección (overlay sobre el núcleo compartido)
         # ----------------------------------------------------
         direction = direction.lower()
+        snapshot = apply_direction(core, None if direction == "auto" else direction)
         if direction == "auto":
             direction = snapshot.get("direction_hint", "long")
 
@@ -151,6 +216,10 @@ async def analyze(symbol: str, direction: str = "auto", context: str = "entry")
 
         return final_decision
 
+    except asyncio.TimeoutError:
+        logger.warning(f"⏱️ Análisis de {symbol} agotó {timeout}s en el pool")
+        raise
+
     except Exception as e:
         # ----------------------------------------------------
         # ❗ NUNCA devolvemos None